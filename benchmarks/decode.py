@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+"""Measure how long decoding large responses blocks the event loop, with
+and without decoding them in the background.
+
+Usage::
+
+    $ python benchmarks/decode.py
+    $ python benchmarks/decode.py --size 20 -n 5
+
+A body similar to a large CircleCI projects listing is decoded n times
+while the event loop lag is measured (with orjson, if installed).
+"""
+import argparse
+import asyncio
+import json
+import time
+from quickci.exporter import LoopMonitor
+from quickci.transport import Decoder, orjson
+
+
+def body(size: int) -> bytes:
+    """Return a projects listing of about size megabytes."""
+    project = {"reponame": "repo", "username": "user", "branches": {
+        f"branch{i}": {"latest_workflows": {"workflow": {"status": "success"}},
+                       "recent_builds": [{"vcs_revision": "a" * 40}] * 5}
+        for i in range(10)}}
+    one = len(json.dumps(project))
+    return json.dumps([project] * (size * 2 ** 20 // one)).encode("utf-8")
+
+
+async def run(decoder: Decoder, data: bytes, n: int) -> LoopMonitor:
+    """Decode data n times, measuring the event loop lag."""
+    monitor = LoopMonitor(interval=0.005)
+
+    async def decode():
+        for _ in range(n):
+            await decoder.decode(data)
+
+    await monitor.watch(decode())
+    return monitor
+
+
+async def main(size: int, n: int):
+    data = body(size)
+    decoder = "orjson" if orjson is not None else "json"
+    print(f"Decoding {len(data) / 2 ** 20:.1f} MB {n} times with {decoder}")
+    for name, threshold in (("direct", None), ("background", 0)):
+        d = Decoder(threshold=threshold)
+        start = time.perf_counter()
+        monitor = await run(d, data, n)
+        elapsed = time.perf_counter() - start
+        d.close()
+        print(f"\t{name:<10} {elapsed:8.3f}s, loop lag {monitor.summary()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10,
+                        help="Size of the body in megabytes")
+    parser.add_argument("-n", type=int, default=3,
+                        help="Number of decodes")
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(main(args.size, args.n))
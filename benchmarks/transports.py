@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+"""Compare the available transports by performing many concurrent requests
+to the same host, as quickCI does when checking hundreds of repositories.
+
+Usage::
+
+    $ python benchmarks/transports.py
+    $ python benchmarks/transports.py --url https://api.travis-ci.com/ -n 200
+
+Without ``--url``, a local HTTP/1.1 server is started and used as target
+(HTTP/2 is only negotiated over TLS, so the http2 transport needs a real
+https url to show the benefit of multiplexing).
+"""
+import argparse
+import asyncio
+import time
+from quickci.transport import FakeTransport, TRANSPORTS
+
+
+async def run(transport, url: str, n: int) -> float:
+    """Perform n concurrent requests and return the elapsed time."""
+    start = time.perf_counter()
+    await asyncio.gather(*[transport.get(url) for _ in range(n)])
+    elapsed = time.perf_counter() - start
+    await transport.close()
+    return elapsed
+
+
+async def local_server():
+    """Start a local server answering with a small json body."""
+    from aiohttp import web
+
+    async def handler(request):
+        await asyncio.sleep(0.01)  # simulate some server latency
+        return web.json_response({"builds": [{"state": "passed"}]})
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+
+async def main(url: str, n: int):
+    runner = None
+    if url is None:
+        runner, url = await local_server()
+    print(f"{n} concurrent requests to {url}")
+    elapsed = await run(FakeTransport({url: {}}), url, n)
+    print(f"\t{'fake':<8} {elapsed:8.3f}s (baseline, no network)")
+    for name, transport_class in TRANSPORTS.items():
+        try:
+            transport = transport_class()
+        except ImportError as e:
+            print(f"\t{name:<8} skipped ({e})")
+            continue
+        elapsed = await run(transport, url, n)
+        print(f"\t{name:<8} {elapsed:8.3f}s ({n / elapsed:.1f} req/s)")
+    if runner is not None:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="Url to request")
+    parser.add_argument("-n", type=int, default=100,
+                        help="Number of requests")
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(main(args.url, args.n))
@@ -5,3 +5,22 @@
 __author__ = """Roberto Preste"""
 __email__ = "robertopreste@gmail.com"
 __version__ = '0.4.0'
+
+import sys
+
+_EXPORTS = {"fetch_status": "quickci.api",
+            "BuildStatus": "quickci.classes",
+            "StatusError": "quickci.classes"}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        """Import the public API on first use, so that the CLI (and shell
+        completion) only imports the modules it needs."""
+        if name not in _EXPORTS:
+            raise AttributeError(f"module {__name__!r} has no attribute "
+                                 f"{name!r}")
+        import importlib
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+else:  # pragma: no cover
+    from quickci.api import fetch_status  # noqa: F401
+    from quickci.classes import BuildStatus, StatusError  # noqa: F401
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Union
+from quickci.classes import (BuildStatus, Config, StatusError, TravisCI,
+                             CircleCI, AppVeyor, Buddy, DroneCI, Codeship)
+from quickci.transport import AiohttpTransport, Transport
+
+SERVICES = {"travis": TravisCI,
+            "circle": CircleCI,
+            "appveyor": AppVeyor,
+            "buddy": Buddy,
+            "drone": DroneCI,
+            "codeship": Codeship}
+
+
+def _instances(services, branches, repos, tokens, transport):
+    """Create a service instance for each service, branch and repo."""
+    services = list(services or SERVICES)
+    if tokens is None:
+        config = Config()
+        tokens = {service: config[service] for service in services}
+    return [SERVICES[service](token=tokens[service], branch=branch,
+                              repo=repo, transport=transport)
+            for service in services
+            if tokens.get(service, "replace_me") != "replace_me"
+            for branch in branches
+            for repo in (repos or [None])]
+
+
+async def iter_status(services: Optional[Iterable[str]] = None,
+                      branches: Iterable[str] = ("master", ),
+                      repos: Optional[Iterable[str]] = None,
+                      tokens: Optional[Dict[str, str]] = None,
+                      session=None,
+                      transport: Optional[Transport] = None
+                      ) -> AsyncIterator[Union[BuildStatus, StatusError]]:
+    """Yield the build status of each repository in the given CI services,
+    as soon as it is available.
+
+    Accepts the same arguments as fetch_status().
+
+    Yields:
+        BuildStatus of each repository, and StatusError of each repository
+        (or service) whose status could not be retrieved.
+    """
+    own_transport = transport is None and session is None
+    if transport is None:
+        transport = AiohttpTransport(session)
+    instances = _instances(services, branches, repos, tokens, transport)
+    queue = asyncio.Queue()
+    done = object()
+
+    async def produce(ci):
+        try:
+            async for result in ci.astatuses():
+                await queue.put(result)
+            for repo, error in ci._failures:
+                await queue.put(StatusError(ci.name, repo, ci._branch, error))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # only this service is affected
+            await queue.put(StatusError(ci.name, ci._repo, ci._branch,
+                                        str(e) or type(e).__name__))
+        finally:
+            await queue.put(done)
+
+    tasks = [asyncio.ensure_future(produce(ci)) for ci in instances]
+    try:
+        pending = len(tasks)
+        while pending:
+            result = await queue.get()
+            if result is done:
+                pending -= 1
+            else:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        if own_transport:
+            await transport.close()
+
+
+async def fetch_status(services: Optional[Iterable[str]] = None,
+                       branches: Iterable[str] = ("master", ),
+                       repos: Optional[Iterable[str]] = None,
+                       tokens: Optional[Dict[str, str]] = None,
+                       session=None,
+                       transport: Optional[Transport] = None
+                       ) -> List[Union[BuildStatus, StatusError]]:
+    """Return the build status of each repository in the given CI services.
+
+    This coroutine runs in the caller's event loop, so it can be awaited
+    from any asyncio application::
+
+        results = await quickci.fetch_status(["travis", "circle"],
+                                             branches=["master", "dev"])
+
+    Errors only affect the service (or repository) which raised them, and
+    are returned as StatusError along with the other results::
+
+        for result in results:
+            if isinstance(result, quickci.StatusError):
+                print(result.service, result.repo, result.error)
+
+    Args:
+        services: Service names (default: every service in SERVICES).
+        branches: Branches to check (default: master).
+        repos: Repositories to check (default: every repository).
+        tokens: Dictionary of service -> token (default: tokens stored in
+            the config file). Services without a valid token are skipped.
+        session: aiohttp.ClientSession to use for every request; it will
+            not be closed.
+        transport: Transport to use for every request, instead of session;
+            it will not be closed.
+
+    Returns:
+        List of BuildStatus and StatusError.
+    """
+    results = iter_status(services, branches, repos, tokens, session,
+                          transport)
+    return [result async for result in results]
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+from quickci.classes import ServiceError
+from quickci.transport import HTTPError
+
+MANIFEST = ".quickci-artifacts.json"
+MAX_DOWNLOADS = 4
+DOWNLOADED, RESUMED, SKIPPED = "downloaded", "resumed", "skipped"
+
+
+def _digest(path: str):
+    """Return the sha256 hash object of a file, reading it a chunk at a
+    time (so that it can be updated with the rest of the file)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest
+
+
+def _sha256(path: str) -> str:
+    """Return the sha256 checksum of a file."""
+    return _digest(path).hexdigest()
+
+
+def _target(dest: str, path: str) -> str:
+    """Return where to save an artifact, refusing paths outside of dest.
+
+    Raises:
+        ServiceError: If the artifact path is outside of dest.
+    """
+    rel = os.path.normpath(path.lstrip("/\\"))
+    if rel.startswith(os.pardir) or os.path.isabs(rel):
+        raise ServiceError(f"invalid artifact path: {path}")
+    return os.path.join(dest, rel)
+
+
+class Manifest:
+    """Record of the artifacts downloaded in a directory.
+
+    For each artifact path, the url it was downloaded from is stored as soon
+    as the download starts (so that a partial download is only resumed from
+    the same url), and its size and checksum once it is complete.
+
+    Args:
+        dest: Download directory.
+    """
+
+    def __init__(self, dest: str):
+        self.path = os.path.join(dest, MANIFEST)
+        try:
+            with open(self.path) as f:
+                self.content: Dict[str, Dict] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.content = {}
+
+    def unchanged(self, path: str, target: str, url: str,
+                  size: Optional[int]) -> bool:
+        """Return whether an artifact was already downloaded from url, and
+        the local file still has the recorded size and checksum (and the size
+        reported by the service, if any).
+        """
+        entry = self.content.get(path) or {}
+        if entry.get("url") != url or "sha256" not in entry:
+            return False
+        try:
+            local = os.path.getsize(target)
+        except OSError:
+            return False
+        if local != entry.get("size") or (size is not None and local != size):
+            return False
+        return _sha256(target) == entry["sha256"]
+
+    def save(self):
+        """Write the manifest to the download directory."""
+        with open(self.path, "w") as f:
+            json.dump(self.content, f, indent=2, sort_keys=True)
+
+
+async def download_artifacts(ci,
+                             repo: str,
+                             dest: str,
+                             pattern: str = "*",
+                             on_done: Optional[Callable[[str, str], None]] = None
+                             ) -> List[Tuple[str, str]]:
+    """Download the artifacts of the latest build of a repo.
+
+    Up to MAX_DOWNLOADS artifacts are downloaded concurrently, using the
+    transport of the service. Each artifact is streamed to a ``.part`` file
+    (and hashed as it is written), which is renamed once complete; an
+    interrupted download is resumed with a Range request, and artifacts
+    unchanged since the last download are skipped. Local files are only
+    read (to check or resume them) in a thread, so that other downloads are
+    not blocked meanwhile.
+
+    If a download fails, the other ones are cancelled and their ``.part``
+    files removed, while the failed one is kept to be resumed.
+
+    Args:
+        ci: Service instance (e.g. CircleCI or AppVeyor).
+        repo: Repository name.
+        dest: Download directory.
+        pattern: Glob matching the paths of the artifacts to download.
+        on_done: Function called with path and outcome of each artifact.
+
+    Returns:
+        List of (path, outcome) tuples, where outcome is DOWNLOADED, RESUMED
+        or SKIPPED.
+
+    Raises:
+        NotSupported: If the service does not provide artifacts.
+        ServiceError: If the artifacts could not be listed or downloaded.
+    """
+    artifacts = [(path, url, size)
+                 for path, url, size in await ci.aartifacts(repo)
+                 if fnmatch.fnmatch(path, pattern)]
+    os.makedirs(dest, exist_ok=True)
+    manifest = Manifest(dest)
+    semaphore = asyncio.Semaphore(MAX_DOWNLOADS)
+    loop = asyncio.get_event_loop()
+
+    async def download(path: str, url: str, size: Optional[int]) -> str:
+        target = _target(dest, path)
+        if await loop.run_in_executor(None, manifest.unchanged, path, target,
+                                      url, size):
+            return SKIPPED
+        part = f"{target}.part"
+        entry = manifest.content.get(path) or {}
+        offset = 0
+        digest = hashlib.sha256()
+        if entry.get("url") == url and os.path.exists(part):
+            digest = await loop.run_in_executor(None, _digest, part)
+            offset = os.path.getsize(part)
+        manifest.content[path] = {"url": url}
+        manifest.save()
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        async with semaphore:
+            try:
+                with open(part, "ab" if offset else "wb") as f:
+                    async for chunk in ci._transport.get_range(
+                            url, offset, headers=ci.headers):
+                        f.write(chunk)
+                        digest.update(chunk)
+            except HTTPError as e:
+                raise ServiceError(f"{path}: {e}") from e
+            except asyncio.CancelledError:
+                os.remove(part)
+                raise
+        os.replace(part, target)
+        manifest.content[path] = {"url": url,
+                                  "size": os.path.getsize(target),
+                                  "sha256": digest.hexdigest()}
+        manifest.save()
+        return RESUMED if offset else DOWNLOADED
+
+    async def run(path: str, url: str, size: Optional[int]) -> Tuple[str, str]:
+        outcome = await download(path, url, size)
+        if on_done is not None:
+            on_done(path, outcome)
+        return path, outcome
+
+    tasks = [asyncio.ensure_future(run(*artifact)) for artifact in artifacts]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
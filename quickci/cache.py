@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List
+
+
+class Cache:
+    """Class that controls the cache files used to persist data between runs.
+
+    Cache files are stored in ``~/.cache/quickci`` and are only readable by
+    the current user, since they can contain sensitive data (e.g. access
+    tokens).
+    """
+
+    CACHE_DIR = os.path.expanduser("~/.cache/quickci")
+
+    def __init__(self, name: str):
+        self._cache_dir = self.CACHE_DIR
+        self._cache_file = f"{name}.json"
+        self._content = self.parse()
+
+    @property
+    def cache_path(self):
+        return os.path.join(self._cache_dir, self._cache_file)
+
+    def parse(self) -> Dict[str, Any]:
+        """Parse and return the existing cache dict or return an empty one
+        otherwise.
+        """
+        try:
+            with open(self.cache_path) as f:
+                cache = json.loads(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            cache = {}
+        return cache
+
+    @property
+    def content(self):
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
+    def save(self):
+        """Write the updated cache to the default path.
+
+        The file is replaced atomically, so that other processes never read
+        a partially written cache.
+        """
+        os.makedirs(self._cache_dir, exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w") as f:
+            f.write(json.dumps(self.content))
+        os.replace(tmp_path, self.cache_path)
+
+    def update(self, key: str, value: Any = None):
+        """Write a single entry of the cache, or remove it if value is None.
+
+        The file is parsed again before writing, so that the entries written
+        meanwhile by other instances (or processes) using the same cache
+        file are kept.
+
+        Args:
+            key: Entry to write.
+            value: New value of the entry.
+        """
+        self.content = self.parse()
+        if value is None:
+            self.content.pop(key, None)
+        else:
+            self.content[key] = value
+        self.save()
+
+
+class CompletionIndex:
+    """Class that stores the repositories and branches found on the previous
+    runs, used for shell completion without contacting the CI services.
+    """
+
+    MAX_BRANCHES = 20
+
+    def __init__(self):
+        self._cache = Cache("completion")
+
+    def update(self, service: str, branch: str, repos: Iterable[str],
+               complete: bool = False):
+        """Store the repositories found for a service, and the branch
+        checked.
+
+        Args:
+            service: Service name.
+            branch: Branch checked.
+            repos: Repositories found.
+            complete: Whether repos are every repository of the service (so
+                that the ones not found anymore are removed), or only some
+                of them.
+        """
+        entry = self._cache.content.setdefault(service, {"repos": [],
+                                                         "branches": {}})
+        repos = set(repos)
+        if not complete:
+            repos.update(entry["repos"])
+        entry["repos"] = sorted(repos)
+        entry["branches"][branch] = time.time()
+        recent = sorted(entry["branches"].items(), key=lambda item: item[1],
+                        reverse=True)[:self.MAX_BRANCHES]
+        entry["branches"] = dict(recent)
+        self._cache.save()
+
+    def repos(self, services: Iterable[str]) -> List[str]:
+        """Return the repositories found for the given services.
+
+        Args:
+            services: Service names.
+
+        Returns:
+            Sorted list of repository names.
+        """
+        return sorted({repo for service in services
+                       for repo in self._cache.content.get(
+                           service, {}).get("repos", [])})
+
+    def branches(self, services: Iterable[str]) -> List[str]:
+        """Return the branches checked for the given services.
+
+        Args:
+            services: Service names.
+
+        Returns:
+            List of branch names, most recently checked first.
+        """
+        seen: Dict[str, float] = {}
+        for service in services:
+            for branch, when in self._cache.content.get(
+                    service, {}).get("branches", {}).items():
+                seen[branch] = max(when, seen.get(branch, 0))
+        return sorted(seen, key=lambda branch: seen[branch], reverse=True)
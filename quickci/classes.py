@@ -2,14 +2,141 @@
 # -*- coding: UTF-8 -*-
 # Created by Roberto Preste
 import asyncio
-import aiohttp
+import base64
 import click
-from concurrent.futures import ThreadPoolExecutor
+import datetime
+import hashlib
+import itertools
 import pprint
 import json
 import os
-import requests
-from typing import List, Tuple, Dict, Any, Optional
+import re
+import time
+from typing import (List, Tuple, Dict, Any, Optional, Union, NamedTuple,
+                    AsyncIterator, Iterable)
+from urllib.parse import quote
+from quickci.cache import Cache, CompletionIndex  # noqa: F401
+from quickci.transport import (Decoder, HTTPError, Response, SingleFlight,
+                               Transport, get_transport)
+
+
+COLOURS = {"passed": "green", "success": "green", "SUCCESSFUL": "green",
+           "fixed": "green",
+           "failed": "red", "errored": "red", "FAILED": "red",
+           "error": "red", "infrastructure_failure": "red", "timedout": "red",
+           "failure": "red", "killed": "red", "failing": "red",
+           "infrastructure_fail": "red",
+           "started": "yellow", "running": "yellow",
+           "INPROGRESS": "yellow", "ENQUEUED": "yellow",
+           "testing": "yellow", "waiting": "yellow"}
+
+PENDING = {status for status, colour in COLOURS.items()
+           if colour == "yellow"} | {"created", "queued", "pending",
+                                     "scheduled", "received", "initiated",
+                                     "booting", "blocked", "on_hold",
+                                     "not_running"}
+
+
+class BuildStatus(NamedTuple):
+    """Build status of a repository, as returned by the CI services.
+
+    Attributes:
+        service: Service name (e.g. travis).
+        repo: Repository name.
+        branch: Branch name.
+        status: Build status, as reported by the service.
+        pipeline: Pipeline name, for services with several pipelines per
+            repository (default: None).
+        sha: Commit built, if reported by the service (default: None).
+    """
+    service: str
+    repo: str
+    branch: str
+    status: str
+    pipeline: Optional[str] = None
+    sha: Optional[str] = None
+
+
+class StatusError(NamedTuple):
+    """Error raised while retrieving build statuses, reported along with the
+    statuses of the other repositories (see quickci.iter_status()).
+
+    Attributes:
+        service: Service name (e.g. travis).
+        repo: Repository name (None if no status of the service could be
+            retrieved).
+        branch: Branch name.
+        error: Error message.
+    """
+    service: str
+    repo: Optional[str]
+    branch: str
+    error: str
+
+
+class Build(NamedTuple):
+    """Past build of a repository, used to compute build statistics.
+
+    Attributes:
+        service: Service name (e.g. travis).
+        repo: Repository name.
+        branch: Branch name.
+        status: Build status, as reported by the service.
+        created: Time the build was queued (epoch seconds, if known).
+        started: Time the build started (epoch seconds, if known).
+        finished: Time the build finished (epoch seconds, if known).
+        pipeline: Pipeline name, for services with several pipelines per
+            repository (default: None).
+    """
+    service: str
+    repo: str
+    branch: str
+    status: str
+    created: Optional[float]
+    started: Optional[float]
+    finished: Optional[float]
+    pipeline: Optional[str] = None
+
+
+def timestamp(value: Any) -> Optional[float]:
+    """Convert a time returned by a CI service to epoch seconds.
+
+    Args:
+        value: ISO 8601 string, epoch seconds, or None.
+
+    Returns:
+        Epoch seconds, or None if the time is not available.
+    """
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.match(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?"
+                     r"(?:Z|([+-])(\d\d):?(\d\d))?$", value)
+    if match is None:
+        return None
+    # datetime.fromisoformat() is not available on Python 3.6
+    date, fraction, sign, hours, minutes = match.groups()
+    parsed = datetime.datetime.strptime(date, "%Y-%m-%dT%H:%M:%S").replace(
+        tzinfo=datetime.timezone.utc)
+    offset = int(hours or 0) * 3600 + int(minutes or 0) * 60
+    if sign == "-":
+        offset = -offset
+    return parsed.timestamp() - offset + float(fraction or 0)
+
+
+class ServiceError(Exception):
+    """Error raised when a CI service cannot be reached, or returns an
+    invalid response."""
+
+
+class ServiceUnavailable(ServiceError):
+    """Error raised when the circuit breaker of a CI service is open."""
+
+
+class NotSupported(ServiceError):
+    """Error raised when a CI service does not provide a feature (e.g. build
+    logs), as opposed to NotImplementedError for missing code."""
 
 
 class _CIService:
@@ -19,25 +146,83 @@ class _CIService:
     authentication token (explicitly provided) and a base url for the
     given CI service (internally provided by that specific class).
 
+    Subclasses implement the aprojects() and astatus() coroutines, and
+    optionally alookup(); the build status of each repository can then be
+    retrieved either with the afetch() coroutine, which can be awaited in
+    any running event loop, or printed with status().
+
     Attributes:
-        _token: Authentication token.
+        _token: Authentication token (the first one, if a list of tokens
+            is provided).
+        _pool: TokenPool with every token provided, used in turns.
         _url: Base url for API requests.
         _branch: Branch to check (default: master).
         _repo: Repository to check (default: None).
         _found: Whether the given branch has at least one build
             (default: False).
+        _transport: Transport used for API requests (default: aiohttp);
+            a transport created from its name is closed by self.status().
+        _webhook_age: Use the status received from webhooks if not older
+            than this number of seconds, instead of polling (default: 0,
+            webhooks are not used).
+        _budget: Number of seconds after which low-priority repositories
+            still being checked are skipped (default: 0, no limit).
+        _details: Whether to show the jobs of failed and running builds
+            (default: False).
+        _shard: Only check the repositories of the i-th of n shards, given
+            as (i, n) (default: None, every repository).
+        _results: BuildStatus of each repository printed by self.status().
+        _builds: Dictionary of (repo, pipeline) -> (build id, url of its
+            jobs) for each build found, used to request its jobs.
+        _skipped: Number of low-priority repositories skipped.
+        _failures: List of (repository, error) for each repository whose
+            status could not be retrieved.
+        _breaker: CircuitBreaker of the service.
+        can_restart: Whether the service allows restarting builds (see
+            self.arestart()).
     """
 
+    name = ""
+    flight = SingleFlight()
+    decoder = Decoder()
+    monitor: Any = None
+    can_restart = False
+    PINNED, PREVIOUS, ACTIVE, LOW = range(4)
+    ACTIVE_AGE = 7 * 24 * 3600
+    WORKERS = 16
+    QUEUE_SIZE = 100
+    MAX_DETAILS = 500
+    RESTART_LIMIT = 4
+    RETRIES = 3
+
     def __init__(self,
-                 token: str,
+                 token: Union[str, List[str]],
                  url: str,
                  branch: str,
-                 repo: Optional[str]):
-        self._token = token
+                 repo: Optional[str],
+                 transport: Union[str, Transport] = "aiohttp",
+                 webhook_age: float = 0,
+                 budget: float = 0,
+                 details: bool = False,
+                 shard: Optional[Tuple[int, int]] = None):
+        self._pool = TokenPool([token] if isinstance(token, str) else token)
+        self._token = self._pool.tokens[0]
         self._url = url
         self._branch = branch
         self._repo = repo
         self._found = False
+        self._owns_transport = isinstance(transport, str)
+        self._transport = get_transport(transport) \
+            if self._owns_transport else transport
+        self._webhook_age = webhook_age
+        self._budget = budget
+        self._details = details
+        self._shard = shard
+        self._results: List[BuildStatus] = []
+        self._builds: Dict[Tuple[str, Optional[str]], Tuple[str, str]] = {}
+        self._skipped = 0
+        self._failures: List[Tuple[str, str]] = []
+        self._breaker = CircuitBreaker(self.name)
 
     @property
     def colours(self) -> Dict[str, str]:
@@ -46,424 +231,1785 @@ class _CIService:
         Returns:
             Dictionary of status -> colour.
         """
-        return {"passed": "green", "success": "green", "SUCCESSFUL": "green",
-                "failed": "red", "errored": "red", "FAILED": "red",
-                "started": "yellow", "running": "yellow",
-                "INPROGRESS": "yellow", "ENQUEUED": "yellow"}
+        return COLOURS
+
+    def token_headers(self, token: str) -> Dict[str, str]:
+        """Return headers used to connect to the API with the given token.
+
+        Args:
+            token: Authentication token.
+
+        Returns:
+            Dictionary with API headers.
+        """
+        return {}
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Return headers used to connect to the API.
+
+        Returns:
+            Dictionary with API headers.
+        """
+        return self.token_headers(self._token)
+
+    @property
+    def token_key(self) -> str:
+        """Return the key used to store token-related data in the cache.
+
+        Returns:
+            Hash of the token (tokens are never stored in the cache).
+        """
+        return hashlib.sha256(self._token.encode()).hexdigest()
+
+    def result(self,
+               repo_name: str,
+               repo_stat: str,
+               pipeline: Optional[str] = None,
+               sha: Optional[str] = None,
+               build: Optional[Tuple[Any, str]] = None) -> BuildStatus:
+        """Return the build status of a repo for the current branch.
+
+        Args:
+            repo_name: Repository name.
+            repo_stat: Build status.
+            pipeline: Pipeline name, if any.
+            sha: Commit built, if known.
+            build: Immutable build id and url of its jobs, if known (see
+                self.adetails()).
+
+        Returns:
+            BuildStatus of the repo.
+        """
+        if build is not None and build[0] is not None:
+            self._builds[(repo_name, pipeline)] = (str(build[0]), build[1])
+        return BuildStatus(self.name, repo_name, self._branch, repo_stat,
+                           pipeline, sha)
+
+    async def aprojects(self) -> List[Any]:
+        """Return every project available from the API.
+
+        Returns:
+            List of projects.
+        """
+        raise NotImplementedError
+
+    def projects(self) -> List[Any]:
+        """Synchronous version of self.aprojects()."""
+        return self.run(self.aprojects())
+
+    async def aiter_projects(self) -> AsyncIterator[List[Any]]:
+        """Yield the projects available from the API, a batch at a time.
+
+        Subclasses override this method to yield each page (or workspace,
+        organization...) of projects as soon as it is received.
+
+        Yields:
+            List of projects, in the same format used by self.aprojects().
+        """
+        yield await self.aprojects()
+
+    def repo_name(self, proj: Any) -> str:
+        """Return the repository name of a project.
+
+        Args:
+            proj: Project as returned by self.aprojects().
+
+        Returns:
+            Repository name.
+        """
+        return proj[0]
+
+    async def alookup(self, repo: str) -> List[Any]:
+        """Return the given repository, in the same format used by
+        self.aprojects().
+
+        Subclasses override this method to request the repository directly
+        from the API instead of listing every project.
+
+        Args:
+            repo: Repository name.
+
+        Returns:
+            List of matching projects (empty if the repo does not exist).
+        """
+        return [proj for proj in await self.aprojects()
+                if self.repo_name(proj) == repo]
+
+    def lookup(self, repo: str) -> List[Any]:
+        """Synchronous version of self.alookup()."""
+        return self.run(self.alookup(repo))
+
+    async def aiter_lookup(self, repo: str) -> AsyncIterator[List[Any]]:
+        """Yield the result of self.alookup() as a single batch, like
+        self.aiter_projects().
+
+        Args:
+            repo: Repository name.
+
+        Yields:
+            List of matching projects.
+        """
+        yield await self.alookup(repo)
+
+    async def astatus(self, repo: Any) -> List[BuildStatus]:
+        """Return the build status of the given repo and branch.
+
+        Args:
+            repo: Project as returned by self.aprojects().
+
+        Returns:
+            List of build status (empty if the branch has no builds).
+        """
+        raise NotImplementedError
+
+    def reported(self,
+                 projs: List[Any]) -> Tuple[List[BuildStatus], List[Any]]:
+        """Return the status of projects recently reported by webhooks.
+
+        Args:
+            projs: Projects as returned by self.aprojects().
+
+        Returns:
+            Build status of the reported projects, and projects which still
+            need to be polled.
+        """
+        if not self._webhook_age:
+            return [], projs
+        recent = WebhookState().recent(self.name, self._branch,
+                                       self._webhook_age)
+        results, polled = [], []
+        for proj in projs:
+            entries = recent.get(self.repo_name(proj))
+            if not entries:
+                polled.append(proj)
+            for entry in entries or []:
+                results.append(self.result(entry["repo"], entry["status"],
+                                           entry.get("pipeline")))
+        return results, polled
+
+    def in_shard(self, proj: Any) -> bool:
+        """Return whether a project belongs to the shard to check.
+
+        Projects are assigned to shards by a hash of service and repository
+        name, so that every host checking the same shard of the same
+        repositories agrees on it.
+
+        Args:
+            proj: Project as returned by self.aprojects().
+
+        Returns:
+            Whether the project belongs to self._shard.
+        """
+        index, count = self._shard
+        key = f"{self.name}/{self.repo_name(proj)}".encode("utf-8")
+        digest = hashlib.sha1(key).digest()
+        return int.from_bytes(digest[:8], "big") % count == index - 1
+
+    def priority(self,
+                 proj: Any,
+                 pinned: Iterable[str],
+                 previous: Dict[str, Dict[str, Any]]) -> int:
+        """Return the priority of a project.
+
+        Projects pinned in the config come first, followed by those which
+        were failing or running on the previous run, those whose status
+        changed within ACTIVE_AGE seconds, and finally every other one.
+
+        Args:
+            proj: Project as returned by self.aprojects().
+            pinned: Names of the pinned repositories.
+            previous: Previous status of each repository (see
+                StatusHistory.previous()).
+
+        Returns:
+            Priority of the project (PINNED, PREVIOUS, ACTIVE or LOW).
+        """
+        name = self.repo_name(proj)
+        entry = previous.get(name, {})
+        if name in pinned:
+            return self.PINNED
+        if COLOURS.get(entry.get("status")) in ("red", "yellow"):
+            return self.PREVIOUS
+        if time.time() - entry.get("changed", 0) < self.ACTIVE_AGE:
+            return self.ACTIVE
+        return self.LOW
+
+    async def astatuses(self) -> AsyncIterator[BuildStatus]:
+        """Yield the build status of each repository as soon as it is
+        available.
+
+        Discovery and status requests are pipelined: projects are put in a
+        bounded queue as soon as each page (or workspace, organization...)
+        of projects is received, and WORKERS workers request their status
+        meanwhile, taking the projects with the highest priority first (see
+        self.priority()). If a time budget is set, low-priority repositories
+        which are still queued or being checked when it is exhausted are
+        skipped.
+
+        Yields:
+            BuildStatus of each repository with a build in the given branch.
+        """
+        start = time.monotonic()
+        pinned = set(Config().pinned(self.name))
+        previous = StatusHistory().previous(self.name, self._branch)
+        projs: asyncio.PriorityQueue = asyncio.PriorityQueue(self.QUEUE_SIZE)
+        output: asyncio.Queue = asyncio.Queue()
+        done = object()
+        counter = itertools.count()
+
+        async def discover():
+            batches = self.aiter_projects() if not self._repo \
+                else self.aiter_lookup(self._repo)
+            try:
+                async for batch in batches:
+                    if self._shard is not None:
+                        batch = [proj for proj in batch if self.in_shard(proj)]
+                    reported, polled = self.reported(batch)
+                    for result in reported:
+                        await output.put(result)
+                    for proj in polled:
+                        await projs.put((self.priority(proj, pinned, previous),
+                                         next(counter), proj))
+            finally:
+                for _ in range(self.WORKERS):
+                    await projs.put((self.LOW + 1, next(counter), done))
+
+        async def work():
+            try:
+                while True:
+                    priority, _, proj = await projs.get()
+                    if proj is done:
+                        break
+                    timeout = None
+                    if priority == self.LOW and self._budget:
+                        timeout = self._budget - (time.monotonic() - start)
+                        if timeout <= 0:
+                            self._skipped += 1
+                            continue
+                    try:
+                        results = await asyncio.wait_for(self.astatus(proj),
+                                                         timeout)
+                    except asyncio.TimeoutError:
+                        self._skipped += 1
+                        continue
+                    except (asyncio.CancelledError, ServiceUnavailable):
+                        raise
+                    except Exception as e:  # only this repo is affected
+                        self._failures.append((self.repo_name(proj),
+                                               str(e) or type(e).__name__))
+                        continue
+                    for result in results:
+                        await output.put(result)
+            finally:
+                await output.put(done)
+
+        discovery = asyncio.ensure_future(discover())
+        workers = [asyncio.ensure_future(work()) for _ in range(self.WORKERS)]
+        results = []
+        try:
+            running = len(workers)
+            while running:
+                result = await output.get()
+                if result is done:
+                    running -= 1
+                    continue
+                results.append(result)
+                yield result
+            for task in workers + [discovery]:
+                task.result()  # raise any exception from discovery or workers
+        finally:
+            for task in workers + [discovery]:
+                task.cancel()
+        StatusHistory().update(self.name, self._branch, results)
+        found = [result.repo for result in results]
+        found += [repo for repo, error in self._failures]
+        partial = self._repo is not None or self._shard is not None
+        CompletionIndex().update(self.name, self._branch, found,
+                                 not partial and not self._skipped)
+
+    def build(self,
+              repo_name: str,
+              status: str,
+              created: Any,
+              started: Any,
+              finished: Any,
+              pipeline: Optional[str] = None) -> Build:
+        """Return a past build of a repo for the current branch.
+
+        Args:
+            repo_name: Repository name.
+            status: Build status.
+            created: Time the build was queued, as returned by the service.
+            started: Time the build started, as returned by the service.
+            finished: Time the build finished, as returned by the service.
+            pipeline: Pipeline name, if any.
+
+        Returns:
+            Build of the repo.
+        """
+        return Build(self.name, repo_name, self._branch, status,
+                     timestamp(created), timestamp(started),
+                     timestamp(finished), pipeline)
 
     @staticmethod
-    async def aget(host: str,
-                   headers: Dict[str, Any]) -> Dict[str, Any]:
+    def before(build: Build, since: float) -> bool:
+        """Return whether a build was started before the given time.
+
+        Args:
+            build: Build to check.
+            since: Epoch seconds.
+
+        Returns:
+            Whether the build is older (builds without any time are
+            considered recent).
+        """
+        when = build.created or build.started or build.finished
+        return when is not None and when < since
+
+    async def abuilds(self, repo: Any, since: float) -> List[Build]:
+        """Return the builds of the given repo and branch since the given
+        time (most recent first).
+
+        Args:
+            repo: Project as returned by self.aprojects().
+            since: Epoch seconds.
+
+        Returns:
+            List of builds.
+        """
+        raise NotImplementedError
+
+    async def ahistory(self, since: float) -> List[Build]:
+        """Return the builds of each repository in the given branch since
+        the given time.
+
+        The builds of at most WORKERS repositories are requested at the same
+        time, and only the pages of builds needed are requested; repositories
+        whose builds could not be retrieved are added to self._failures.
+
+        Args:
+            since: Epoch seconds.
+
+        Returns:
+            List of builds.
+        """
+        semaphore = asyncio.Semaphore(self.WORKERS)
+
+        async def builds(proj):
+            async with semaphore:
+                try:
+                    return await self.abuilds(proj, since)
+                except (asyncio.CancelledError, ServiceUnavailable):
+                    raise
+                except Exception as e:  # only this repo is affected
+                    self._failures.append((self.repo_name(proj),
+                                           str(e) or type(e).__name__))
+                    return []
+
+        batches = self.aiter_projects() if not self._repo \
+            else self.aiter_lookup(self._repo)
+        tasks = [asyncio.ensure_future(builds(proj))
+                 async for batch in batches for proj in batch]
+        return [build for builds in await asyncio.gather(*tasks)
+                for build in builds]
+
+    async def ajob(self, repo: str) -> Optional[Tuple[str, str]]:
+        """Return the first job of the latest build of the given repo and
+        branch.
+
+        Only implemented by services which provide the job log as plain
+        text.
+
+        Args:
+            repo: Repository name.
+
+        Returns:
+            Url of the job log, and job id (or None if the branch has no
+            builds).
+
+        Raises:
+            NotSupported: If the service does not provide build logs.
+        """
+        raise NotSupported(f"Build logs are not available for {self.name}.")
+
+    async def ajob_running(self, repo: str, job: str) -> bool:
+        """Return whether the given job is still running.
+
+        Args:
+            repo: Repository name.
+            job: Job id, as returned by self.ajob().
+
+        Returns:
+            Whether the job is queued or running.
+        """
+        raise NotImplementedError
+
+    async def aartifacts(self, repo: str) -> List[Tuple[str, str, Optional[int]]]:
+        """Return the artifacts of the latest build of the given repo and
+        branch.
+
+        Only implemented by services which provide artifacts.
+
+        Args:
+            repo: Repository name.
+
+        Returns:
+            List of (path, download url, size if known) tuples.
+
+        Raises:
+            NotSupported: If the service does not provide artifacts.
+        """
+        raise NotSupported(f"Build artifacts are not available for "
+                           f"{self.name}.")
+
+    def found_build(self, repo: str) -> str:
+        """Return the id of the build of a repo found by self.astatuses().
+
+        Args:
+            repo: Repository name, as in BuildStatus.repo.
+
+        Returns:
+            Build id.
+
+        Raises:
+            ServiceError: If no build of the repo was found.
+        """
+        build = self._builds.get((repo, None))
+        if build is None:
+            raise ServiceError("no build found")
+        return build[0]
+
+    async def arestart(self, repo: str) -> str:
+        """Restart the build of the given repo found by self.astatuses(),
+        so that the build restarted is the one reported (even if a newer
+        one was started meanwhile).
+
+        Only implemented by services which allow restarting builds (see
+        self.can_restart).
+
+        Args:
+            repo: Repository name, as in BuildStatus.repo.
+
+        Returns:
+            Id of the restarted build.
+
+        Raises:
+            NotSupported: If the service does not allow restarting builds.
+            ServiceError: If no build of the repo was found, or the build
+                could not be restarted.
+        """
+        raise NotSupported(f"Builds cannot be restarted on {self.name}.")
+
+    async def alog(self,
+                   repo: str,
+                   follow: bool = False,
+                   interval: float = 2) -> AsyncIterator[bytes]:
+        """Yield the log of the first job of the latest build of the given
+        repo and branch, a chunk at a time.
+
+        Each poll only requests the bytes after the ones already received,
+        and chunks are not kept in memory after being yielded, so that
+        memory usage does not depend on the size of the log.
+
+        Args:
+            repo: Repository name.
+            follow: Keep polling for new content until the job is finished.
+            interval: Seconds between two polls.
+
+        Yields:
+            Chunks of the log.
+
+        Raises:
+            ServiceError: If the branch has no builds, or the log could not
+                be requested.
+        """
+        job = await self.ajob(repo)
+        if job is None:
+            raise ServiceError("no build found")
+        url, job_id = job
+        offset = 0
+        while True:
+            running = follow and await self.ajob_running(repo, job_id)
+            try:
+                async for chunk in self._transport.get_range(
+                        url, offset, headers=self.headers):
+                    offset += len(chunk)
+                    yield chunk
+            except HTTPError as e:
+                raise ServiceError(str(e)) from e
+            if not running:
+                return
+            await asyncio.sleep(interval)
+
+    async def afetch(self) -> List[BuildStatus]:
+        """Return the build status of each repository.
+
+        Returns:
+            List of BuildStatus.
+        """
+        return [result async for result in self.astatuses()]
+
+    def echo(self, result: BuildStatus):
+        """Print name and build status of a repo.
+
+        Args:
+            result: BuildStatus to print.
+        """
+        self._found = True
+        pipe = f" ({result.pipeline} pipeline)" if result.pipeline else ""
+        click.secho(f"\t{result.repo}{pipe} -> {result.status.casefold()}",
+                    fg=self.colours.get(result.status, "white"))
+
+    def details(self, data: Any) -> List[Tuple[str, str]]:
+        """Return name and status of each job of a build.
+
+        Only implemented by services which provide the jobs of a build.
+
+        Args:
+            data: Response to the request of the jobs of the build.
+
+        Returns:
+            List of (job name, job status) tuples.
+
+        Raises:
+            NotSupported: If the service does not provide the jobs of a
+                build.
+        """
+        raise NotSupported(f"Build jobs are not available for {self.name}.")
+
+    async def adetails(self, result: BuildStatus,
+                       cache: "Cache") -> List[Tuple[str, str]]:
+        """Return name and status of each job of the build of a result.
+
+        The jobs of finished builds are stored in the cache by build id (and
+        build status, since some services reuse the id of restarted builds),
+        so they are requested only once.
+
+        Args:
+            result: BuildStatus found by self.astatuses().
+            cache: Cache of the jobs of finished builds.
+
+        Returns:
+            List of (job name, job status) tuples (empty if the jobs of the
+            build are not available).
+        """
+        build = self._builds.get((result.repo, result.pipeline))
+        if build is None:
+            return []
+        build_id, url = build
+        key = f"{self.name}/{build_id}"
+        cached = cache.content.get(key)
+        if cached is not None and cached["status"] == result.status:
+            return [tuple(job) for job in cached["jobs"]]
+        try:
+            jobs = self.details(await self.aget(url))
+        except NotSupported:
+            return []
+        if result.status not in PENDING \
+                and not any(status in PENDING for _, status in jobs):
+            cache.content.pop(key, None)
+            cache.content[key] = {"status": result.status, "jobs": jobs}
+        return jobs
+
+    async def aecho_details(self, results: List[BuildStatus]):
+        """Print the jobs of each failed or running build, requesting them
+        concurrently.
+
+        Args:
+            results: BuildStatus of each repository.
+        """
+        def active(result):
+            red = self.colours.get(result.status) == "red"
+            return red or result.status in PENDING
+
+        results = [result for result in results if active(result)]
+        if not results:
+            return
+        cache = Cache("details")
+        semaphore = asyncio.Semaphore(self.WORKERS)
+
+        async def details(result):
+            async with semaphore:
+                try:
+                    return await self.adetails(result, cache)
+                except (asyncio.CancelledError, ServiceUnavailable):
+                    raise
+                except Exception as e:  # only this repo is affected
+                    self._failures.append((result.repo,
+                                           str(e) or type(e).__name__))
+                    return []
+
+        jobs = await asyncio.gather(*(details(result) for result in results))
+        for result, build_jobs in zip(results, jobs):
+            if not build_jobs:
+                continue
+            pipe = f" ({result.pipeline} pipeline)" if result.pipeline else ""
+            click.secho(f"\t{result.repo}{pipe} jobs:", bold=True)
+            for name, status in build_jobs:
+                click.secho(f"\t\t{name} -> {status.casefold()}",
+                            fg=self.colours.get(status, "white"))
+        for key in list(cache.content)[:-self.MAX_DETAILS]:
+            del cache.content[key]
+        cache.save()
+
+    async def aecho(self):
+        """Print the build status of each repository as soon as it is
+        available, then the jobs of failed and running builds if requested.
+        """
+        async for result in self.astatuses():
+            self.echo(result)
+            self._results.append(result)
+        if self._details:
+            await self.aecho_details(self._results)
+
+    def status(self):
+        """Perform the async call to retrieve and print the build status of
+        each repo available in self.aprojects().
+        """
+        if self._token == "replace_me":
+            click.secho("Please replace the default token with a valid one "
+                        "using `quickci config update`, or provide one "
+                        "directly using `--token`.", fg="red")
+            return
+        try:
+            self.run(self.aecho())
+        except ServiceUnavailable:
+            click.secho(f"\tService unavailable after "
+                        f"{CircuitBreaker.THRESHOLD} consecutive failures, "
+                        f"skipped (retrying in "
+                        f"{self._breaker.retry_in():.0f} seconds).", fg="red")
+            return
+        except Exception as e:
+            click.secho(f"\tService error: {str(e) or type(e).__name__}.",
+                        fg="red")
+            return
+        finally:
+            self.close()
+        for repo, error in self._failures:
+            click.secho(f"\t{repo} -> request failed ({error})",
+                        fg="magenta")
+        if self._found is False and not self._failures:
+            click.secho("\tNo build found.", fg="magenta")
+        if self._skipped:
+            click.secho(f"\tSkipped {self._skipped} low-priority repos (time "
+                        f"budget exhausted).", fg="magenta")
+        if len(self._pool.tokens) > 1:
+            for line in self._pool.report():
+                click.secho(f"\t{line}", dim=True)
+        return
+
+    async def aget(self,
+                   host: str,
+                   headers: Optional[Dict[str, Any]] = None) -> Any:
         """Generic asynchronous request call.
 
+        If no headers are provided, the request is authenticated with the
+        next token of the pool; tokens which are rejected (401) or
+        throttled (429) are removed from the pool, and the request is
+        retried with another token.
+
+        Concurrent identical requests (from any service instance) are
+        performed only once, and share the same parsed response (see
+        _CIService.flight).
+
         Args:
             host: Url to request.
-            headers: Request headers to use.
+            headers: Request headers to use (default: headers for the next
+                token in the pool).
 
         Returns:
             Dictionary with async response.
+
+        Raises:
+            ServiceUnavailable: If the circuit breaker of the service is
+                open.
+            ServiceError: If the request failed.
+        """
+        if self._breaker.is_open():
+            raise ServiceUnavailable(f"{self.name} is unavailable")
+        if headers is not None:
+            key = (host, tuple(sorted(headers.items())))
+            return await self.flight.do(key, lambda: self._aget(host, headers))
+        return await self.flight.do((host, self.token_key),
+                                    lambda: self._aget_pooled(host))
+
+    async def _request(self,
+                       host: str,
+                       headers: Dict[str, Any],
+                       method: str = "GET",
+                       data: Optional[bytes] = None) -> Response:
+        """Perform a request, recording failures in the circuit breaker.
+
+        Raises:
+            ServiceError: If the request failed, or the service returned a
+                server error.
+        """
+        try:
+            response = await self._transport.request(method, host,
+                                                     headers=headers,
+                                                     data=data)
+        except asyncio.CancelledError:  # a subclass of Exception before 3.8
+            raise
+        except Exception as e:
+            self._breaker.failure()
+            raise ServiceError(str(e) or type(e).__name__) from e
+        if response.status >= 500:
+            self._breaker.failure()
+            raise ServiceError(f"HTTP {response.status}")
+        return response
+
+    async def _json(self, response: Response) -> Any:
+        """Decode a response with self.decoder, recording the outcome in the
+        circuit breaker.
+
+        Raises:
+            ServiceError: If the response is not valid json (e.g. an HTML
+                error page).
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get(host, headers=headers) as response:
-                data = await response.json()
-                return data
+        try:
+            data = await self.decoder.decode(response.body)
+        except ValueError as e:
+            self._breaker.failure()
+            raise ServiceError("invalid response") from e
+        self._breaker.success()
+        return data
+
+    async def _aget(self, host: str, headers: Dict[str, Any]) -> Any:
+        return await self._json(await self._request(host, headers))
+
+    async def _aget_pooled(self, host: str) -> Any:
+        while True:
+            token = self._pool.acquire()
+            response = await self._request(host, self.token_headers(token))
+            if response.status not in (401, 429) \
+                    or not self._pool.throttle(token, response.status):
+                return await self._json(response)
+
+    async def asend(self,
+                    host: str,
+                    body: Optional[Dict[str, Any]] = None,
+                    method: str = "POST") -> Any:
+        """Generic asynchronous request changing the state of the service
+        (e.g. restarting a build).
+
+        Unlike aget(), the request is never coalesced with other requests.
+        Tokens are taken from the token pool, so that a token rejected (401)
+        or throttled (429) is replaced by another one, if available; if
+        every token is throttled, the request is retried up to RETRIES
+        times, after the time suggested by the service.
+
+        Args:
+            host: Url to request.
+            body: Dictionary to send as json (default: no body).
+            method: HTTP method.
+
+        Returns:
+            Decoded response (or None if the response is empty).
+
+        Raises:
+            ServiceUnavailable: If the circuit breaker of the service is
+                open.
+            ServiceError: If the request failed.
+        """
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+        attempt = 0
+        while True:
+            if self._breaker.is_open():
+                raise ServiceUnavailable(f"{self.name} is unavailable")
+            token = self._pool.acquire()
+            headers = dict(self.token_headers(token))
+            if body is not None:
+                headers["Content-Type"] = "application/json"
+            response = await self._request(host, headers, method, data)
+            if response.status in (401, 429) \
+                    and self._pool.throttle(token, response.status):
+                continue  # another token is available
+            if response.status != 429 or attempt == self.RETRIES:
+                break
+            attempt += 1
+            await asyncio.sleep(self.retry_after(response))
+        if response.status >= 400:
+            raise ServiceError(f"HTTP {response.status}")
+        if not response.body.strip():
+            return None
+        return await self._json(response)
+
+    @staticmethod
+    def retry_after(response: Response) -> float:
+        """Return the seconds to wait before retrying a throttled request.
+
+        Args:
+            response: Throttled response.
+
+        Returns:
+            Seconds suggested by the Retry-After header (1 if missing or not
+            a number of seconds), at most 60.
+        """
+        for key, value in response.headers.items():
+            if key.casefold() == "retry-after":
+                try:
+                    return min(max(float(value), 0), 60)
+                except ValueError:
+                    break
+        return 1
+
+    @staticmethod
+    def run(coro) -> Any:
+        """Run the given coroutine in the current event loop.
+
+        Args:
+            coro: Coroutine to run.
+
+        Returns:
+            Result of the coroutine.
+        """
+        loop = asyncio.get_event_loop()
+        if _CIService.monitor is not None:  # measure loop lag while running
+            coro = _CIService.monitor.watch(coro)
+        return loop.run_until_complete(coro)
+
+    def close(self):
+        """Close the transport, if it was created by this instance."""
+        if self._owns_transport:
+            self.run(self._transport.close())
 
 
 class TravisCI(_CIService):
     """Class used to get and manipulate data from the TravisCI platform."""
 
+    name = "travis"
+    can_restart = True
+
     def __init__(self,
-                 token: str = "replace_me",
+                 token: Union[str, List[str]] = "replace_me",
                  branch: str = "master",
-                 repo: Optional[str] = None):
+                 repo: Optional[str] = None,
+                 transport: Union[str, Transport] = "aiohttp",
+                 webhook_age: float = 0,
+                 budget: float = 0,
+                 details: bool = False,
+                 shard: Optional[Tuple[int, int]] = None):
         url = "https://api.travis-ci.com"
-        super().__init__(token, url, branch, repo)
+        super().__init__(token, url, branch, repo, transport, webhook_age,
+                         budget, details, shard)
 
-    @property
-    def headers(self) -> Dict[str, str]:
-        """Return headers used to connect to the API.
+    def token_headers(self, token: str) -> Dict[str, str]:
+        """Return headers used to connect to the API with the given token.
+
+        Args:
+            token: Authentication token.
 
         Returns:
             Dictionary with API headers.
         """
         return {"Travis-API-Version": "3",
                 "User-Agent": "quickCI",
-                "Authorization": f"token {self._token}"}
+                "Authorization": f"token {token}"}
 
-    @property
-    def login(self) -> str:
+    async def alogin(self) -> str:
         """Get login information from the API.
 
         Returns:
             Login information from the API.
         """
-        response = requests.get(f"{self._url}/user", headers=self.headers)
-        data = response.json()
+        data = await self.aget(f"{self._url}/user")
         return data.get("login", "")
 
-    def projects(self) -> List[Tuple[str, str]]:
+    async def aiter_projects(self) -> AsyncIterator[List[Tuple[str, str, Optional[Dict]]]]:
+        """Yield name and id of each repository, a page at a time.
+
+        The default branch of each repository is requested together with
+        its last build, so that no further request is needed for
+        repositories whose default branch is the one being checked.
+
+        Yields:
+            Name, id and (if it is the branch being checked) default branch
+            for each repo in a page.
+        """
+        login = await self.alogin()
+        url = (f"{self._url}/owner/{login}/repos?repository.active=true"
+               f"&include=repository.default_branch,branch.last_build,"
+               f"build.commit"
+               f"&limit=100")
+        while url:
+            data = await self.aget(url)
+            projs = []
+            for el in data.get("repositories", []):
+                branch = el.get("default_branch") or {}
+                projs.append((el["name"], el["id"],
+                              branch if branch.get("name") == self._branch
+                              else None))
+            yield projs
+            next_page = data.get("@pagination", {}).get("next")
+            url = f"{self._url}{next_page['@href']}" if next_page else None
+
+    async def aprojects(self) -> List[Tuple[str, str, Optional[Dict]]]:
         """Find name and id of each repository.
 
         Returns:
-            Name and id for each repo available.
+            Name, id and (if it is the branch being checked) default branch
+            for each repo available.
+        """
+        return [proj async for projs in self.aiter_projects()
+                for proj in projs]
+
+    async def alookup(self, repo: str) -> List[Tuple[str, str, None]]:
+        """Return the given repository without listing every project.
+
+        Args:
+            repo: Repository name, or slug (owner/name) to also skip the
+                login request.
+
+        Returns:
+            List with a single (name, slug, None) tuple, since Travis CI
+            accepts the url-encoded slug in place of the repository id.
         """
-        url = f"{self._url}/owner/{self.login}/repos?repository.active=True"
-        response = requests.get(url, headers=self.headers)
-        data = response.json()
-        return [(el["name"], el["id"]) for el in data.get("repositories")]
+        slug = repo if "/" in repo else f"{await self.alogin()}/{repo}"
+        return [(slug.split("/")[-1], quote(slug, safe=""), None)]
+
+    async def astatus(self,
+                      repo: Tuple[str, str, Optional[Dict]]) -> List[BuildStatus]:
+        """Return name and build status for the given repo and branch.
 
-    async def astatus(self, repo: Tuple[str, str]):
-        """Print name and build status for the given repo and branch.
+        The last build is taken from the branch included in the repository
+        listing if available, otherwise only the branch (with its last
+        build) is requested.
 
         Args:
-            repo: Repo tuple as returned by self.repositories().
+            repo: Repo tuple as returned by self.aprojects().
         """
-        url = f"{self._url}/repo/{repo[1]}/builds?branch.name={self._branch}&sort_by=id:desc"
-        status = await self.aget(url, headers=self.headers)
+        branch = repo[2]
+        if branch is None:
+            url = (f"{self._url}/repo/{repo[1]}/branch/"
+                   f"{quote(self._branch, safe='')}?include=build.commit")
+            branch = await self.aget(url)
         repo_name = repo[0]
-        try:
-            repo_stat = status.get("builds")[0].get("state")
-            self._found = True
-            click.secho(f"\t{repo_name} -> {repo_stat}", fg=self.colours[repo_stat])
-        except IndexError:  # no builds within the given branch
-            return
+        last_build = branch.get("last_build")
+        if last_build is None:  # no builds within the given branch
+            return []
 
-        return
+        build_id = last_build.get("id")
+        return [self.result(repo_name, last_build.get("state"),
+                            sha=(last_build.get("commit") or {}).get("sha"),
+                            build=(build_id, f"{self._url}/build/{build_id}/"
+                                             f"jobs?include=job.stage"))]
 
-    def status(self):
-        """Perform the async call to retrieve repo status for each repo
-        available in self.repos_ids().
+    def details(self, data: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """Return name (stage and number) and state of each job of a build.
+
+        Args:
+            data: Response to the request of the jobs of the build.
+
+        Returns:
+            List of (job name, job state) tuples.
         """
-        if self._token == "replace_me":
-            click.secho("Please replace the default token with a valid one "
-                        "using `quickci config update`, or provide one "
-                        "directly using `--token`.", fg="red")
-            return
-        projs = self.projects()
-        loop = asyncio.get_event_loop()
-        if self._repo:
-            tasks = [self.astatus(el) for el in projs if el[0] == self._repo]
-        else:
-            tasks = [self.astatus(el) for el in projs]
-        loop.run_until_complete(asyncio.gather(*tasks))
-        if self._found is False:
-            click.secho("\tNo build found.", fg="magenta")
-        return
+        jobs = []
+        for job in data.get("jobs") or []:
+            stage = (job.get("stage") or {}).get("name")
+            name = f"{stage} #{job.get('number')}" if stage \
+                else f"#{job.get('number')}"
+            jobs.append((name, job.get("state")))
+        return jobs
+
+    async def arestart(self, repo: str) -> str:
+        """Restart the build of the given repo found by self.astatuses().
+
+        Args:
+            repo: Repository name, as in BuildStatus.repo.
+
+        Returns:
+            Id of the restarted build.
+
+        Raises:
+            ServiceError: If no build of the repo was found, or the build
+                could not be restarted.
+        """
+        build_id = self.found_build(repo)
+        await self.asend(f"{self._url}/build/{build_id}/restart")
+        return build_id
+
+    async def ajob(self, repo: str) -> Optional[Tuple[str, str]]:
+        """Return the first job of the latest build of the given repo and
+        branch.
+
+        Args:
+            repo: Repository name, or slug (owner/name).
+
+        Returns:
+            Url of the job log, and job id (or None if the branch has no
+            builds).
+        """
+        slug = (await self.alookup(repo))[0][1]
+        branch = await self.aget(f"{self._url}/repo/{slug}/branch/"
+                                 f"{quote(self._branch, safe='')}"
+                                 f"?include=build.jobs")
+        jobs = (branch.get("last_build") or {}).get("jobs") or []
+        if not jobs:
+            return None
+        return f"{self._url}/job/{jobs[0]['id']}/log.txt", str(jobs[0]["id"])
+
+    async def ajob_running(self, repo: str, job: str) -> bool:
+        data = await self.aget(f"{self._url}/job/{job}")
+        return data.get("state") in PENDING
+
+    async def abuilds(self,
+                      repo: Tuple[str, str, Optional[Dict]],
+                      since: float) -> List[Build]:
+        """Return the builds of the given repo and branch since the given
+        time, a page of 100 builds at a time.
+
+        Args:
+            repo: Repo tuple as returned by self.aprojects().
+            since: Epoch seconds.
+        """
+        url = (f"{self._url}/repo/{repo[1]}/builds?branch.name="
+               f"{quote(self._branch, safe='')}&sort_by=id:desc&limit=100")
+        builds = []
+        while url:
+            data = await self.aget(url)
+            for el in data.get("builds", []):
+                build = self.build(repo[0], el.get("state"), None,
+                                   el.get("started_at"), el.get("finished_at"))
+                if self.before(build, since):
+                    return builds
+                builds.append(build)
+            next_page = data.get("@pagination", {}).get("next")
+            url = f"{self._url}{next_page['@href']}" if next_page else None
+        return builds
 
 
 class CircleCI(_CIService):
     """Class used to get and manipulate data from the CircleCI platform."""
 
+    name = "circle"
+    can_restart = True
+
     def __init__(self,
-                 token: str = "replace_me",
+                 token: Union[str, List[str]] = "replace_me",
                  branch: str = "master",
-                 repo: Optional[str] = None):
+                 repo: Optional[str] = None,
+                 transport: Union[str, Transport] = "aiohttp",
+                 webhook_age: float = 0,
+                 budget: float = 0,
+                 details: bool = False,
+                 shard: Optional[Tuple[int, int]] = None):
         url = "https://circleci.com/api/v1.1"
-        super().__init__(token, url, branch, repo)
+        super().__init__(token, url, branch, repo, transport, webhook_age,
+                         budget, details, shard)
 
-    @property
-    def headers(self) -> Dict[str, str]:
-        """Return headers used to connect to the API.
+    def token_headers(self, token: str) -> Dict[str, str]:
+        """Return headers used to connect to the API with the given token.
+
+        Args:
+            token: Authentication token.
 
         Returns:
             Dictionary with API headers.
         """
-        return {"circle-token": self._token}
+        return {"circle-token": token}
 
-    def projects(self) -> List[Dict[str, Any]]:
+    async def aprojects(self) -> List[Dict[str, Any]]:
         """Return projects information from the API.
 
         Returns:
             Json dictionary with API response.
         """
-        response = requests.get(f"{self._url}/projects?", headers=self.headers)
-        return response.json()
+        return await self.aget(f"{self._url}/projects?")
+
+    def repo_name(self, proj: Dict[str, Any]) -> str:
+        return proj.get("reponame")
+
+    def project_url(self, proj: Dict[str, Any]) -> str:
+        """Return the API url of a project.
+
+        Args:
+            proj: Project dict as returned by self.aprojects().
+
+        Returns:
+            Url of the project.
+        """
+        vcs = "github" if "github.com" in proj.get("vcs_url", "github.com") \
+            else "bitbucket"
+        return (f"{self._url}/project/{vcs}/{proj.get('username')}/"
+                f"{proj.get('reponame')}")
+
+    async def ajob(self, repo: str) -> Optional[Tuple[str, str]]:
+        """Build logs are not supported: the CircleCI API only provides the
+        output of a step once it is finished, as a single json document
+        (the output of running steps is only streamed to the web app), so it
+        can neither be followed nor requested from an offset.
+        """
+        raise NotSupported("Build logs are not available for circle: "
+                           "the CircleCI API only provides the output "
+                           "of finished steps, which cannot be "
+                           "followed.")
+
+    async def aartifacts(self, repo: str) -> List[Tuple[str, str, Optional[int]]]:
+        """Return the artifacts of the latest build of the given repo and
+        branch.
+
+        Args:
+            repo: Repository name.
+
+        Returns:
+            List of (path, download url, None) tuples (CircleCI does not
+            report the size of artifacts).
+        """
+        projs = await self.alookup(repo)
+        if not projs:
+            return []
+        data = await self.aget(f"{self.project_url(projs[0])}/latest/artifacts"
+                               f"?branch={quote(self._branch, safe='')}")
+        return [(el.get("path"), el.get("url"), None) for el in data]
 
-    def astatus(self, repo: Dict[str, Any]):
-        """Print name and build status for the given repo and branch.
+    async def arestart(self, repo: str) -> str:
+        """Rerun the failed jobs of the workflow of the given repo found by
+        self.astatuses() (API v2).
 
         Args:
-            repo: Repo dict as returned by self.projects().
+            repo: Repository name, as in BuildStatus.repo.
+
+        Returns:
+            Id of the workflow.
+
+        Raises:
+            ServiceError: If no workflow of the repo was found, or the
+                workflow could not be rerun.
+        """
+        workflow = self.found_build(repo)
+        await self.asend(f"{self._url.replace('/v1.1', '/v2')}/workflow/"
+                         f"{workflow}/rerun", {"from_failed": True})
+        return workflow
+
+    async def astatus(self, repo: Dict[str, Any]) -> List[BuildStatus]:
+        """Return name and build status for the given repo and branch.
+
+        The build status is already included in the projects information,
+        so no further request is needed.
+
+        Args:
+            repo: Repo dict as returned by self.aprojects().
         """
         repo_name = repo.get("reponame")
         try:
-            repo_stat = (repo.get("branches").get(self._branch).get("latest_workflows")
-                         .get("workflow").get("status"))
-            self._found = True
-            click.secho(f"\t{repo_name} -> {repo_stat}", fg=self.colours[repo_stat])
+            branch = repo.get("branches").get(self._branch)
+            workflow = branch.get("latest_workflows").get("workflow")
+            repo_stat = workflow.get("status")
         except AttributeError:  # no builds within the given branch
-            return
-        return
+            return []
+        builds = branch.get("running_builds") or branch.get("recent_builds") \
+            or [{}]
+        build = None
+        if workflow.get("id"):
+            build = (workflow["id"], f"{self._url.replace('/v1.1', '/v2')}/"
+                                     f"workflow/{workflow['id']}/job")
+        return [self.result(repo_name, repo_stat,
+                            sha=builds[0].get("vcs_revision"), build=build)]
+
+    def details(self, data: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """Return name and status of each job of a workflow.
 
-    def status(self):
-        """Return name and build status for each project available.
+        Args:
+            data: Response to the request of the jobs of the workflow (API
+                v2).
+
+        Returns:
+            List of (job name, job status) tuples.
         """
-        if self._token == "replace_me":
-            click.secho("Please replace the default token with a valid one "
-                        "using `quickci config update`, or provide one "
-                        "directly using `--token`.", fg="red")
-            return
-        projs = self.projects()
-        loop = asyncio.get_event_loop()
-        executor = ThreadPoolExecutor()
-        if self._repo:
-            tasks = [loop.run_in_executor(executor, self.astatus, repo)
-                     for repo in projs if repo.get("reponame") == self._repo]
+        return [(job.get("name"), job.get("status"))
+                for job in data.get("items") or []]
+
+    async def abuilds(self, repo: Dict[str, Any], since: float) -> List[Build]:
+        """Return the builds of the given repo and branch since the given
+        time, a page of 100 builds at a time.
+
+        Args:
+            repo: Repo dict as returned by self.aprojects().
+            since: Epoch seconds.
+        """
+        url = (f"{self.project_url(repo)}/tree/"
+               f"{quote(self._branch, safe='')}?limit=100")
+        builds = []
+        offset = 0
+        while True:
+            page = await self.aget(f"{url}&offset={offset}")
+            for el in page:
+                build = self.build(repo.get("reponame"), el.get("status"),
+                                   el.get("queued_at"), el.get("start_time"),
+                                   el.get("stop_time"))
+                if self.before(build, since):
+                    return builds
+                builds.append(build)
+            if len(page) < 100:
+                return builds
+            offset += 100
+
+
+class AppVeyor(_CIService):
+    """Class used to get and manipulate data from the AppVeyor platform.
+
+    Attributes:
+        MAX_REQUESTS: Maximum number of concurrent requests for the status
+            of single branches.
+    """
+
+    MAX_REQUESTS = 10
+
+    name = "appveyor"
+    can_restart = True
+
+    def __init__(self,
+                 token: Union[str, List[str]] = "replace_me",
+                 branch: str = "master",
+                 repo: Optional[str] = None,
+                 transport: Union[str, Transport] = "aiohttp",
+                 webhook_age: float = 0,
+                 budget: float = 0,
+                 details: bool = False,
+                 shard: Optional[Tuple[int, int]] = None):
+        url = "https://ci.appveyor.com/api"
+        super().__init__(token, url, branch, repo, transport, webhook_age,
+                         budget, details, shard)
+        self._semaphore = None
+
+    def token_headers(self, token: str) -> Dict[str, str]:
+        """Return headers used to connect to the API with the given token.
+
+        Args:
+            token: Authentication token.
+
+        Returns:
+            Dictionary with API headers.
+        """
+        return {"Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"}
+
+    async def aprojects(self) -> List[Dict[str, Any]]:
+        """Return projects information from the API.
+
+        The account name is stored in the cache, so that following calls to
+        self.alookup() will not need to list projects again.
+
+        Returns:
+            Json dictionary with API response.
+        """
+        projs = await self.aget(f"{self._url}/projects")
+        if projs:
+            cache = Cache("appveyor")
+            cache.content[self.token_key] = projs[0].get("accountName")
+            cache.save()
+        return projs
+
+    def repo_name(self, proj: Dict[str, Any]) -> str:
+        return proj.get("slug")
+
+    async def alookup(self, repo: str) -> List[Dict[str, Any]]:
+        """Return the given repository without listing every project.
+
+        Args:
+            repo: Repository slug, or account/slug.
+
+        Returns:
+            List with a single project dictionary (holding only slug and
+            account name), or the matching projects from self.aprojects()
+            if the account name is not known yet.
+        """
+        if "/" in repo:
+            account, _, slug = repo.partition("/")
         else:
-            tasks = [loop.run_in_executor(executor, self.astatus, repo)
-                     for repo in projs]
-        asyncio.gather(*tasks)
-        if self._found is False:
-            click.secho("\tNo build found.", fg="magenta")
-        return
+            account, slug = Cache("appveyor").content.get(self.token_key), repo
+        if account is None:
+            return await super().alookup(repo)
+        return [{"slug": slug, "accountName": account}]
+
+    async def astatus(self, repo: Dict[str, Any]) -> List[BuildStatus]:
+        """Return name and build status for the given repo and branch.
+
+        The most recent build included in the projects information is used
+        if it belongs to the branch being checked; otherwise the branch
+        status is requested, with at most MAX_REQUESTS concurrent requests.
+
+        Args:
+            repo: Repo dict as returned by self.aprojects().
+        """
+        slug, account = repo.get("slug"), repo.get("accountName")
+        builds = repo.get("builds") or []
+        if builds and builds[0].get("branch") == self._branch:
+            return [self.result(slug, builds[0].get("status"),
+                                sha=builds[0].get("commitId"),
+                                build=self.build_ref(repo, builds[0]))]
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.MAX_REQUESTS)
+        url = f"{self._url}/projects/{account}/{slug}/branch/{self._branch}"
+        async with self._semaphore:
+            status = await self.aget(url)
+        build = status.get("build")
+        if build is None:  # no builds within the given branch
+            return []
+        return [self.result(slug, build.get("status"),
+                            sha=build.get("commitId"),
+                            build=self.build_ref(repo, build))]
+
+    def build_ref(self, repo: Dict[str, Any],
+                  build: Dict[str, Any]) -> Tuple[str, str]:
+        """Return id and url of a build of the given repo.
+
+        Args:
+            repo: Repo dict as returned by self.aprojects().
+            build: Build dict.
+
+        Returns:
+            Build id, and url of the build with its jobs.
+        """
+        return (build.get("buildId"),
+                f"{self._url}/projects/{repo.get('accountName')}/"
+                f"{repo.get('slug')}/build/{build.get('version')}")
 
+    def details(self, data: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """Return name (or id, for unnamed jobs) and status of each job of a
+        build.
 
-class AppVeyor(_CIService):
-    """Class used to get and manipulate data from the AppVeyor platform."""
+        Args:
+            data: Response to the request of the build.
 
-    def __init__(self,
-                 token: str = "replace_me",
-                 branch: str = "master",
-                 repo: Optional[str] = None):
-        url = "https://ci.appveyor.com/api"
-        super().__init__(token, url, branch, repo)
+        Returns:
+            List of (job name, job status) tuples.
+        """
+        return [(job.get("name") or job.get("jobId"), job.get("status"))
+                for job in (data.get("build") or {}).get("jobs") or []]
 
-    @property
-    def headers(self) -> Dict[str, str]:
-        """Return headers used to connect to the API.
+    async def abranch_build(self, repo: str) -> Optional[Dict[str, Any]]:
+        """Return the latest build of the given repo and branch.
+
+        Args:
+            repo: Repository slug, or account/slug.
 
         Returns:
-            Dictionary with API headers.
+            Build dictionary (or None if the branch has no builds).
         """
-        return {"Authorization": f"Bearer {self._token}",
-                "Content-Type": "application/json"}
+        projs = await self.alookup(repo)
+        if not projs:
+            return None
+        slug, account = projs[0].get("slug"), projs[0].get("accountName")
+        status = await self.aget(f"{self._url}/projects/{account}/{slug}/"
+                                 f"branch/{self._branch}")
+        return status.get("build")
+
+    async def ajob(self, repo: str) -> Optional[Tuple[str, str]]:
+        """Return the first job of the latest build of the given repo and
+        branch.
 
-    def projects(self) -> List[Dict[str, Any]]:
-        """Return projects information from the API.
+        Args:
+            repo: Repository slug, or account/slug.
 
         Returns:
-            Json dictionary with API response.
+            Url of the job log, and job id (or None if the branch has no
+            builds).
         """
-        response = requests.get(f"{self._url}/projects", headers=self.headers)
+        jobs = ((await self.abranch_build(repo)) or {}).get("jobs") or []
+        if not jobs:
+            return None
+        job = jobs[0]["jobId"]
+        return f"{self._url}/buildjobs/{job}/log", job
 
-        return response.json()
+    async def aartifacts(self, repo: str) -> List[Tuple[str, str, Optional[int]]]:
+        """Return the artifacts of each job of the latest build of the given
+        repo and branch.
+
+        Args:
+            repo: Repository slug, or account/slug.
+
+        Returns:
+            List of (path, download url, size) tuples.
+        """
+        jobs = ((await self.abranch_build(repo)) or {}).get("jobs") or []
+        urls = [f"{self._url}/buildjobs/{job['jobId']}/artifacts"
+                for job in jobs]
+        listings = await asyncio.gather(*(self.aget(url) for url in urls))
+        return [(el.get("fileName"), f"{url}/{quote(el.get('fileName'))}",
+                 el.get("size"))
+                for url, listing in zip(urls, listings) for el in listing]
 
-    async def astatus(self, repo: str, account: str):
-        """Print name and build status for the given repo and branch.
+    async def arestart(self, repo: str) -> str:
+        """Re-run the build of the given repo found by self.astatuses().
 
         Args:
-            repo: Repository name.
-            account: Account name.
+            repo: Repository slug, as in BuildStatus.repo.
+
+        Returns:
+            Id of the re-run build.
+
+        Raises:
+            ServiceError: If no build of the repo was found, or the build
+                could not be re-run.
         """
-        url = f"{self._url}/projects/{account}/{repo}/branch/{self._branch}"
-        status = await self.aget(url, headers=self.headers)
-        try:
-            repo_stat = status.get("build").get("status")
-            self._found = True
-            click.secho(f"\t{repo} -> {repo_stat}", fg=self.colours[repo_stat])
-        except AttributeError:  # no builds within the given branch
-            return
-        return
+        build_id = self.found_build(repo)
+        await self.asend(f"{self._url}/builds",
+                         {"buildId": int(build_id), "reRunIncomplete": False},
+                         method="PUT")
+        return build_id
 
-    def status(self):
-        """Perform the async call to retrieve repo status for each repo
-        available in self.projects() for the current account.
+    async def ajob_running(self, repo: str, job: str) -> bool:
+        jobs = ((await self.abranch_build(repo)) or {}).get("jobs") or []
+        return any(el.get("jobId") == job and el.get("status") in PENDING
+                   for el in jobs)
+
+    async def abuilds(self, repo: Dict[str, Any], since: float) -> List[Build]:
+        """Return the builds of the given repo and branch since the given
+        time, a page of 100 builds at a time.
+
+        Args:
+            repo: Repo dict as returned by self.aprojects().
+            since: Epoch seconds.
         """
-        if self._token == "replace_me":
-            click.secho("Please replace the default token with a valid one "
-                        "using `quickci config update`, or provide one "
-                        "directly using `--token`.", fg="red")
-            return
-        projs = self.projects()
-        try:
-            account = projs[0].get("accountName")
-        except IndexError:  # no projects in AppVeyor
-            click.secho("\tNo projects found.", fg="magenta")
-            return
-        loop = asyncio.get_event_loop()
-        if self._repo:
-            tasks = [self.astatus(el.get("slug"), account)
-                     for el in projs if el.get("slug") == self._repo]
-        else:
-            tasks = [self.astatus(el.get("slug"), account) for el in projs]
-        loop.run_until_complete(asyncio.gather(*tasks))
-        if self._found is False:
-            click.secho("\tNo build found.", fg="magenta")
-        return
+        slug, account = repo.get("slug"), repo.get("accountName")
+        url = (f"{self._url}/projects/{account}/{slug}/history?recordsNumber="
+               f"100&branch={quote(self._branch, safe='')}")
+        builds = []
+        page_url = url
+        while True:
+            page = (await self.aget(page_url)).get("builds", [])
+            for el in page:
+                build = self.build(slug, el.get("status"), el.get("created"),
+                                   el.get("started"), el.get("finished"))
+                if self.before(build, since):
+                    return builds
+                builds.append(build)
+            if len(page) < 100:
+                return builds
+            page_url = f"{url}&startBuildId={page[-1].get('buildId')}"
 
 
 class Buddy(_CIService):
     """Class used to get and manipulate data from the Buddy platform."""
 
+    name = "buddy"
+
     def __init__(self,
-                 token: str = "replace_me",
+                 token: Union[str, List[str]] = "replace_me",
                  branch: str = "master",
-                 repo: Optional[str] = None):
+                 repo: Optional[str] = None,
+                 transport: Union[str, Transport] = "aiohttp",
+                 webhook_age: float = 0,
+                 budget: float = 0,
+                 details: bool = False,
+                 shard: Optional[Tuple[int, int]] = None):
         url = "https://api.buddy.works"
-        super().__init__(token, url, branch, repo)
+        super().__init__(token, url, branch, repo, transport, webhook_age,
+                         budget, details, shard)
+        self._executions: Optional[asyncio.Semaphore] = None
 
-    @property
-    def headers(self) -> Dict[str, str]:
-        """Return headers used to connect to the API.
+    def token_headers(self, token: str) -> Dict[str, str]:
+        """Return headers used to connect to the API with the given token.
+
+        Args:
+            token: Authentication token.
 
         Returns:
             Dictionary with API headers.
         """
-        return {"Authorization": f"Bearer {self._token}"}
+        return {"Authorization": f"Bearer {token}"}
 
-    def workspaces(self) -> List[str]:
+    async def aworkspaces(self) -> List[str]:
         """Return user's workspaces from the API.
 
         Returns:
             List of urls for each workspace.
         """
-        response = requests.get(f"{self._url}/workspaces", headers=self.headers)
-        wspaces = response.json()
+        wspaces = await self.aget(f"{self._url}/workspaces")
 
         return [el["url"] for el in wspaces.get("workspaces")]
 
-    def projects(self) -> List[Tuple[str, str]]:
+    async def aiter_projects(self) -> AsyncIterator[List[Tuple[str, str]]]:
+        """Yield user's projects, a workspace at a time (as soon as the
+        projects of each workspace are received).
+
+        Yields:
+            List of projects of a workspace.
+        """
+        wspaces = await self.aworkspaces()
+        tasks = [self.aget(f"{ws}/projects") for ws in wspaces]
+        for task in asyncio.as_completed(tasks):
+            proj = await task
+            yield [(el.get("name"), el.get("url"))
+                   for el in proj.get("projects")]
+
+    async def aprojects(self) -> List[Tuple[str, str]]:
         """Return user's projects for each workspace from the API.
 
         Returns:
             List of projects for each workspace.
         """
-        wspaces = self.workspaces()
-        loop = asyncio.get_event_loop()
-        tasks = [self.aget(f"{ws}/projects", headers=self.headers)
-                 for ws in wspaces]
-        projs = loop.run_until_complete(asyncio.gather(*tasks))
+        return [proj async for projs in self.aiter_projects()
+                for proj in projs]
+
+    async def alookup(self, repo: str) -> List[Tuple[str, str]]:
+        """Return the given repository without listing every project.
+
+        Args:
+            repo: Project name, or workspace/name to also skip the
+                workspaces request.
 
-        return [(el.get("name"), el.get("url"))
-                for proj in projs for el in proj.get("projects")]
+        Returns:
+            List of (name, url) tuples, one for each workspace (projects
+            missing from a workspace will simply have no pipelines).
+        """
+        if "/" in repo:
+            workspace, _, name = repo.partition("/")
+            wspaces = [f"{self._url}/workspaces/{workspace}"]
+        else:
+            wspaces, name = await self.aworkspaces(), repo
+        return [(name, f"{ws}/projects/{name}") for ws in wspaces]
 
-    async def astatus(self, repo: Tuple[str, Any]):
-        """Print name and build status for the given repo and branch.
+    async def astatus(self, repo: Tuple[str, Any]) -> List[BuildStatus]:
+        """Return name and build status of each pipeline for the given repo
+        and branch.
 
         Args:
-            repo: Repo tuple as returned by self.projects().
+            repo: Repo tuple as returned by self.aprojects().
         """
         repo_name = repo[0]
-        status = await self.aget(f"{repo[1]}/pipelines", headers=self.headers)
-        pipes = status.get("pipelines")
+        status = await self.aget(f"{repo[1]}/pipelines")
+        pipes = status.get("pipelines", [])
+        results = []
         for pipe in pipes:
             pipe_name = pipe.get("name")
             pipe_url = pipe.get("url")
-            response = await self.aget(f"{pipe_url}/executions",
-                                       headers=self.headers)
+            response = await self.aget(f"{pipe_url}/executions")
             executions = response.get("executions")
             for ex in executions:
                 ex_branch = ex.get("branch").get("name")
                 if ex_branch == self._branch:
-                    self._found = True
                     pipe_stat = ex.get("status")
-                    click.secho(f"\t{repo_name} ({pipe_name} pipeline) -> "
-                                f"{pipe_stat.casefold()}",
-                                fg=self.colours[pipe_stat])
+                    sha = (ex.get("to_revision") or {}).get("revision")
+                    results.append(self.result(repo_name, pipe_stat,
+                                               pipe_name, sha,
+                                               (ex.get("id"), ex.get("url"))))
                     break
 
-        return
+        return results
 
-    def status(self):
-        """Perform the async call to retrieve repo status for each repo
-        available in self.projects() for the current account.
+    def details(self, data: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """Return name and status of each action of an execution.
+
+        Args:
+            data: Response to the request of the execution.
+
+        Returns:
+            List of (action name, action status) tuples.
         """
-        if self._token == "replace_me":
-            click.secho("Please replace the default token with a valid one "
-                        "using `quickci config update`, or provide one "
-                        "directly using `--token`.", fg="red")
-            return
-        projs = self.projects()
-        loop = asyncio.get_event_loop()
-        if self._repo:
-            tasks = [self.astatus(repo)
-                     for repo in projs if repo == self._repo]
-        else:
-            tasks = [self.astatus(repo) for repo in projs]
-        loop.run_until_complete(asyncio.gather(*tasks))
-        if self._found is False:
-            click.secho("\tNo build found.", fg="magenta")
-        return
+        return [((action.get("action") or {}).get("name"), action.get("status"))
+                for action in data.get("action_executions") or []]
+
+    async def abuilds(self, repo: Tuple[str, Any], since: float) -> List[Build]:
+        """Return the executions of each pipeline of the given repo and
+        branch since the given time, a page of 100 executions at a time.
+
+        The executions of at most WORKERS pipelines (of any repo) are
+        requested at the same time.
+
+        Args:
+            repo: Repo tuple as returned by self.aprojects().
+            since: Epoch seconds.
+        """
+        if self._executions is None:
+            self._executions = asyncio.Semaphore(self.WORKERS)
+
+        async def executions(pipe):
+            async with self._executions:
+                return await pipe_executions(pipe)
+
+        async def pipe_executions(pipe):
+            builds = []
+            page = 1
+            while True:
+                response = await self.aget(f"{pipe.get('url')}/executions?"
+                                           f"page={page}&per_page=100")
+                items = response.get("executions", [])
+                for ex in items:
+                    build = self.build(repo[0], ex.get("status"), None,
+                                       ex.get("start_date"),
+                                       ex.get("finish_date"), pipe.get("name"))
+                    if self.before(build, since):
+                        return builds
+                    if (ex.get("branch") or {}).get("name") == self._branch:
+                        builds.append(build)
+                if len(items) < 100:
+                    return builds
+                page += 1
+
+        status = await self.aget(f"{repo[1]}/pipelines")
+        pipes = await asyncio.gather(*(executions(pipe) for pipe
+                                       in status.get("pipelines", [])))
+        return [build for builds in pipes for build in builds]
 
 
 class DroneCI(_CIService):
     """Class used to get and manipulate data from the Drone CI platform."""
 
+    name = "drone"
+    can_restart = True
+
     def __init__(self,
-                 token: str = "replace_me",
+                 token: Union[str, List[str]] = "replace_me",
                  branch: str = "master",
-                 repo: Optional[str] = None):
+                 repo: Optional[str] = None,
+                 transport: Union[str, Transport] = "aiohttp",
+                 webhook_age: float = 0,
+                 budget: float = 0,
+                 details: bool = False,
+                 shard: Optional[Tuple[int, int]] = None):
         url = "https://cloud.drone.io/api"
-        super().__init__(token, url, branch, repo)
+        super().__init__(token, url, branch, repo, transport, webhook_age,
+                         budget, details, shard)
 
-    @property
-    def headers(self) -> Dict[str, str]:
-        """Return headers used to connect to the API.
+    def token_headers(self, token: str) -> Dict[str, str]:
+        """Return headers used to connect to the API with the given token.
+
+        Args:
+            token: Authentication token.
 
         Returns:
             Dictionary with API headers.
         """
-        return {"Authorization": f"Bearer {self._token}"}
+        return {"Authorization": f"Bearer {token}"}
 
-    def projects(self) -> List[Tuple[str, str, int]]:
+    async def aprojects(self) -> List[Tuple[str, str, int]]:
         """Return user's projects from the API.
 
         Returns:
             List of projects.
         """
-        response = requests.get(f"{self._url}/user/repos",
-                                headers=self.headers)
-        repos = response.json()
+        repos = await self.aget(f"{self._url}/user/repos")
         actives = filter(lambda d: d["active"] is True, repos)
         # projs = [(el["name"], el["namespace"], el["counter"])
         projs = [(el["name"], el["slug"], el["counter"])
                  for el in actives]
         return projs
 
-    async def astatus(self, repo: Tuple[str, str, int]):
-        """Print name and build status for the given repo (latest build only).
+    async def alookup(self, repo: str) -> List[Tuple[str, str, int]]:
+        """Return the given repository without listing every project.
+
+        Args:
+            repo: Repository name, or slug (owner/name) to also skip the
+                user request.
+
+        Returns:
+            List with a single (name, slug, counter) tuple, or an empty list
+            if the repository does not exist.
+        """
+        if "/" not in repo:
+            user = await self.aget(f"{self._url}/user")
+            repo = f"{user.get('login')}/{repo}"
+        data = await self.aget(f"{self._url}/repos/{repo}")
+        if "counter" not in data:
+            return []
+        return [(data.get("name"), data.get("slug"), data.get("counter"))]
+
+    async def abranch_build(self,
+                            repo: Tuple[str, str, int]) -> Optional[Dict[str, Any]]:
+        """Return the latest build of the given repo and branch.
 
         Args:
-            repo: Repo tuple as returned by self.projects().
+            repo: Repo tuple as returned by self.aprojects().
+
+        Returns:
+            Build dictionary (or None if the branch has no builds).
         """
         build = repo[2]
         while build > 0:
-            status = await self.aget(f"{self._url}/repos/{repo[1]}/builds/{build}",
-                                     headers=self.headers)
-            build_source = status.get("source")
-            if build_source == self._branch:
-                self._found = True
-                break
-            else:
-                build -= 1
-        else:  # no builds within the given branch
-            return
+            status = await self.aget(f"{self._url}/repos/{repo[1]}/builds/{build}")
+            if status.get("source") == self._branch:
+                return status
+            build -= 1
+        return None  # no builds within the given branch
+
+    async def astatus(self, repo: Tuple[str, str, int]) -> List[BuildStatus]:
+        """Return name and build status for the given repo (latest build
+        only).
+
+        Args:
+            repo: Repo tuple as returned by self.aprojects().
+        """
+        status = await self.abranch_build(repo)
+        if status is None:
+            return []
 
         repo_name = repo[0]
         repo_stat = status.get("status")
-        click.secho(f"\t{repo_name} -> {repo_stat}", fg=self.colours[repo_stat])
-        return
+        number = status.get("number")
+        return [self.result(repo_name, repo_stat, sha=status.get("after"),
+                            build=(f"{repo[1]}/{number}",
+                                   f"{self._url}/repos/{repo[1]}/builds/"
+                                   f"{number}"))]
 
-    def status(self):
-        """Perform the async call to retrieve repo status for each repo
-        available in self.projects() for the current account.
+    def details(self, data: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """Return name and status of each stage of a build.
+
+        Args:
+            data: Response to the request of the build.
+
+        Returns:
+            List of (stage name, stage status) tuples.
         """
-        if self._token == "replace_me":
-            click.secho("Please replace the default token with a valid one "
-                        "using `quickci config update`, or provide one "
-                        "directly using `--token`.", fg="red")
-            return
-        projs = self.projects()
-        loop = asyncio.get_event_loop()
-        if self._repo:
-            tasks = [self.astatus(repo)
-                     for repo in projs if repo == self._repo]
-        else:
-            tasks = [self.astatus(repo) for repo in projs]
-        loop.run_until_complete(asyncio.gather(*tasks))
-        if self._found is False:
-            click.secho("\tNo build found.", fg="magenta")
-        return
+        return [(stage.get("name"), stage.get("status"))
+                for stage in data.get("stages") or []]
+
+    async def arestart(self, repo: str) -> str:
+        """Restart the build of the given repo found by self.astatuses().
+
+        Args:
+            repo: Repository name, as in BuildStatus.repo.
+
+        Returns:
+            Build id, as slug/number.
+
+        Raises:
+            ServiceError: If no build of the repo was found, or the build
+                could not be restarted.
+        """
+        build_id = self.found_build(repo)
+        slug, number = build_id.rsplit("/", 1)
+        await self.asend(f"{self._url}/repos/{slug}/builds/{number}")
+        return build_id
+
+    async def ajob(self, repo: str) -> Optional[Tuple[str, str]]:
+        """Build logs are not supported: the Drone API returns the log of a
+        step as a single json document (and the output of running steps only
+        as a server-sent event stream), with no way to request it from an
+        offset.
+        """
+        raise NotSupported("Build logs are not available for drone: "
+                           "the Drone API returns step logs as a whole "
+                           "json document, which cannot be requested "
+                           "from an offset.")
+
+    async def abuilds(self, repo: Tuple[str, str, int], since: float) -> List[Build]:
+        """Return the builds of the given repo and branch since the given
+        time, a page at a time.
+
+        Args:
+            repo: Repo tuple as returned by self.aprojects().
+            since: Epoch seconds.
+        """
+        builds = []
+        page = 1
+        while True:
+            items = await self.aget(f"{self._url}/repos/{repo[1]}/builds?"
+                                    f"page={page}")
+            for el in items:
+                build = self.build(repo[0], el.get("status"), el.get("created"),
+                                   el.get("started"), el.get("finished"))
+                if self.before(build, since):
+                    return builds
+                if el.get("source") == self._branch:
+                    builds.append(build)
+            if not items:
+                return builds
+            page += 1
 
 
 class GitLab:
@@ -492,6 +2038,7 @@ class GitLab:
 
         :return: List[Dict[str,Any]]
         """
+        import requests
         q = requests.get(f"{self._url}/users/{self.username}/projects",
                          headers=self.headers)
         return q.json()
@@ -513,23 +2060,197 @@ class GitLab:
         pass
 
 
-class Codeship:
-    """
-    TODO: Class used to get and manipulate data from the Codeship platform.
-    Token expires after an hour.
+class Codeship(_CIService):
+    """Class used to get and manipulate data from the Codeship platform.
+
+    Codeship requires an access token which is obtained by authenticating
+    with username and password (provided as ``username:password``), and
+    expires after an hour. The access token is cached in
+    ``~/.cache/quickci/codeship.json`` and reused until shortly before its
+    expiration; when it is about to expire, a new one is requested in the
+    background while the current one is still being used.
+
+    Since the access token is shared by every request, a single set of
+    credentials can be provided (no token pool).
     """
 
-    def __init__(self, token: str):
+    EXPIRY_MARGIN = 60
+    RENEW_WINDOW = 600
+
+    name = "codeship"
+
+    def __init__(self,
+                 token: Union[str, List[str]] = "replace_me",
+                 branch: str = "master",
+                 repo: Optional[str] = None,
+                 transport: Union[str, Transport] = "aiohttp",
+                 webhook_age: float = 0,
+                 budget: float = 0,
+                 details: bool = False,
+                 shard: Optional[Tuple[int, int]] = None):
+        if not isinstance(token, str):
+            raise ValueError("Codeship credentials cannot be pooled: please "
+                             "provide a single username:password.")
+        url = "https://api.codeship.com/v2"
+        super().__init__(token, url, branch, repo, transport, webhook_age,
+                         budget, details, shard)
+        self._cache = Cache("codeship")
+        self._renewal = None
+
+    @property
+    def auth(self) -> Dict[str, Any]:
+        """Return the cached authentication data for the current credentials.
+
+        Returns:
+            Dictionary with access token, expiration time and organizations.
+        """
+        return self._cache.content.get(self.token_key, {})
+
+    def token_headers(self, token: str) -> Dict[str, str]:
+        """Return headers used to connect to the API.
+
+        The cached access token is used instead of the given credentials.
+
+        Args:
+            token: Authentication credentials.
+
+        Returns:
+            Dictionary with API headers.
         """
+        return {"Authorization": f"Bearer {self.auth.get('access_token')}",
+                "Content-Type": "application/json"}
+
+    def expires_in(self) -> float:
+        """Return the number of seconds before the cached token expires.
 
-        :param str token: authentication token provided by Codeship
+        Returns:
+            Seconds left before expiration (negative if already expired).
         """
-        self.token = token
-        self._url = "https://api.codeship.com/v2"
+        return self.auth.get("expires_at", 0) - time.time()
 
-    @property
-    def headers(self):
-        return {"Authorization": f"Bearer {self.token}"}
+    async def aauthenticate(self):
+        """Request a new access token and store it in the cache.
+
+        Raises:
+            ServiceError: If the credentials were rejected, or no access
+                token was returned.
+        """
+        credentials = base64.b64encode(self._token.encode()).decode()
+        headers = {"Authorization": f"Basic {credentials}",
+                   "Content-Type": "application/json"}
+        response = await self._request(f"{self._url}/auth", headers, "POST")
+        if not 200 <= response.status < 300:
+            raise ServiceError(f"authentication failed (HTTP "
+                               f"{response.status})")
+        data = await self._json(response)
+        if not isinstance(data, dict) or not data.get("access_token"):
+            raise ServiceError("authentication failed (no access token)")
+        self._cache.update(self.token_key, {
+            "access_token": data["access_token"],
+            "expires_at": data.get("expires_at", 0),
+            "organizations": [org.get("uuid")
+                              for org in data.get("organizations", [])]
+        })
+
+    async def alogin(self):
+        """Make sure a valid access token is available.
+
+        A new token is requested (and waited for) only if the cached one is
+        missing or about to expire; if it will expire soon, it is renewed in
+        the background while the cached one is still used.
+        """
+        expires_in = self.expires_in()
+        if expires_in <= self.EXPIRY_MARGIN:
+            await self.aauthenticate()
+        elif expires_in <= self.RENEW_WINDOW:
+            self._renewal = asyncio.ensure_future(self.aauthenticate())
+
+    async def aiter_projects(self) -> AsyncIterator[List[Tuple[str, str, str]]]:
+        """Yield user's projects, an organization at a time (as soon as the
+        projects of each organization are received).
+
+        Yields:
+            List of (name, organization uuid, project uuid) tuples.
+        """
+        async def org_projects(org):
+            proj = await self.aget(f"{self._url}/organizations/{org}/projects")
+            return [(el.get("name"), org, el.get("uuid"))
+                    for el in proj.get("projects", [])]
+
+        orgs = self.auth.get("organizations", [])
+        for task in asyncio.as_completed([org_projects(org) for org in orgs]):
+            yield await task
+
+    async def aprojects(self) -> List[Tuple[str, str, str]]:
+        """Return user's projects for each organization from the API.
+
+        Returns:
+            List of (name, organization uuid, project uuid) tuples.
+        """
+        return [proj async for projs in self.aiter_projects()
+                for proj in projs]
+
+    async def astatus(self, repo: Tuple[str, str, str]) -> List[BuildStatus]:
+        """Return name and build status for the given repo and branch.
+
+        Args:
+            repo: Repo tuple as returned by self.aprojects().
+        """
+        repo_name = repo[0]
+        url = f"{self._url}/organizations/{repo[1]}/projects/{repo[2]}/builds"
+        status = await self.aget(url)
+        for build in status.get("builds", []):
+            if build.get("branch") == self._branch:
+                return [self.result(repo_name, build.get("status"),
+                                    sha=build.get("commit_sha"))]
+
+        return []
+
+    async def abuilds(self, repo: Tuple[str, str, str], since: float) -> List[Build]:
+        """Return the builds of the given repo and branch since the given
+        time, a page of 50 builds at a time.
+
+        Args:
+            repo: Repo tuple as returned by self.aprojects().
+            since: Epoch seconds.
+        """
+        url = f"{self._url}/organizations/{repo[1]}/projects/{repo[2]}/builds"
+        builds = []
+        page = 1
+        while True:
+            status = await self.aget(f"{url}?page={page}&per_page=50")
+            items = status.get("builds", [])
+            for el in items:
+                build = self.build(repo[0], el.get("status"),
+                                   el.get("queued_at"), el.get("allocated_at"),
+                                   el.get("finished_at"))
+                if self.before(build, since):
+                    return builds
+                if el.get("branch") == self._branch:
+                    builds.append(build)
+            if len(items) < 50:
+                return builds
+            page += 1
+
+    async def ahistory(self, since: float) -> List[Build]:
+        """Authenticate if needed and return the builds of each project."""
+        await self.alogin()
+        try:
+            return await super().ahistory(since)
+        finally:
+            if self._renewal is not None:
+                await self._renewal
+
+    async def astatuses(self) -> AsyncIterator[BuildStatus]:
+        """Authenticate if needed and yield the build status of each
+        project."""
+        await self.alogin()
+        try:
+            async for result in super().astatuses():
+                yield result
+        finally:
+            if self._renewal is not None:
+                await self._renewal
 
 
 class Config:
@@ -541,7 +2262,8 @@ class Config:
     "CIRCLECI_TOKEN": "replace_me",
     "APPVEYOR_TOKEN": "replace_me",
     "BUDDY_TOKEN": "replace_me",
-    "DRONE_TOKEN": "replace_me"
+    "DRONE_TOKEN": "replace_me",
+    "CODESHIP_TOKEN": "replace_me"
 }
 """
 
@@ -549,7 +2271,8 @@ class Config:
                 "circle": "CIRCLECI_TOKEN",
                 "appveyor": "APPVEYOR_TOKEN",
                 "buddy": "BUDDY_TOKEN",
-                "drone": "DRONE_TOKEN"}
+                "drone": "DRONE_TOKEN",
+                "codeship": "CODESHIP_TOKEN"}
 
     def __init__(self):
         self._temporary = False
@@ -604,12 +2327,12 @@ class Config:
             f.write(self.DEFAULT_CONFIG)
         self._temporary = False
 
-    def update(self, service: str, token: str):
+    def update(self, service: str, token: Union[str, List[str]]):
         """Update a given service token with a new one.
 
         Args:
             service: Service name.
-            token: New token.
+            token: New token, or list of tokens.
         """
         self.content[self.SERVICES[service]] = token
 
@@ -624,5 +2347,247 @@ class Config:
         """
         return pprint.pprint(self.content)
 
+    def pinned(self, service: str) -> List[str]:
+        """Return the repositories pinned for a service.
+
+        Args:
+            service: Service name.
+
+        Returns:
+            List of repository names.
+        """
+        return self.content.get("PINNED", {}).get(service, [])
+
+    def pin(self, service: str, repo: str):
+        """Pin a repository, so that it is checked first.
+
+        Args:
+            service: Service name.
+            repo: Repository name.
+        """
+        pinned = self.content.setdefault("PINNED", {}).setdefault(service, [])
+        if repo not in pinned:
+            pinned.append(repo)
+
+    def unpin(self, service: str, repo: str):
+        """Unpin a repository.
+
+        Args:
+            service: Service name.
+            repo: Repository name.
+        """
+        pinned = self.content.get("PINNED", {}).get(service, [])
+        if repo in pinned:
+            pinned.remove(repo)
+
     def __getitem__(self, item):
-        return self.content[self.SERVICES[item]]
+        # config files created before a service was added have no token
+        # for it, which is the same as not having replaced the default one
+        return self.content.get(self.SERVICES[item], "replace_me")
+
+
+class CircuitBreaker:
+    """Class that stops requests to a CI service which keeps failing.
+
+    After THRESHOLD consecutive failed requests the breaker opens, and every
+    request to the service fails immediately for COOLDOWN seconds; after
+    that, requests are tried again (half-open): the first success closes
+    the breaker, while a failure opens it again. The state of the breaker
+    is stored in the cache, so that it is kept between runs.
+
+    Args:
+        service: Service name.
+    """
+
+    THRESHOLD = 5
+    COOLDOWN = 300
+
+    def __init__(self, service: str):
+        self.service = service
+        self._cache = Cache("breakers")
+
+    @property
+    def state(self) -> Dict[str, float]:
+        """Return the number of consecutive failures and the time the
+        breaker was last opened."""
+        return self._cache.content.get(self.service, {"failures": 0,
+                                                      "opened": 0})
+
+    def retry_in(self) -> float:
+        """Return the number of seconds before requests are tried again."""
+        return max(0, self.state["opened"] + self.COOLDOWN - time.time())
+
+    def is_open(self) -> bool:
+        """Return whether requests to the service should fail immediately."""
+        return self.state["failures"] >= self.THRESHOLD and self.retry_in() > 0
+
+    def failure(self):
+        """Record a failed request, opening the breaker if needed."""
+        self._cache.content = self._cache.parse()  # failures of other runs
+        state = dict(self.state)
+        state["failures"] += 1
+        if state["failures"] >= self.THRESHOLD:
+            state["opened"] = time.time()
+        self._cache.update(self.service, state)
+
+    def success(self):
+        """Record a successful request, closing the breaker."""
+        if self.state["failures"]:
+            self._cache.update(self.service)
+
+
+class TokenPool:
+    """Class that spreads requests across several tokens with the same
+    visibility, to multiply the rate limit available.
+
+    Tokens are used in turns, preferring the least used and then the least
+    recently throttled ones; tokens which are rejected or throttled are
+    removed from the pool for the rest of the run, and the time they were
+    throttled is stored in the cache so that following runs use them last.
+
+    Args:
+        tokens: List of tokens.
+    """
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = list(tokens)
+        self._cache = Cache("tokens")
+        self._usage = {token: 0 for token in self.tokens}
+        self._removed: Dict[str, int] = {}
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def acquire(self) -> str:
+        """Return the token to use for the next request.
+
+        Returns:
+            Least used (and least recently throttled) token available, or
+            the first token if every token was removed.
+        """
+        available = [token for token in self.tokens
+                     if token not in self._removed] or self.tokens[:1]
+        token = min(available, key=lambda t: (
+            self._usage[t], self._cache.content.get(self.key(t), 0)))
+        self._usage[token] += 1
+        return token
+
+    def throttle(self, token: str, status: int) -> bool:
+        """Remove a token from the pool.
+
+        Args:
+            token: Token rejected or throttled.
+            status: HTTP status code returned (401 or 429).
+
+        Returns:
+            Whether there are other tokens available.
+        """
+        self._removed[token] = status
+        self._cache.update(self.key(token), time.time())
+        return any(t not in self._removed for t in self.tokens)
+
+    def report(self) -> List[str]:
+        """Return the usage of each token.
+
+        Returns:
+            List of lines describing the usage of each token.
+        """
+        reasons = {401: " (rejected)", 429: " (throttled)"}
+        return [f"Token ...{token[-4:]}: {self._usage[token]} requests"
+                f"{reasons.get(self._removed.get(token), '')}"
+                for token in self.tokens]
+
+
+class WebhookState:
+    """Class that stores the build status received from webhooks (see
+    ``quickci listen``), so that ``quickci status`` does not need to poll
+    repositories which reported their status recently.
+    """
+
+    def __init__(self):
+        self._cache = Cache("webhooks")
+
+    def update(self, entry: Dict[str, Any]):
+        """Store a new status entry.
+
+        Args:
+            entry: Dictionary with service, repo, branch, status and
+                (optionally) pipeline.
+        """
+        key = "/".join([entry["service"], entry["repo"], entry["branch"],
+                        entry.get("pipeline") or ""])
+        self._cache.update(key, dict(entry, updated=time.time()))
+
+    def recent(self,
+               service: str,
+               branch: str,
+               max_age: float) -> Dict[str, List[Dict[str, Any]]]:
+        """Return entries of the given service and branch received within
+        the last max_age seconds.
+
+        Args:
+            service: Service name.
+            branch: Branch name.
+            max_age: Maximum age of the entries (in seconds).
+
+        Returns:
+            Dictionary of repo name -> list of entries.
+        """
+        recent = {}
+        now = time.time()
+        for entry in self._cache.content.values():
+            if entry["service"] == service and entry["branch"] == branch \
+                    and now - entry["updated"] <= max_age:
+                recent.setdefault(entry["repo"], []).append(entry)
+        return recent
+
+
+class StatusHistory:
+    """Class that stores the build status found on the previous runs, used
+    to check first the repositories which were failing, running or recently
+    active.
+    """
+
+    def __init__(self):
+        self._cache = Cache("history")
+
+    def previous(self, service: str, branch: str) -> Dict[str, Dict[str, Any]]:
+        """Return the status of the repositories of a service and branch.
+
+        Args:
+            service: Service name.
+            branch: Branch name.
+
+        Returns:
+            Dictionary of repo name -> dictionary with the last status and
+            the time it changed.
+        """
+        return self._cache.content.get(f"{service}/{branch}", {})
+
+    def update(self, service: str, branch: str, results: List[BuildStatus]):
+        """Store the status of the repositories of a service and branch.
+
+        The time of a change is only known for repositories which were
+        already stored; for repositories with several pipelines, the worst
+        status is stored.
+
+        Args:
+            service: Service name.
+            branch: Branch name.
+            results: BuildStatus of each repository.
+        """
+        previous = self._cache.content.setdefault(f"{service}/{branch}", {})
+        severity = {"red": 0, "yellow": 1}
+        statuses: Dict[str, str] = {}
+        for result in sorted(results, key=lambda r: severity.get(
+                COLOURS.get(r.status), 2)):
+            statuses.setdefault(result.repo, result.status)  # worst pipeline
+        now = time.time()
+        for repo, status in statuses.items():
+            entry = previous.get(repo)
+            if entry is None:
+                previous[repo] = {"status": status, "changed": 0}
+            elif entry["status"] != status:
+                previous[repo] = {"status": status, "changed": now}
+        self._cache.save()
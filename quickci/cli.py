@@ -1,21 +1,53 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 # Created by Roberto Preste
+import importlib
 import sys
 import click
-from quickci.commands.config import config
-from quickci.commands.status import status
 
+COMMANDS = {"artifacts": "quickci.commands.artifacts",
+            "config": "quickci.commands.config",
+            "dashboard": "quickci.commands.dashboard",
+            "exporter": "quickci.commands.exporter",
+            "history": "quickci.commands.history",
+            "listen": "quickci.commands.listen",
+            "logs": "quickci.commands.logs",
+            "merge": "quickci.commands.merge",
+            "restart": "quickci.commands.restart",
+            "status": "quickci.commands.status",
+            "wait": "quickci.commands.wait"}
 
-@click.group()
-@click.version_option()
-def main():
-    """Have a quick look at the status of CI projects from the command line."""
-    pass
+
+class LazyGroup(click.Group):
+    """Group importing the module of each command only when the command is
+    used, so that e.g. shell completion of ``quickci status`` does not
+    import every other command (and the services they use)."""
+
+    def list_commands(self, ctx):
+        return sorted(COMMANDS)
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in COMMANDS:
+            return None
+        module = importlib.import_module(COMMANDS[cmd_name])
+        return getattr(module, cmd_name)
 
 
-main.add_command(config)
-main.add_command(status)
+def close_decoder():
+    """Shut down the decoding processes, if the services were used."""
+    classes = sys.modules.get("quickci.classes")
+    if classes is not None:
+        classes._CIService.decoder.close()
+
+
+@click.group(cls=LazyGroup)
+@click.version_option()
+@click.pass_context
+def main(ctx):
+    """Have a quick look at the status of CI projects from the command line."""
+    # shut down the decoding processes (if any) when the command ends, even
+    # if interrupted (e.g. the dashboard and the exporter)
+    ctx.call_on_close(close_decoder)
 
 
 if __name__ == "__main__":
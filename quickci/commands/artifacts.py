@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import click
+from quickci.api import SERVICES
+from quickci.artifacts import download_artifacts
+from quickci.classes import Config, ServiceError
+
+
+@click.command(short_help="Download the artifacts of the latest build.")
+@click.argument("service", type=click.Choice(sorted(SERVICES)))
+@click.argument("repo")
+@click.option("--branch", "-b", help="Branch to check", default="master")
+@click.option("--pattern", "-p", help="Only download artifacts whose path "
+              "matches this glob", default="*")
+@click.option("--dest", "-d", help="Download directory", required=True,
+              type=click.Path(file_okay=False))
+@click.option("--token", "-t", help="Auth token (default: the one stored in "
+              "the config file)", default=None)
+def artifacts(service, repo, branch, pattern, dest, token):
+    """Download the artifacts of the latest build of the given repo and
+    branch (only CircleCI and AppVeyor provide build artifacts).
+
+    Interrupted downloads are resumed, and artifacts unchanged since the last
+    download are skipped."""
+    token = token or Config()[service]
+    if token == "replace_me":
+        raise click.ClickException("Please replace the default token with a "
+                                   "valid one using `quickci config update`, "
+                                   "or provide one directly using `--token`.")
+    ci = SERVICES[service](token=token, branch=branch)
+
+    def done(path, outcome):
+        click.echo(f"\t{path} -> {outcome}")
+
+    try:
+        results = ci.run(download_artifacts(ci, repo, dest, pattern,
+                                            on_done=done))
+    except (ServiceError, OSError) as e:  # including NotSupported
+        raise click.ClickException(str(e))
+    finally:
+        ci.close()
+    if not results:
+        click.echo("No artifact found.")
+    return 0
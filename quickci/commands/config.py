@@ -4,6 +4,8 @@
 import click
 from quickci.classes import Config
 
+SERVICES = ["travis", "circle", "appveyor", "buddy", "drone", "codeship"]
+
 
 @click.group()
 @click.pass_context
@@ -43,16 +45,42 @@ def create(obj):
 
 
 @config.command(short_help="Update a specific token.")
-@click.argument("service", type=click.Choice(["travis", "circle", "appveyor",
-                                              "buddy"]))
-@click.argument("token", type=str)
+@click.argument("service", type=click.Choice(SERVICES))
+@click.argument("token", type=str, nargs=-1, required=True)
 @click.pass_obj
 def update(obj, service, token):
-    """Update a specific service token in the configuration file."""
-    obj.update(service, token)
+    """Update a specific service token in the configuration file.
+
+    Several tokens with the same visibility can be provided, and requests
+    will be spread across them (except for Codeship)."""
+    if service == "codeship" and len(token) > 1:
+        raise click.UsageError("Codeship credentials cannot be pooled: "
+                               "please provide a single username:password.")
+    obj.update(service, token[0] if len(token) == 1 else list(token))
     obj.save()
     click.echo(f"Updated token for {service}.")
     return 0
 
 
+@config.command(short_help="Pin a repo.")
+@click.argument("service", type=click.Choice(SERVICES))
+@click.argument("repo", type=str)
+@click.pass_obj
+def pin(obj, service, repo):
+    """Pin a repository, so that its status is checked and shown first."""
+    obj.pin(service, repo)
+    obj.save()
+    click.echo(f"Pinned {repo} for {service}.")
+    return 0
 
+
+@config.command(short_help="Unpin a repo.")
+@click.argument("service", type=click.Choice(SERVICES))
+@click.argument("repo", type=str)
+@click.pass_obj
+def unpin(obj, service, repo):
+    """Unpin a repository."""
+    obj.unpin(service, repo)
+    obj.save()
+    click.echo(f"Unpinned {repo} for {service}.")
+    return 0
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import click
+from quickci.api import SERVICES
+from quickci.dashboard import run
+
+
+@click.command(short_help="Show a live dashboard of build status.")
+@click.option("--branch", "-b", help="Branch to check (can be repeated)",
+              multiple=True, default=["master"])
+@click.option("--repo", "-r", help="Repo to check (can be repeated)",
+              multiple=True)
+@click.option("--service", "-s", help="Service to check (can be repeated)",
+              type=click.Choice(sorted(SERVICES)), multiple=True)
+@click.option("--interval", "-i", help="Seconds between two updates",
+              type=float, default=60)
+def dashboard(branch, repo, service, interval):
+    """Show a full-screen dashboard with the status of the given branches of
+    each project in each CI, updated in place as results arrive."""
+    run(branch, services=service or None, repos=repo or None,
+        interval=interval)
+    return 0
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import click
+from quickci.api import SERVICES
+from quickci.exporter import Exporter, serve
+
+
+@click.command(short_help="Serve build status as Prometheus metrics.")
+@click.option("--host", "-h", help="Host to listen on", default="127.0.0.1")
+@click.option("--port", "-p", help="Port to listen on", default=9090,
+              type=int)
+@click.option("--branch", "-b", help="Branch to check (can be repeated)",
+              multiple=True, default=["master"])
+@click.option("--repo", "-r", help="Repo to check (can be repeated)",
+              multiple=True)
+@click.option("--service", "-s", help="Service to check (can be repeated)",
+              type=click.Choice(sorted(SERVICES)), multiple=True)
+@click.option("--interval", "-i", help="Seconds between two refreshes",
+              type=float, default=300)
+def exporter(host, port, branch, repo, service, interval):
+    """Serve the status of the given branches of each project in each CI as
+    Prometheus metrics on /metrics. Status is refreshed in the background,
+    so scrapes never trigger requests to the CI services."""
+    click.secho(f"Serving metrics on http://{host}:{port}/metrics", bold=True,
+                fg="blue")
+    serve(Exporter(branch, services=service or None, repos=repo or None),
+          host, port, interval)
+    return 0
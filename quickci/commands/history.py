@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import json
+import time
+import click
+from quickci.api import SERVICES
+from quickci.classes import StatusError
+from quickci.history import fetch_history, parse_age, summarise
+
+
+def duration(seconds):
+    """Format a number of seconds as e.g. 4m12s."""
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def colour(rate):
+    """Return the colour of a pass rate."""
+    return "green" if rate >= 0.9 else "yellow" if rate >= 0.7 else "red"
+
+
+@click.command(short_help="Show build statistics.")
+@click.option("--since", help="Only consider builds newer than this (e.g. "
+              "30d, 12h, 2w)", default="30d")
+@click.option("--branch", "-b", help="Branch to check (can be repeated)",
+              multiple=True, default=["master"])
+@click.option("--repo", "-r", help="Repo to check (can be repeated)",
+              multiple=True)
+@click.option("--service", "-s", help="Service to check (can be repeated)",
+              type=click.Choice(sorted(SERVICES)), multiple=True)
+@click.option("--json", "as_json", help="Print statistics as JSON",
+              is_flag=True, default=False)
+def history(since, branch, repo, service, as_json):
+    """Show pass rate, flip rate (failures between two successful builds),
+    and build duration and queue time percentiles of each project in each
+    CI."""
+    try:
+        age = parse_age(since)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--since")
+    loop = asyncio.get_event_loop()
+    results = loop.run_until_complete(fetch_history(
+        time.time() - age, services=service or None, branches=branch,
+        repos=repo or None))
+    errors = [result for result in results if isinstance(result, StatusError)]
+    try:
+        stats = summarise(result for result in results
+                          if not isinstance(result, StatusError))
+    except ImportError as e:
+        raise click.ClickException(str(e))
+
+    def show_errors():
+        for error in errors:
+            if error.repo is None:
+                click.secho(f"{error.service}: service error "
+                            f"({error.error}).", fg="red", err=as_json)
+            else:
+                click.secho(f"{error.service}/{error.repo} -> request "
+                            f"failed ({error.error})", fg="magenta",
+                            err=as_json)
+
+    if as_json:
+        click.echo(json.dumps(stats, indent=2))
+        show_errors()
+        return 0
+    click.secho(f"{'service/repo':40}{'branch':14}{'builds':>7}{'pass':>7}"
+                f"{'flips':>7}{'p50':>9}{'p95':>9}{'queue p50':>11}"
+                f"{'queue p95':>11}", bold=True, fg="blue")
+    for row in stats:
+        pipe = f" ({row['pipeline']})" if row["pipeline"] else ""
+        name = f"{row['service']}/{row['repo']}{pipe}"
+        click.secho(f"{name[:39]:40}{row['branch'][:13]:14}{row['builds']:>7}"
+                    f"{row['pass_rate']:>7.0%}{row['flip_rate']:>7.0%}"
+                    f"{duration(row['duration_p50']):>9}"
+                    f"{duration(row['duration_p95']):>9}"
+                    f"{duration(row['queue_p50']):>11}"
+                    f"{duration(row['queue_p95']):>11}",
+                    fg=colour(row["pass_rate"]))
+    show_errors()
+    if not stats and not errors:
+        click.secho("No build found.", fg="magenta")
+    return 0
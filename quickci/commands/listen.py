@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import click
+from quickci.webhooks import PARSERS, WebhookReceiver, serve, travis_public_key
+
+
+@click.command(short_help="Receive build status from webhooks.")
+@click.option("--host", "-h", help="Host to listen on", default="127.0.0.1")
+@click.option("--port", "-p", help="Port to listen on", default=8080,
+              type=int)
+@click.option("--secret", "-s", help="Webhook secret of a service",
+              type=(click.Choice(sorted(PARSERS)), str), multiple=True)
+def listen(host, port, secret):
+    """Receive webhook payloads from Travis CI, CircleCI, AppVeyor, Buddy and
+    Drone CI, and store the build status they report so that
+    `quickci status` does not need to poll those repositories."""
+    secrets = dict(secret)
+    travis_key = travis_public_key()
+    if travis_key is None:
+        click.secho("Travis CI public key not available (is cryptography "
+                    "installed?), Travis CI payloads will be rejected.",
+                    fg="red")
+    for service in sorted(set(PARSERS) - set(secrets) - {"travis"}):
+        click.secho(f"No secret provided for {service}, its payloads will "
+                    f"be rejected.", fg="red")
+    click.secho(f"Listening on http://{host}:{port}/<service>", bold=True,
+                fg="blue")
+    serve(WebhookReceiver(secrets, travis_key), host, port)
+    return 0
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import click
+from quickci.api import SERVICES
+from quickci.classes import Config, ServiceError
+
+
+@click.command(short_help="Show the log of the latest build of a repo.")
+@click.argument("service", type=click.Choice(sorted(SERVICES)))
+@click.argument("repo")
+@click.option("--branch", "-b", help="Branch to check", default="master")
+@click.option("--token", "-t", help="Auth token (default: the one stored in "
+              "the config file)", default=None)
+@click.option("--follow", "-f", help="Keep showing new lines until the build "
+              "is finished", is_flag=True, default=False)
+@click.option("--interval", "-i", help="Seconds between two polls",
+              type=float, default=2)
+def logs(service, repo, branch, token, follow, interval):
+    """Show the log of the first job of the latest build of the given repo
+    and branch (only Travis CI and AppVeyor provide build logs as plain
+    text: the CircleCI API only provides the output of finished steps, and
+    the Drone API returns step logs as json documents, so neither can be
+    followed from an offset).
+
+    With --follow, only the new part of the log is requested on each poll,
+    until the build is finished."""
+    token = token or Config()[service]
+    if token == "replace_me":
+        raise click.ClickException("Please replace the default token with a "
+                                   "valid one using `quickci config update`, "
+                                   "or provide one directly using `--token`.")
+    ci = SERVICES[service](token=token, branch=branch)
+    out = click.get_binary_stream("stdout")
+
+    async def stream():
+        async for chunk in ci.alog(repo, follow=follow, interval=interval):
+            out.write(chunk)
+            out.flush()
+
+    try:
+        ci.run(stream())
+    except ServiceError as e:  # including NotSupported
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ci.close()
+    return 0
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import click
+from quickci.classes import COLOURS
+from quickci.snapshot import merge_snapshots, read_snapshot, write_snapshot
+
+TITLES = {"travis": "Travis CI", "circle": "CircleCI", "appveyor": "AppVeyor",
+          "buddy": "Buddy", "drone": "Drone CI", "codeship": "Codeship"}
+
+
+@click.command(short_help="Merge status snapshots.")
+@click.argument("snapshots", nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option("--output", "-o", help="Write the merged snapshot to this "
+              "file instead of printing it", type=click.Path(dir_okay=False),
+              default=None)
+def merge(snapshots, output):
+    """Combine the snapshots written by `quickci status --snapshot` (e.g.
+    by several hosts, each checking a different --shard) into a single
+    view, keeping the most recent status of each repo."""
+    try:
+        results, failures = merge_snapshots(read_snapshot(path)
+                                            for path in snapshots)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if output is not None:
+        write_snapshot(output, results, failures)
+        click.echo(f"Merged {len(results)} builds into {output}.")
+        return 0
+    groups = {(result.service, result.branch) for result in results}
+    groups.update((service, branch) for service, _, branch, _ in failures)
+    for service, branch in sorted(groups):
+        click.secho(f"{TITLES.get(service, service)} ({branch} branch)",
+                    bold=True, fg="blue")
+        for result in results:
+            if (result.service, result.branch) != (service, branch):
+                continue
+            pipe = f" ({result.pipeline} pipeline)" if result.pipeline else ""
+            click.secho(f"\t{result.repo}{pipe} -> "
+                        f"{result.status.casefold()}",
+                        fg=COLOURS.get(result.status, "white"))
+        for failed_service, repo, failed_branch, error in failures:
+            if (failed_service, failed_branch) == (service, branch):
+                click.secho(f"\t{repo} -> request failed ({error})",
+                            fg="magenta")
+    if not groups:
+        click.secho("No build found.", fg="magenta")
+    return 0
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import click
+from quickci.api import SERVICES
+from quickci.restart import RESTARTED, DRY_RUN, STATUS_FAILED, restart_failed
+
+COLOURS = {RESTARTED: "green", DRY_RUN: "yellow"}
+
+
+@click.command(short_help="Restart the failed builds.")
+@click.option("--failed", help="Restart the builds which failed",
+              is_flag=True, default=False)
+@click.option("--branch", "-b", help="Branch to check", default="master")
+@click.option("--repo", "-r", help="Only restart the repos whose name "
+              "matches this glob", default="*")
+@click.option("--service", "-s", help="Service to check (can be repeated)",
+              type=click.Choice(sorted(SERVICES)), multiple=True)
+@click.option("--dry-run", help="Only show the builds which would be "
+              "restarted", is_flag=True, default=False)
+def restart(failed, branch, repo, service, dry_run):
+    """Restart the latest build of each repo whose latest build on the given
+    branch failed (only Travis CI, CircleCI, AppVeyor and Drone CI allow
+    restarting builds)."""
+    if not failed:
+        raise click.UsageError("Please choose the builds to restart (e.g. "
+                               "`--failed`).")
+
+    def show(result):
+        if result.repo is None:
+            click.secho(f"\t{result.service}: {result.outcome}", fg="red")
+            return
+        build = f" (build {result.build})" if result.build else ""
+        click.secho(f"\t{result.service}: {result.repo}{build} -> "
+                    f"{result.outcome}",
+                    fg=COLOURS.get(result.outcome, "red"))
+
+    click.secho(f"Restarting failed builds ({branch} branch)", bold=True,
+                fg="blue")
+    loop = asyncio.get_event_loop()
+    results = loop.run_until_complete(restart_failed(
+        service or None, branch, repo, dry_run=dry_run, on_restart=show))
+    builds = [result for result in results
+              if not result.outcome.startswith(STATUS_FAILED)]
+    done = sum(result.outcome in (RESTARTED, DRY_RUN) for result in builds)
+    if not builds:
+        click.echo("No failed build found.")
+    elif dry_run:
+        click.secho(f"{done} builds would be restarted.", bold=True)
+    else:
+        click.secho(f"Restarted {done} of {len(builds)} failed builds.",
+                    bold=True)
+    unchecked = len(results) - len(builds)
+    if unchecked:
+        click.secho(f"The status of {unchecked} services or repos could not "
+                    f"be retrieved.", fg="red", bold=True)
+    return 0
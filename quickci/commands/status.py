@@ -1,92 +1,251 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 # Created by Roberto Preste
+import os
 import click
-from quickci.classes import Config, TravisCI, CircleCI, AppVeyor, Buddy, DroneCI
+from quickci.cache import CompletionIndex
+
+# names of quickci.transport.TRANSPORTS, which are not imported here so that
+# shell completion only imports the completion index (see test_cli.py)
+TRANSPORTS = ("aiohttp", "http2")
+
+
+def _services(ctx) -> list:
+    """Return the services whose values should be completed: the one of
+    the subcommand being completed, or every service for the group."""
+    services = [command.name for command in (travis, circle, appveyor,
+                                             buddy, drone, codeship)]
+    return [ctx.info_name] if ctx.info_name in services else services
+
+
+def complete_repo(ctx, param, incomplete):
+    """Complete --repo with the repositories found on the previous runs."""
+    return [repo for repo in CompletionIndex().repos(_services(ctx))
+            if repo.startswith(incomplete)]
+
+
+def complete_branch(ctx, param, incomplete):
+    """Complete --branch with the branches checked on the previous runs."""
+    return [branch for branch in CompletionIndex().branches(_services(ctx))
+            if branch.startswith(incomplete)]
+
+
+def completion(func) -> dict:
+    """Return the option argument setting func as its shell completion
+    (``autocompletion`` before click 8, ``shell_complete`` since)."""
+    if int(click.__version__.split(".")[0]) < 8:
+        return {"autocompletion": func}
+    return {"shell_complete": func}
+
+
+def shard_option(ctx, param, value):
+    """Parse the --shard option."""
+    if value is None:
+        return None
+    from quickci.snapshot import parse_shard
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def common_options(f):
+    """Add the options shared by the status command and its subcommands."""
+    f = click.option("--snapshot", help="Also write the status to this "
+                     "json file, which can be combined with others by "
+                     "`quickci merge`", type=click.Path(dir_okay=False),
+                     default=None)(f)
+    f = click.option("--shard", help="Only check the i-th of n disjoint "
+                     "slices of the repos (e.g. 2/5)", default=None,
+                     callback=shard_option)(f)
+    f = click.option("--details", help="Show the jobs of failed and "
+                     "running builds", is_flag=True, default=False)(f)
+    f = click.option("--budget", help="Skip low-priority repos still being "
+                     "checked after this number of seconds (0 for no limit)",
+                     type=float, default=0)(f)
+    f = click.option("--replay-latency", help="Latency of replayed responses",
+                     type=click.Choice(["original", "zero"]),
+                     default="original")(f)
+    f = click.option("--replay", help="Replay the requests recorded in this "
+                     "directory instead of contacting the CI services",
+                     type=click.Path(file_okay=False), default=None)(f)
+    f = click.option("--record", help="Record every request and response "
+                     "into this directory", type=click.Path(file_okay=False),
+                     default=None)(f)
+    f = click.option("--webhook-age", help="Use status received by "
+                     "`quickci listen` if not older than this number of "
+                     "seconds (0 to always poll)", type=int, default=900)(f)
+    f = click.option("--transport", help="HTTP transport to use",
+                     type=click.Choice(sorted(TRANSPORTS)),
+                     default="aiohttp")(f)
+    f = click.option("--repo", "-r", help="Repo to check", default=None,
+                     **completion(complete_repo))(f)
+    f = click.option("--branch", "-b", help="Branch to check",
+                     default="master", **completion(complete_branch))(f)
+    return f
+
+
+def check(service, title, token, branch, transport, record, replay,
+          replay_latency, snapshot, **options):
+    """Print the status of the given branch of each project in a CI service.
+
+    Args:
+        service: Service name (one of quickci.api.SERVICES).
+        title: Name of the CI service to display.
+        token: Authentication token.
+        branch: Branch to check.
+        transport: Name of the transport to use.
+        record: Directory where requests are recorded (or None).
+        replay: Directory where recorded requests are replayed from (or
+            None).
+        replay_latency: Latency of replayed responses (original or zero).
+        snapshot: File where the status of every service checked is written
+            (or None).
+        **options: Other options of the status command (see
+            common_options()), passed to the ci_class constructor.
+    """
+    from quickci.api import SERVICES
+    from quickci.transport import (RecordingTransport, ReplayTransport,
+                                   Transport, get_transport)
+    if record is not None and replay is not None:
+        raise click.UsageError("--record and --replay cannot be used "
+                               "together.")
+    ci_class = SERVICES[service]
+    click.secho(f"{title} ({branch} branch)", bold=True, fg="blue")
+    if replay is not None:
+        cassette = os.path.join(replay, f"{ci_class.name}.json")
+        if not os.path.exists(cassette):
+            click.secho("\tNo recording found.", fg="magenta")
+            return
+        if token == "replace_me":
+            token = "replay"
+        transport = ReplayTransport(cassette,
+                                    latency=replay_latency == "original")
+    try:
+        if record is not None:
+            tokens = [token] if isinstance(token, str) else token
+            transport = RecordingTransport(
+                get_transport(transport),
+                os.path.join(record, f"{ci_class.name}.json"), secrets=tokens)
+        ci = ci_class(token=token, branch=branch, transport=transport,
+                      **options)
+    except ImportError as e:
+        raise click.ClickException(str(e))
+    ci.status()
+    if isinstance(transport, Transport):
+        ci.run(transport.close())
+    if snapshot is not None:
+        save_snapshot(snapshot, ci, options.get("shard"))
+
+
+def save_snapshot(path, ci, shard):
+    """Add the status found by a service instance to a snapshot file, which
+    is written when the command ends (once for every service checked).
+
+    Args:
+        path: Snapshot file.
+        ci: Service instance whose status was printed.
+        shard: Shard checked, as (i, n), if any.
+    """
+    from quickci.snapshot import write_snapshot
+    ctx = click.get_current_context()
+    snapshots = ctx.meta.setdefault("quickci.snapshots", {})
+    if path not in snapshots:
+        snapshots[path] = ([], [])
+        ctx.find_root().call_on_close(lambda: write_snapshot(
+            path, *snapshots[path], shard=shard))
+    results, failures = snapshots[path]
+    results.extend(ci._results)
+    failures.extend((ci.name, repo, ci._branch, error)
+                    for repo, error in ci._failures)
+
+
+def print_stats():
+    """Print statistics about the requests performed."""
+    from quickci.classes import _CIService
+    click.secho(f"Coalesced requests: {_CIService.flight.coalesced}",
+                fg="blue")
+    click.secho(f"Responses decoded in the background: "
+                f"{_CIService.decoder.offloaded}", fg="blue")
+    click.secho(f"Event loop lag: {_CIService.monitor.summary()}", fg="blue")
 
 
 @click.group(invoke_without_command=True)
-@click.option("--branch", "-b", help="Branch to check", default="master")
-@click.option("--repo", "-r", help="Repo to check", default=None)
+@click.option("--stats", help="Print request statistics at the end",
+              is_flag=True, default=False)
+@common_options
 @click.pass_context
-def status(ctx, branch, repo):
+def status(ctx, stats, **options):
     """Return the status of the given branch of each project in each CI."""
+    from quickci.classes import Config, _CIService
+    from quickci.exporter import LoopMonitor
     ctx.obj = Config()
+    if stats:
+        _CIService.monitor = LoopMonitor()
+        ctx.call_on_close(print_stats)
 
     if ctx.invoked_subcommand is None:
-        ctx.invoke(travis, branch=branch, repo=repo)
-        ctx.invoke(circle, branch=branch, repo=repo)
-        ctx.invoke(appveyor, branch=branch, repo=repo)
-        ctx.invoke(buddy, branch=branch, repo=repo)
-        ctx.invoke(drone, branch=branch, repo=repo)
+        for command in (travis, circle, appveyor, buddy, drone, codeship):
+            ctx.invoke(command, **options)
     pass
 
 
 @status.command(short_help="Show status of Travis CI projects.")
 @click.option("--token", "-t", help="Travis CI auth token", default=None)
-@click.option("--branch", "-b", help="Branch to check", default="master")
-@click.option("--repo", "-r", help="Repo to check", default=None)
+@common_options
 @click.pass_obj
-def travis(obj, token, branch, repo):
+def travis(obj, token, **options):
     """Return the status of the given branch of each project in Travis CI."""
-    ci = TravisCI(token=token, branch=branch, repo=repo) \
-        if token else TravisCI(token=obj["travis"], branch=branch, repo=repo)
-    click.secho(f"Travis CI ({branch} branch)", bold=True, fg="blue")
-    ci.status()
+    check("travis", "Travis CI", token or obj["travis"], **options)
     return 0
 
 
 @status.command(short_help="Show status of CircleCI projects.")
 @click.option("--token", "-t", help="CircleCI auth token", default=None)
-@click.option("--branch", "-b", help="Branch to check", default="master")
-@click.option("--repo", "-r", help="Repo to check", default=None)
+@common_options
 @click.pass_obj
-def circle(obj, token, branch, repo):
+def circle(obj, token, **options):
     """Return the status of the given branch of each project in CircleCI."""
-    ci = CircleCI(token=token, branch=branch, repo=repo) \
-        if token else CircleCI(token=obj["circle"], branch=branch, repo=repo)
-    click.secho(f"CircleCI ({branch} branch)", bold=True, fg="blue")
-    ci.status()
+    check("circle", "CircleCI", token or obj["circle"], **options)
     return 0
 
 
 @status.command(short_help="Show status of AppVeyor projects.")
 @click.option("--token", "-t", help="AppVeyor auth token", default=None)
-@click.option("--branch", "-b", help="Branch to check", default="master")
-@click.option("--repo", "-r", help="Repo to check", default=None)
+@common_options
 @click.pass_obj
-def appveyor(obj, token, branch, repo):
+def appveyor(obj, token, **options):
     """Return the status of the given branch of each project in AppVeyor."""
-    ci = AppVeyor(token=token, branch=branch, repo=repo) \
-        if token else AppVeyor(token=obj["appveyor"], branch=branch, repo=repo)
-    click.secho(f"AppVeyor ({branch} branch)", bold=True, fg="blue")
-    ci.status()
+    check("appveyor", "AppVeyor", token or obj["appveyor"], **options)
     return 0
 
 
 @status.command(short_help="Show status of Buddy projects.")
 @click.option("--token", "-t", help="Buddy auth token", default=None)
-@click.option("--branch", "-b", help="Branch to check", default="master")
-@click.option("--repo", "-r", help="Repo to check", default=None)
+@common_options
 @click.pass_obj
-def buddy(obj, token, branch, repo):
+def buddy(obj, token, **options):
     """Return the status of the given branch of each project in Buddy."""
-    ci = Buddy(token=token, branch=branch, repo=repo) \
-        if token else Buddy(token=obj["buddy"], branch=branch, repo=repo)
-    click.secho(f"Buddy ({branch} branch)", bold=True, fg="blue")
-    ci.status()
+    check("buddy", "Buddy", token or obj["buddy"], **options)
     return 0
 
 
 @status.command(short_help="Show status of Drone CI projects.")
 @click.option("--token", "-t", help="Drone CI auth token", default=None)
-@click.option("--branch", "-b", help="Branch to check", default="master")
-@click.option("--repo", "-r", help="Repo to check", default=None)
+@common_options
 @click.pass_obj
-def drone(obj, token, branch, repo):
+def drone(obj, token, **options):
     """Return the status of the given branch of each project in Drone CI."""
-    ci = DroneCI(token=token, branch=branch, repo=repo) \
-        if token else DroneCI(token=obj["drone"], branch=branch, repo=repo)
-    click.secho(f"Drone CI ({branch} branch)", bold=True, fg="blue")
-    ci.status()
+    check("drone", "Drone CI", token or obj["drone"], **options)
+    return 0
+
+
+@status.command(short_help="Show status of Codeship projects.")
+@click.option("--token", "-t", help="Codeship credentials (username:password)",
+              default=None)
+@common_options
+@click.pass_obj
+def codeship(obj, token, **options):
+    """Return the status of the given branch of each project in Codeship."""
+    check("codeship", "Codeship", token or obj["codeship"], **options)
     return 0
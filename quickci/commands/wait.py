@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import click
+from quickci.api import SERVICES
+from quickci.classes import COLOURS
+from quickci.wait import (SUCCESS, FAILURE, TIMEOUT, NOT_FOUND, ERROR,
+                          wait_for_commit)
+
+MESSAGES = {SUCCESS: ("Every build succeeded.", "green"),
+            FAILURE: ("Some builds failed.", "red"),
+            TIMEOUT: ("Timed out while builds were still running.", "yellow"),
+            NOT_FOUND: ("No build found for this commit.", "magenta"),
+            ERROR: ("Some statuses could not be retrieved.", "magenta")}
+
+
+@click.command(short_help="Wait for the builds of a commit to finish.")
+@click.option("--sha", help="Commit to wait for (full or abbreviated sha)",
+              required=True)
+@click.option("--branch", "-b", help="Branch built", default="master")
+@click.option("--repo", "-r", help="Repo to check (can be repeated)",
+              multiple=True)
+@click.option("--service", "-s", help="Service to check (can be repeated)",
+              type=click.Choice(sorted(SERVICES)), multiple=True)
+@click.option("--interval", "-i", help="Initial seconds between two polls",
+              type=float, default=5)
+@click.option("--max-interval", help="Maximum seconds between two polls",
+              type=float, default=60)
+@click.option("--timeout", help="Seconds after which to stop waiting",
+              type=float, default=3600)
+@click.option("--grace", help="Seconds to keep looking for new builds after "
+              "the first one is found", type=float, default=30)
+@click.option("--fail-fast", help="Exit as soon as a build fails",
+              is_flag=True, default=False)
+@click.pass_context
+def wait(ctx, sha, branch, repo, service, interval, max_interval, timeout,
+         grace, fail_fast):
+    """Wait until every build of the given commit is finished.
+
+    Exit with 0 if every build succeeded, 1 if some failed, 3 on timeout,
+    4 if no build of the commit was found, and 5 if the status of some
+    repos could not be retrieved."""
+
+    def error(result):
+        repo = f"{result.repo} " if result.repo else ""
+        click.secho(f"\t{result.service}: {repo}request failed "
+                    f"({result.error})", fg="magenta")
+
+    def show(result):
+        pipe = f" ({result.pipeline} pipeline)" if result.pipeline else ""
+        click.secho(f"\t{result.service}: {result.repo}{pipe} -> "
+                    f"{result.status.casefold()}",
+                    fg=COLOURS.get(result.status, "white"))
+
+    click.secho(f"Waiting for {sha} ({branch} branch)", bold=True, fg="blue")
+    loop = asyncio.get_event_loop()
+    code, _ = loop.run_until_complete(wait_for_commit(
+        sha, branch, services=service or None, repos=repo or None,
+        interval=interval, max_interval=max_interval, timeout=timeout,
+        grace=grace, fail_fast=fail_fast, on_change=show, on_error=error))
+    message, colour = MESSAGES[code]
+    click.secho(message, bold=True, fg=colour)
+    ctx.exit(code)
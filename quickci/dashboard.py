@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from quickci.classes import BuildStatus, COLOURS, StatusError
+
+Cell = Tuple[str, str]  # text, colour
+
+
+class Dashboard:
+    """Grid of service × repo rows and branch columns, drawn differentially.
+
+    The dashboard keeps track of what is currently on screen, so that
+    changes() only returns the cells which need to be redrawn.
+
+    Args:
+        branches: Branches shown as columns.
+
+    Attributes:
+        filter: Only rows whose service or repo contain this string are shown.
+        offset: Index of the first row shown (used for scrolling).
+        updated: Time of the last status update.
+    """
+
+    NAME_WIDTH = 40
+    CELL_WIDTH = 14
+
+    def __init__(self, branches: Iterable[str]):
+        self.branches = list(branches)
+        self.filter = ""
+        self.offset = 0
+        self.updated = None
+        self._cells: Dict[Tuple[str, str, str], Dict[str, str]] = {}
+        self._screen: Dict[Tuple[int, int], Cell] = {}
+
+    def update(self, result: Union[BuildStatus, StatusError]) -> bool:
+        """Store a new build status.
+
+        A StatusError is shown as an error status in the row of its repo (or
+        in a service/* row, if no status of the service could be retrieved),
+        which is cleared by the next status of the service.
+
+        Args:
+            result: BuildStatus or StatusError to store.
+
+        Returns:
+            Whether the status changed.
+        """
+        self.updated = time.time()
+        if isinstance(result, StatusError):
+            key, status = (result.service, result.repo or "*", ""), "error"
+        else:
+            key = (result.service, result.repo, result.pipeline or "")
+            status = result.status
+            errors = self._cells.get((result.service, "*", ""), {})
+            if errors.pop(result.branch, None) and not errors:
+                del self._cells[(result.service, "*", "")]
+        row = self._cells.setdefault(key, {})
+        changed = row.get(result.branch) != status
+        row[result.branch] = status
+        return changed
+
+    def rows(self) -> List[Tuple[str, str, str]]:
+        """Return the rows matching the current filter.
+
+        Returns:
+            Sorted list of (service, repo, pipeline) rows.
+        """
+        text = self.filter.casefold()
+        return sorted(row for row in self._cells
+                      if text in f"{row[0]} {row[1]} {row[2]}".casefold())
+
+    def frame(self, height: int, width: int) -> Dict[Tuple[int, int], Cell]:
+        """Return every cell which should be on screen.
+
+        Args:
+            height: Screen height.
+            width: Screen width.
+
+        Returns:
+            Dictionary of (y, x) -> (text, colour).
+        """
+        rows = self.rows()
+        self.offset = max(0, min(self.offset, len(rows) - (height - 3)))
+        updated = time.strftime("%H:%M:%S", time.localtime(self.updated)) \
+            if self.updated else "never"
+        frame = {(0, 0): (f"quickCI - {len(rows)} rows - updated {updated} - "
+                          f"filter: {self.filter or '(none)'}".ljust(width),
+                          "blue"),
+                 (height - 1, 0): ("q: quit  /: filter  r: refresh  "
+                                   "arrows: scroll".ljust(width), "blue"),
+                 (1, 0): ("service/repo".ljust(self.NAME_WIDTH), "blue")}
+        columns = [self.NAME_WIDTH + i * self.CELL_WIDTH
+                   for i in range(len(self.branches))]
+        for x, branch in zip(columns, self.branches):
+            frame[(1, x)] = (branch[:self.CELL_WIDTH - 1].ljust(self.CELL_WIDTH),
+                             "blue")
+        for y, row in enumerate(rows[self.offset:self.offset + height - 3], 2):
+            pipe = f" ({row[2]})" if row[2] else ""
+            name = f"{row[0]}/{row[1]}{pipe}"[:self.NAME_WIDTH - 1]
+            frame[(y, 0)] = (name.ljust(self.NAME_WIDTH), "white")
+            for x, branch in zip(columns, self.branches):
+                status = self._cells[row].get(branch, "-")
+                frame[(y, x)] = (status.casefold()[:self.CELL_WIDTH - 1]
+                                 .ljust(self.CELL_WIDTH),
+                                 COLOURS.get(status, "white"))
+        return {(y, x): (text[:max(0, width - x)], colour)
+                for (y, x), (text, colour) in frame.items()
+                if x < width and y < height}
+
+    def changes(self, height: int, width: int) -> List[Tuple[int, int, str, str]]:
+        """Return the cells which need to be redrawn, and consider them
+        drawn.
+
+        Args:
+            height: Screen height.
+            width: Screen width.
+
+        Returns:
+            List of (y, x, text, colour) cells; cells which are no longer
+            shown are returned as blank text.
+        """
+        frame = self.frame(height, width)
+        changes = [(y, x, text, colour)
+                   for (y, x), (text, colour) in frame.items()
+                   if self._screen.get((y, x)) != (text, colour)]
+        changes.extend((y, x, " " * len(text), "white")
+                       for (y, x), (text, _) in self._screen.items()
+                       if (y, x) not in frame)
+        self._screen = frame
+        return changes
+
+    def invalidate(self):
+        """Forget what is on screen, so that everything is redrawn."""
+        self._screen = {}
+
+
+async def refresh(dashboard: Dashboard,
+                  services: Optional[Iterable[str]],
+                  repos: Optional[Iterable[str]],
+                  interval: float,
+                  wake: asyncio.Event):
+    """Update the dashboard every interval seconds (or when woken up).
+
+    Args:
+        dashboard: Dashboard to update.
+        services: Services to check.
+        repos: Repos to check.
+        interval: Seconds between two updates.
+        wake: Event used to request an immediate update.
+    """
+    from quickci.api import iter_status
+    while True:
+        async for result in iter_status(services, dashboard.branches, repos):
+            dashboard.update(result)
+        wake.clear()
+        try:
+            await asyncio.wait_for(wake.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def draw(screen, dashboard: Dashboard, colours: Dict[str, int]):
+    """Redraw the changed cells of the dashboard.
+
+    Args:
+        screen: curses window.
+        dashboard: Dashboard to draw.
+        colours: Dictionary of colour name -> curses attribute.
+    """
+    import curses
+    height, width = screen.getmaxyx()
+    for y, x, text, colour in dashboard.changes(height, width):
+        try:
+            screen.addstr(y, x, text, colours.get(colour, curses.A_NORMAL))
+        except curses.error:  # writing the bottom-right corner
+            pass
+    screen.noutrefresh()
+    curses.doupdate()
+
+
+async def main(screen,
+               dashboard: Dashboard,
+               services: Optional[Iterable[str]],
+               repos: Optional[Iterable[str]],
+               interval: float):
+    """Run the dashboard until the user quits.
+
+    Keys are handled locally: filtering and scrolling never trigger new
+    requests.
+    """
+    import curses
+    curses.curs_set(0)
+    curses.use_default_colors()
+    colours = {}
+    for i, name in enumerate(["green", "red", "yellow", "blue", "white"], 1):
+        curses.init_pair(i, getattr(curses, f"COLOR_{name.upper()}"), -1)
+        colours[name] = curses.color_pair(i)
+    colours["blue"] |= curses.A_BOLD
+    screen.nodelay(True)
+    screen.clear()
+    wake = asyncio.Event()
+    task = asyncio.ensure_future(refresh(dashboard, services, repos,
+                                         interval, wake))
+    editing = False
+    try:
+        while not task.done():
+            key = screen.getch()
+            height = screen.getmaxyx()[0]
+            if key == curses.KEY_RESIZE:
+                screen.clear()
+                dashboard.invalidate()
+            elif editing:
+                if key in (10, 13, 27):
+                    editing = False
+                elif key in (curses.KEY_BACKSPACE, 127, 8):
+                    dashboard.filter = dashboard.filter[:-1]
+                elif 32 <= key < 127:
+                    dashboard.filter += chr(key)
+            elif key == ord("q"):
+                break
+            elif key == ord("/"):
+                editing, dashboard.filter = True, ""
+            elif key == ord("r"):
+                wake.set()
+            elif key == curses.KEY_DOWN:
+                dashboard.offset += 1
+            elif key == curses.KEY_UP:
+                dashboard.offset = max(0, dashboard.offset - 1)
+            elif key == curses.KEY_NPAGE:
+                dashboard.offset += height - 3
+            elif key == curses.KEY_PPAGE:
+                dashboard.offset = max(0, dashboard.offset - (height - 3))
+            draw(screen, dashboard, colours)
+            await asyncio.sleep(0.05)
+        if task.done():
+            task.result()
+    finally:
+        task.cancel()
+
+
+def run(branches: Iterable[str],
+        services: Optional[Iterable[str]] = None,
+        repos: Optional[Iterable[str]] = None,
+        interval: float = 60):
+    """Show the dashboard in the terminal.
+
+    Args:
+        branches: Branches to check.
+        services: Services to check (default: every service with a token).
+        repos: Repos to check (default: every repo).
+        interval: Seconds between two updates.
+    """
+    import curses
+    dashboard = Dashboard(branches)
+
+    def wrapped(screen):
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(main(screen, dashboard, services, repos,
+                                     interval))
+
+    curses.wrapper(wrapped)
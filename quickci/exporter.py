@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, Tuple
+from quickci.api import SERVICES, fetch_status
+from quickci.classes import BuildStatus, COLOURS, StatusError
+from quickci.transport import Transport
+
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+
+def _labels(**labels) -> str:
+    """Format labels in the Prometheus text format."""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+            .replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"'
+                          for key, value in labels.items()) + "}"
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets.
+
+    Args:
+        buckets: Upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self, buckets: Iterable[float] = BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """Add a value to the histogram.
+
+        Args:
+            value: Value to add.
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name: str, **labels) -> List[str]:
+        """Return the samples of the histogram.
+
+        Args:
+            name: Metric name.
+            **labels: Labels of the samples.
+
+        Returns:
+            List of lines in the Prometheus text format.
+        """
+        lines = [f"{name}_bucket{_labels(**labels, le=bound)} {count}"
+                 for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} "
+                     f"{self.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {self.sum}")
+        lines.append(f"{name}_count{_labels(**labels)} {self.count}")
+        return lines
+
+
+class LoopMonitor:
+    """Measure the lag of the event loop, i.e. how late a callback runs
+    because the loop is busy (e.g. decoding a large response).
+
+    Args:
+        interval: Seconds between two measurements.
+
+    Attributes:
+        lag: Histogram of the measured lags, in seconds.
+        max: Maximum lag measured, in seconds.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lag = Histogram(LAG_BUCKETS)
+        self.max = 0.0
+
+    async def run(self):
+        """Measure the lag of the running event loop, until cancelled."""
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            try:
+                await asyncio.sleep(self.interval)
+            except asyncio.CancelledError:  # keep a pending late callback
+                if loop.time() - start > self.interval:
+                    self.observe(loop.time() - start - self.interval)
+                raise
+            self.observe(max(0.0, loop.time() - start - self.interval))
+
+    def observe(self, lag: float):
+        """Record a lag.
+
+        Args:
+            lag: Lag in seconds.
+        """
+        self.lag.observe(lag)
+        self.max = max(self.max, lag)
+
+    async def watch(self, coro: Awaitable[Any]) -> Any:
+        """Measure the lag of the event loop while awaiting a coroutine.
+
+        Args:
+            coro: Coroutine to await.
+
+        Returns:
+            Result of the coroutine.
+        """
+        task = asyncio.ensure_future(self.run())
+        await asyncio.sleep(0)  # start measuring before coro blocks the loop
+        try:
+            return await coro
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def summary(self) -> str:
+        """Return a summary of the measured lags.
+
+        Returns:
+            Mean and maximum lag, in milliseconds.
+        """
+        mean = self.lag.sum / self.lag.count if self.lag.count else 0.0
+        return (f"mean {mean * 1000:.1f} ms, max {self.max * 1000:.1f} ms "
+                f"({self.lag.count} samples)")
+
+
+class Exporter:
+    """Build status of CI services, exposed as Prometheus metrics.
+
+    Statuses are refreshed in the background by refresh(), and metrics are
+    rendered once per refresh, so that serving them never waits for a CI
+    service.
+
+    Args:
+        branches: Branches to check.
+        services: Services to check (default: every service in SERVICES).
+        repos: Repos to check (default: every repo).
+        tokens: Dictionary of service -> token (default: tokens stored in
+            the config file).
+        transport: Transport to use for every request (default: a new
+            aiohttp transport for each refresh).
+
+    Attributes:
+        metrics: Metrics in the Prometheus text format.
+        monitor: LoopMonitor of the event loop (run by serve()).
+    """
+
+    def __init__(self,
+                 branches: Iterable[str] = ("master", ),
+                 services: Optional[Iterable[str]] = None,
+                 repos: Optional[Iterable[str]] = None,
+                 tokens: Optional[Dict[str, str]] = None,
+                 transport: Optional[Transport] = None):
+        self.branches = list(branches)
+        self.services = list(services or SERVICES)
+        self.repos = repos
+        self.tokens = tokens
+        self.transport = transport
+        self._status: Dict[str, List[BuildStatus]] = {}
+        self._last_success: Dict[Tuple[str, str, str, str], float] = {}
+        self._last_refresh: Dict[str, float] = {}
+        self._errors = {service: 0 for service in self.services}
+        self._latency = {service: Histogram() for service in self.services}
+        self.monitor = LoopMonitor()
+        self.metrics = self.render()
+
+    async def refresh_service(self, service: str):
+        """Refresh the status of every repository of a service.
+
+        On failure, the previous status (of the repositories which could not
+        be checked) is kept and the error counter of the service is increased.
+
+        Args:
+            service: Service name.
+        """
+        start = time.monotonic()
+        try:
+            results = await fetch_status([service], self.branches,
+                                         self.repos, self.tokens,
+                                         transport=self.transport)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._errors[service] += 1
+            return
+        finally:
+            self._latency[service].observe(time.monotonic() - start)
+        failed = {(error.repo, error.branch) for error in results
+                  if isinstance(error, StatusError)}
+        now = time.time()
+        statuses = [result for result in results
+                    if isinstance(result, BuildStatus)]
+        for result in statuses:
+            if COLOURS.get(result.status) == "green":
+                self._last_success[(result.service, result.repo,
+                                    result.branch, result.pipeline or "")] = now
+        if failed:
+            self._errors[service] += 1
+            statuses += [result for result in self._status.get(service, [])
+                         if {(result.repo, result.branch),
+                             (None, result.branch)} & failed]
+        else:
+            self._last_refresh[service] = now
+        self._status[service] = statuses
+
+    async def refresh(self):
+        """Refresh the status of every service, and render the metrics."""
+        await asyncio.gather(*(self.refresh_service(service)
+                               for service in self.services))
+        self.metrics = self.render()
+
+    async def run(self, interval: float):
+        """Refresh the metrics every interval seconds, forever.
+
+        Args:
+            interval: Seconds between the start of two refreshes.
+        """
+        while True:
+            start = time.monotonic()
+            await self.refresh()
+            await asyncio.sleep(max(0, interval - (time.monotonic() - start)))
+
+    def render(self) -> str:
+        """Render the current snapshot in the Prometheus text format.
+
+        Returns:
+            Metrics text.
+        """
+        lines = ["# HELP quickci_build_status Current build status (1 for the "
+                 "reported status).",
+                 "# TYPE quickci_build_status gauge"]
+        for service in sorted(self._status):
+            for result in sorted(self._status[service]):
+                lines.append("quickci_build_status" + _labels(
+                    service=result.service, repo=result.repo,
+                    branch=result.branch, pipeline=result.pipeline or "",
+                    status=result.status.casefold()) + " 1")
+        lines += ["# HELP quickci_last_success_timestamp_seconds Last time a "
+                  "build was seen succeeding.",
+                  "# TYPE quickci_last_success_timestamp_seconds gauge"]
+        for (service, repo, branch, pipeline), timestamp in \
+                sorted(self._last_success.items()):
+            lines.append("quickci_last_success_timestamp_seconds" + _labels(
+                service=service, repo=repo, branch=branch,
+                pipeline=pipeline) + f" {timestamp}")
+        lines += ["# HELP quickci_last_refresh_timestamp_seconds Last "
+                  "successful refresh of a service.",
+                  "# TYPE quickci_last_refresh_timestamp_seconds gauge"]
+        for service, timestamp in sorted(self._last_refresh.items()):
+            lines.append("quickci_last_refresh_timestamp_seconds"
+                         f"{_labels(service=service)} {timestamp}")
+        lines += ["# HELP quickci_fetch_duration_seconds Time taken to fetch "
+                  "the status of a service.",
+                  "# TYPE quickci_fetch_duration_seconds histogram"]
+        for service in self.services:
+            lines += self._latency[service].lines(
+                "quickci_fetch_duration_seconds", service=service)
+        lines += ["# HELP quickci_api_errors_total Failed refreshes of a "
+                  "service.",
+                  "# TYPE quickci_api_errors_total counter"]
+        for service in self.services:
+            lines.append(f"quickci_api_errors_total{_labels(service=service)} "
+                         f"{self._errors[service]}")
+        lines += ["# HELP quickci_event_loop_lag_seconds Delay of event loop "
+                  "callbacks caused by a busy loop.",
+                  "# TYPE quickci_event_loop_lag_seconds histogram"]
+        lines += self.monitor.lag.lines("quickci_event_loop_lag_seconds")
+        return "\n".join(lines) + "\n"
+
+
+def serve(exporter: Exporter, host: str, port: int, interval: float):
+    """Serve the metrics on /metrics until interrupted, refreshing them in
+    the background.
+
+    Args:
+        exporter: Exporter to serve.
+        host: Host to listen on.
+        port: Port to listen on.
+        interval: Seconds between two refreshes.
+    """
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=exporter.metrics,
+                            content_type="text/plain",
+                            charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def start(app):
+        app["refresh"] = asyncio.ensure_future(exporter.run(interval))
+        app["monitor"] = asyncio.ensure_future(exporter.monitor.run())
+
+    async def stop(app):
+        app["refresh"].cancel()
+        app["monitor"].cancel()
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    web.run_app(app, host=host, port=port, print=None)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Union
+from quickci.api import _instances
+from quickci.classes import Build, COLOURS, StatusError
+from quickci.transport import AiohttpTransport, Transport
+
+
+def _numpy():
+    """Import numpy, which is needed to compute build statistics."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Build statistics require numpy: "
+                          "pip install quickci[history]")
+    return numpy
+
+
+async def fetch_history(since: float,
+                        services: Optional[Iterable[str]] = None,
+                        branches: Iterable[str] = ("master", ),
+                        repos: Optional[Iterable[str]] = None,
+                        tokens: Optional[Dict[str, str]] = None,
+                        transport: Optional[Transport] = None
+                        ) -> List[Union[Build, StatusError]]:
+    """Return the builds of each repository in the given CI services since
+    the given time.
+
+    As in fetch_status(), errors only affect the service (or repository)
+    which raised them, and are returned as StatusError.
+
+    Args:
+        since: Epoch seconds.
+        services: Service names (default: every service in SERVICES).
+        branches: Branches to check (default: master).
+        repos: Repositories to check (default: every repository).
+        tokens: Dictionary of service -> token (default: tokens stored in
+            the config file). Services without a valid token are skipped.
+        transport: Transport to use for every request; it will not be
+            closed.
+
+    Returns:
+        List of Build and StatusError.
+    """
+    own_transport = transport is None
+    if own_transport:
+        transport = AiohttpTransport()
+
+    async def history(ci) -> List[Union[Build, StatusError]]:
+        try:
+            builds = await ci.ahistory(since)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # only this service is affected
+            return [StatusError(ci.name, ci._repo, ci._branch,
+                                str(e) or type(e).__name__)]
+        return builds + [StatusError(ci.name, repo, ci._branch, error)
+                         for repo, error in ci._failures]
+
+    try:
+        instances = _instances(services, branches, repos, tokens, transport)
+        histories = await asyncio.gather(*(history(ci) for ci in instances))
+    finally:
+        if own_transport:
+            await transport.close()
+    return [build for builds in histories for build in builds]
+
+
+def _percentiles(np, values, groups, size: int, qs: Iterable[float]):
+    """Return the given percentiles of values, for each group.
+
+    Values are sorted once by group and value, so that every percentile of
+    every group is computed with a few array operations.
+
+    Returns:
+        List of arrays (one for each percentile) with a value for each group
+        (nan for groups without values).
+    """
+    valid = ~np.isnan(values)
+    values, groups = values[valid], groups[valid]
+    order = np.lexsort((values, groups))
+    values, groups = values[order], groups[order]
+    counts = np.bincount(groups, minlength=size)
+    starts = np.cumsum(counts) - counts
+    results = []
+    for q in qs:
+        if not len(values):
+            results.append(np.full(size, np.nan))
+            continue
+        pos = starts + q * np.maximum(counts - 1, 0)
+        low = np.clip(np.floor(pos).astype(int), 0, len(values) - 1)
+        high = np.clip(np.ceil(pos).astype(int), 0, len(values) - 1)
+        result = values[low] + (values[high] - values[low]) * (pos - low)
+        results.append(np.where(counts > 0, result, np.nan))
+    return results
+
+
+def summarise(builds: Iterable[Build]) -> List[Dict[str, Any]]:
+    """Compute statistics about the finished builds of each repository,
+    branch and pipeline.
+
+    The flip rate is the fraction of builds which failed between two
+    successful builds (i.e. likely flaky failures).
+
+    Args:
+        builds: Builds to summarise.
+
+    Returns:
+        List of dictionaries with service, repo, branch, pipeline, number
+        of builds, pass rate, flip rate, and 50th/95th percentiles of build
+        duration and queue time (in seconds, or None if not available).
+    """
+    np = _numpy()
+    builds = [build for build in builds
+              if COLOURS.get(build.status) in ("green", "red")]
+    keys = sorted({(build.service, build.repo, build.branch,
+                    build.pipeline or "") for build in builds})
+    if not keys:
+        return []
+    index = {key: i for i, key in enumerate(keys)}
+    groups = np.array([index[(build.service, build.repo, build.branch,
+                              build.pipeline or "")] for build in builds])
+    passed = np.array([COLOURS[build.status] == "green" for build in builds])
+    times = np.array([(build.created, build.started, build.finished)
+                      for build in builds], dtype=float)
+    created, started, finished = times.T
+    when = np.where(np.isnan(created), started, created)
+    when = np.where(np.isnan(when), finished, when)
+
+    order = np.lexsort((when, groups))
+    groups, passed = groups[order], passed[order]
+    created, started, finished = created[order], started[order], finished[order]
+    size = len(keys)
+    counts = np.bincount(groups, minlength=size)
+    passes = np.bincount(groups, weights=passed, minlength=size)
+    flipped = (groups[2:] == groups[:-2]) & passed[:-2] & ~passed[1:-1] \
+        & passed[2:]
+    flips = np.bincount(groups[1:-1][flipped], minlength=size)
+    duration = _percentiles(np, finished - started, groups, size, (0.5, 0.95))
+    queue = _percentiles(np, started - created, groups, size, (0.5, 0.95))
+
+    def value(array, i):
+        return None if np.isnan(array[i]) else round(float(array[i]), 1)
+
+    return [{"service": service, "repo": repo, "branch": branch,
+             "pipeline": pipeline or None,
+             "builds": int(counts[i]),
+             "pass_rate": round(float(passes[i] / counts[i]), 3),
+             "flip_rate": round(float(flips[i] / counts[i]), 3),
+             "duration_p50": value(duration[0], i),
+             "duration_p95": value(duration[1], i),
+             "queue_p50": value(queue[0], i),
+             "queue_p95": value(queue[1], i)}
+            for i, (service, repo, branch, pipeline) in enumerate(keys)]
+
+
+def parse_age(age: str) -> float:
+    """Convert an age such as 30d, 12h, 2w or 90m to seconds.
+
+    Args:
+        age: Number followed by a unit (m, h, d or w).
+
+    Returns:
+        Number of seconds.
+
+    Raises:
+        ValueError: If the age is not valid.
+    """
+    units = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+    if len(age) < 2 or age[-1] not in units:
+        raise ValueError(f"invalid age: {age}")
+    return float(age[:-1]) * units[age[-1]]
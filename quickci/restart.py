@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import fnmatch
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+from quickci.api import _instances
+from quickci.classes import COLOURS, NotSupported, ServiceError
+from quickci.transport import AiohttpTransport, Transport
+
+RESTARTED, DRY_RUN, UNSUPPORTED = "restarted", "would restart", "not supported"
+STATUS_FAILED = "status failed"
+
+
+class Restart(NamedTuple):
+    """Outcome of restarting the latest build of a repository.
+
+    Attributes:
+        service: Service name.
+        repo: Repository name (None if the status of the service could not
+            be retrieved).
+        outcome: RESTARTED, DRY_RUN, UNSUPPORTED, or the error message
+            (starting with STATUS_FAILED if the status of the service or
+            repository could not be retrieved).
+        build: Id of the restarted build, if any.
+    """
+    service: str
+    repo: Optional[str]
+    outcome: str
+    build: Optional[str] = None
+
+
+async def restart_failed(services: Optional[Iterable[str]] = None,
+                         branch: str = "master",
+                         pattern: str = "*",
+                         tokens: Optional[Dict[str, str]] = None,
+                         transport: Optional[Transport] = None,
+                         dry_run: bool = False,
+                         on_restart: Optional[Callable[[Restart], None]] = None
+                         ) -> List[Restart]:
+    """Restart the latest build of each repository whose latest build
+    failed.
+
+    Failed builds are found with the same requests as fetch_status(), and
+    the builds found are restarted (not a newer build started meanwhile); for
+    each service, at most RESTART_LIMIT builds are restarted at the same
+    time, and throttled requests are retried (see _CIService.asend()).
+    Repositories whose status could not be retrieved are reported as well.
+
+    Args:
+        services: Service names (default: every service in SERVICES).
+        branch: Branch to check.
+        pattern: Glob matching the names of the repositories to restart.
+        tokens: Dictionary of service -> token (default: tokens stored in
+            the config file). Services without a valid token are skipped.
+        transport: Transport to use for every request (default: a new
+            aiohttp transport).
+        dry_run: Only report the builds which would be restarted.
+        on_restart: Function called with each Restart, as soon as it is
+            available.
+
+    Returns:
+        List of Restart.
+    """
+    own_transport = transport is None
+    if own_transport:
+        transport = AiohttpTransport()
+
+    def report(restart: Restart) -> Restart:
+        if on_restart is not None:
+            on_restart(restart)
+        return restart
+
+    async def restart(ci, semaphore: asyncio.Semaphore, repo: str) -> Restart:
+        # a dry run reports the same builds as a real one would restart
+        if not ci.can_restart:
+            return report(Restart(ci.name, repo, UNSUPPORTED))
+        try:
+            build = ci.found_build(repo)
+        except ServiceError as e:
+            return report(Restart(ci.name, repo, f"failed ({e})"))
+        if dry_run:
+            return report(Restart(ci.name, repo, DRY_RUN, build))
+        async with semaphore:
+            try:
+                build = await ci.arestart(repo)
+            except NotSupported:
+                return report(Restart(ci.name, repo, UNSUPPORTED))
+            except ServiceError as e:
+                return report(Restart(ci.name, repo, f"failed ({e})"))
+        return report(Restart(ci.name, repo, RESTARTED, build))
+
+    async def restart_service(ci) -> List[Restart]:
+        try:
+            results = await ci.afetch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # only this service is affected
+            error = str(e) or type(e).__name__
+            return [report(Restart(ci.name, None,
+                                   f"{STATUS_FAILED} ({error})"))]
+        failures = [report(Restart(ci.name, repo, f"{STATUS_FAILED} ({error})"))
+                    for repo, error in ci._failures
+                    if fnmatch.fnmatch(repo, pattern)]
+        repos = sorted({result.repo for result in results
+                        if COLOURS.get(result.status) == "red"
+                        if fnmatch.fnmatch(result.repo, pattern)})
+        semaphore = asyncio.Semaphore(ci.RESTART_LIMIT)
+        return failures + list(await asyncio.gather(
+            *(restart(ci, semaphore, repo) for repo in repos)))
+
+    try:
+        instances = _instances(services, [branch], None, tokens, transport)
+        restarts = await asyncio.gather(*(restart_service(ci)
+                                          for ci in instances))
+    finally:
+        if own_transport:
+            await transport.close()
+    return [restart for batch in restarts for restart in batch]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from quickci.classes import BuildStatus
+
+VERSION = 1
+
+Failure = Tuple[str, str, str, str]  # service, repo, branch, error
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse a shard such as 2/5 (the second of five shards).
+
+    Args:
+        value: Shard index (starting from 1) and number of shards.
+
+    Returns:
+        Tuple of shard index and number of shards.
+
+    Raises:
+        ValueError: If the shard is not valid.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"invalid shard: {value} (expected i/n)")
+    if not 1 <= index <= count:
+        raise ValueError(f"invalid shard: {value} (i must be between 1 and "
+                         f"n)")
+    return index, count
+
+
+def write_snapshot(path: str,
+                   results: Iterable[BuildStatus],
+                   failures: Iterable[Failure] = (),
+                   shard: Optional[Tuple[int, int]] = None):
+    """Write build statuses to a snapshot file, which can be merged with
+    the snapshots of other shards by merge_snapshots().
+
+    Args:
+        path: Snapshot file.
+        results: BuildStatus of each repository.
+        failures: (service, repo, branch, error) of each repository whose
+            status could not be retrieved.
+        shard: Shard checked, as (i, n), if any.
+    """
+    snapshot = {"version": VERSION,
+                "created": time.time(),
+                "shard": f"{shard[0]}/{shard[1]}" if shard else None,
+                "results": [result._asdict() for result in results],
+                "failures": [dict(zip(("service", "repo", "branch", "error"),
+                                      failure)) for failure in failures]}
+    with open(path, "w") as f:
+        json.dump(snapshot, f, indent=2)
+
+
+def read_snapshot(path: str) -> Dict[str, Any]:
+    """Read a snapshot file.
+
+    Args:
+        path: Snapshot file.
+
+    Returns:
+        Snapshot dictionary.
+
+    Raises:
+        ValueError: If the file is not a valid snapshot.
+    """
+    with open(path) as f:
+        try:
+            snapshot = json.load(f)
+        except json.JSONDecodeError:
+            raise ValueError(f"{path} is not a valid snapshot")
+    if not isinstance(snapshot, dict) or snapshot.get("version") != VERSION:
+        raise ValueError(f"{path} is not a valid snapshot")
+    return snapshot
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, Any]]
+                    ) -> Tuple[List[BuildStatus], List[Failure]]:
+    """Merge snapshots into a single, de-duplicated view.
+
+    When several snapshots contain the same repository, branch and pipeline
+    (e.g. overlapping shards, or consecutive runs), the most recent one is
+    kept; a failure is dropped if the status of the repository was
+    retrieved by another snapshot.
+
+    Args:
+        snapshots: Snapshot dictionaries, as returned by read_snapshot().
+
+    Returns:
+        BuildStatus of each repository (sorted by service, branch and
+        repository), and sorted failures.
+    """
+    results: Dict[Tuple, Tuple[float, BuildStatus]] = {}
+    failures: Dict[Tuple[str, str, str], Tuple[float, str]] = {}
+    for snapshot in snapshots:
+        created = snapshot.get("created", 0)
+        for item in snapshot.get("results", []):
+            result = BuildStatus(**item)
+            key = (result.service, result.repo, result.branch,
+                   result.pipeline)
+            if key not in results or results[key][0] <= created:
+                results[key] = (created, result)
+        for item in snapshot.get("failures", []):
+            key = (item["service"], item["repo"], item["branch"])
+            if key not in failures or failures[key][0] <= created:
+                failures[key] = (created, item["error"])
+    found = {(result.service, result.repo, result.branch)
+             for _, result in results.values()}
+    merged = sorted((result for _, result in results.values()),
+                    key=lambda r: (r.service, r.branch, r.repo,
+                                   r.pipeline or ""))
+    return (merged,
+            sorted(key + (error, ) for key, (_, error) in failures.items()
+                   if key not in found))
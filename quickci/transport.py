@@ -0,0 +1,556 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, Hashable,
+                    Iterable, List, Optional, Tuple, Union)
+
+try:
+    import orjson
+except ImportError:  # optional, faster json decoder
+    orjson = None
+
+
+def loads(body: bytes) -> Any:
+    """Decode a json body, using orjson if it is installed.
+
+    Args:
+        body: Raw body.
+
+    Returns:
+        Decoded content.
+
+    Raises:
+        ValueError: If the body is not valid json.
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body.decode("utf-8"))
+
+
+class Response:
+    """Response returned by any transport.
+
+    Attributes:
+        status: HTTP status code.
+        body: Raw response body.
+        headers: Response headers.
+    """
+
+    def __init__(self,
+                 status: int,
+                 body: bytes,
+                 headers: Optional[Dict[str, str]] = None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self) -> Any:
+        """Decode the response body.
+
+        Returns:
+            Json content of the response.
+        """
+        return loads(self.body)
+
+
+class HTTPError(Exception):
+    """Error raised when a streamed response has an error status.
+
+    Args:
+        status: HTTP status code.
+    """
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class Transport:
+    """Base class for any HTTP transport used by the CI services.
+
+    Subclasses need to implement request() and close(), and can override
+    get_range() to stream responses.
+    """
+
+    name = "base"
+
+    async def request(self,
+                      method: str,
+                      url: str,
+                      headers: Optional[Dict[str, str]] = None,
+                      data: Optional[bytes] = None) -> Response:
+        """Perform a request.
+
+        Args:
+            method: HTTP method.
+            url: Url to request.
+            headers: Request headers to use.
+            data: Request body.
+
+        Returns:
+            Response to the request.
+        """
+        raise NotImplementedError
+
+    async def get(self,
+                  url: str,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+        """Perform a GET request.
+
+        Args:
+            url: Url to request.
+            headers: Request headers to use.
+
+        Returns:
+            Response to the request.
+        """
+        return await self.request("GET", url, headers=headers)
+
+    async def get_range(self,
+                        url: str,
+                        offset: int,
+                        headers: Optional[Dict[str, str]] = None) -> AsyncIterator[bytes]:
+        """Yield the content of url starting from offset, a chunk at a time.
+
+        Only the bytes after offset are requested (using a Range header); if
+        the server ignores the Range header, the bytes before offset are
+        skipped instead. This implementation reads the whole response in
+        memory: subclasses override it to stream the response.
+
+        Args:
+            url: Url to request.
+            offset: Number of bytes to skip.
+            headers: Request headers to use.
+
+        Yields:
+            Chunks of content.
+
+        Raises:
+            HTTPError: If the response has an error status.
+        """
+        response = await self.get(url, headers=self.range_headers(headers,
+                                                                  offset))
+        self.check_range(response.status)
+        if response.status == 206:
+            yield response.body
+        elif response.status == 200:
+            yield response.body[offset:]
+
+    @staticmethod
+    def range_headers(headers: Optional[Dict[str, str]],
+                      offset: int) -> Dict[str, str]:
+        """Return headers requesting the content after offset."""
+        return dict(headers or {}, Range=f"bytes={offset}-")
+
+    @staticmethod
+    def check_range(status: int):
+        """Raise HTTPError if a range request failed (416 means that there
+        is no new content)."""
+        if status >= 400 and status != 416:
+            raise HTTPError(status)
+
+    @staticmethod
+    async def skip(chunks: AsyncIterator[bytes],
+                   offset: int) -> AsyncIterator[bytes]:
+        """Yield chunks, skipping the first offset bytes."""
+        async for chunk in chunks:
+            if offset >= len(chunk):
+                offset -= len(chunk)
+                continue
+            yield chunk[offset:]
+            offset = 0
+
+    async def close(self):
+        """Release any connection held by the transport."""
+        pass
+
+
+class AiohttpTransport(Transport):
+    """HTTP/1.1 transport based on aiohttp.
+
+    A single session (and therefore a single connection pool) is used for
+    every request. An existing session can be provided, in which case it
+    will not be closed by the transport.
+    """
+
+    name = "aiohttp"
+    CHUNK_SIZE = 65536
+
+    def __init__(self, session=None):
+        self._session = session
+        self._owns_session = session is None
+
+    @property
+    def session(self):
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def request(self,
+                      method: str,
+                      url: str,
+                      headers: Optional[Dict[str, str]] = None,
+                      data: Optional[bytes] = None) -> Response:
+        async with self.session.request(method, url, headers=headers,
+                                        data=data) as response:
+            body = await response.read()
+            return Response(response.status, body, dict(response.headers))
+
+    async def get_range(self,
+                        url: str,
+                        offset: int,
+                        headers: Optional[Dict[str, str]] = None) -> AsyncIterator[bytes]:
+        async with self.session.get(url, headers=self.range_headers(
+                headers, offset)) as response:
+            self.check_range(response.status)
+            chunks = response.content.iter_chunked(self.CHUNK_SIZE)
+            if response.status == 200:
+                chunks = self.skip(chunks, offset)
+            if response.status in (200, 206):
+                async for chunk in chunks:
+                    yield chunk
+
+    async def close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+
+class HTTP2Transport(Transport):
+    """HTTP/2 transport based on httpx.
+
+    Every request to the same host is multiplexed over a single connection.
+    Requires the optional ``httpx[http2]`` dependency
+    (``pip install quickci[http2]``).
+    """
+
+    name = "http2"
+
+    def __init__(self):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("The http2 transport requires httpx: "
+                              "pip install quickci[http2]")
+        self._client = httpx.AsyncClient(http2=True)
+
+    async def request(self,
+                      method: str,
+                      url: str,
+                      headers: Optional[Dict[str, str]] = None,
+                      data: Optional[bytes] = None) -> Response:
+        response = await self._client.request(method, url, headers=headers,
+                                              content=data)
+        return Response(response.status_code, response.content,
+                        dict(response.headers))
+
+    async def get_range(self,
+                        url: str,
+                        offset: int,
+                        headers: Optional[Dict[str, str]] = None) -> AsyncIterator[bytes]:
+        async with self._client.stream("GET", url, headers=self.range_headers(
+                headers, offset)) as response:
+            self.check_range(response.status_code)
+            chunks = response.aiter_bytes()
+            if response.status_code == 200:
+                chunks = self.skip(chunks, offset)
+            if response.status_code in (200, 206):
+                async for chunk in chunks:
+                    yield chunk
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class FakeTransport(Transport):
+    """In-memory transport returning predefined responses, used for tests.
+
+    Args:
+        routes: Dictionary of url -> response, where the response can be
+            either a Response or any json-serializable content (returned
+            with status 200). Unknown urls return a 404 response.
+
+    Attributes:
+        requests: List of (method, url, headers) of each request performed.
+    """
+
+    name = "fake"
+
+    def __init__(self, routes: Optional[Dict[str, Union[Response, Any]]] = None):
+        self.routes = routes or {}
+        self.requests: List[Tuple[str, str, Dict[str, str]]] = []
+
+    async def request(self,
+                      method: str,
+                      url: str,
+                      headers: Optional[Dict[str, str]] = None,
+                      data: Optional[bytes] = None) -> Response:
+        self.requests.append((method, url, headers or {}))
+        if url not in self.routes:
+            return Response(404, b'{"error": "not found"}')
+        route = self.routes[url]
+        if isinstance(route, Response):
+            return route
+        return Response(200, json.dumps(route).encode("utf-8"))
+
+
+class RecordingTransport(Transport):
+    """Transport recording every request performed by another transport,
+    and its response, into a cassette file (written when the transport is
+    closed).
+
+    Request headers are not recorded, and secrets (the values of the
+    authentication headers, the tokens returned in json responses, e.g. by
+    a login request, and any given secret) are replaced with REDACTED
+    wherever they appear in the recorded urls and bodies.
+
+    Args:
+        transport: Transport used to perform the requests.
+        path: Path of the cassette file.
+        secrets: Additional strings to redact (e.g. tokens).
+
+    Attributes:
+        interactions: List of recorded requests and responses.
+    """
+
+    name = "record"
+    SECRET_HEADERS = ("authorization", "circle-token")
+    SECRET_FIELDS = ("access_token", "refresh_token", "token")
+    RESPONSE_HEADERS = ("content-type", "link", "retry-after")
+
+    def __init__(self,
+                 transport: Transport,
+                 path: str,
+                 secrets: Iterable[str] = ()):
+        self._transport = transport
+        self.path = path
+        self.secrets = {secret for secret in secrets if secret}
+        self.interactions: List[Dict[str, Any]] = []
+
+    async def request(self,
+                      method: str,
+                      url: str,
+                      headers: Optional[Dict[str, str]] = None,
+                      data: Optional[bytes] = None) -> Response:
+        for key, value in (headers or {}).items():
+            if key.lower() in self.SECRET_HEADERS and value.split():
+                self.secrets.add(value.split()[-1])
+        start = time.monotonic()
+        response = await self._transport.request(method, url, headers=headers,
+                                                 data=data)
+        self.interactions.append({
+            "method": method,
+            "url": url,
+            "data": data.decode("utf-8", "replace") if data else None,
+            "status": response.status,
+            "headers": {key: value for key, value in response.headers.items()
+                        if key.lower() in self.RESPONSE_HEADERS},
+            "body": response.body.decode("utf-8", "replace"),
+            "elapsed": round(time.monotonic() - start, 3)})
+        if b"token" in response.body:
+            try:
+                self.secrets.update(self.secret_fields(loads(response.body)))
+            except ValueError:
+                pass
+        return response
+
+    def secret_fields(self, data: Any) -> Iterable[str]:
+        """Yield the values of the SECRET_FIELDS of a json response, at any
+        depth.
+
+        Args:
+            data: Decoded json response.
+
+        Yields:
+            Secret strings.
+        """
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if key.lower() not in self.SECRET_FIELDS:
+                    yield from self.secret_fields(value)
+                elif isinstance(value, str) and value:
+                    yield value
+        elif isinstance(data, list):
+            for item in data:
+                yield from self.secret_fields(item)
+
+    def redact(self, text: Optional[str]) -> Optional[str]:
+        """Replace every secret in text with REDACTED.
+
+        Args:
+            text: Text to redact.
+
+        Returns:
+            Redacted text.
+        """
+        for secret in self.secrets:
+            if text:
+                text = text.replace(secret, "REDACTED")
+        return text
+
+    def save(self):
+        """Write the redacted interactions to the cassette file."""
+        interactions = [dict(interaction,
+                             **{key: self.redact(interaction[key])
+                                for key in ("url", "data", "body")})
+                        for interaction in self.interactions]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(interactions, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    async def close(self):
+        await self._transport.close()
+        self.save()
+
+
+class ReplayTransport(Transport):
+    """Transport serving the responses recorded by RecordingTransport,
+    without any network access.
+
+    Requests are matched by method, url and body; identical requests are
+    answered with the recorded responses in order (the last one is repeated
+    if needed). Unknown requests return a 404 response.
+
+    Args:
+        path: Path of the cassette file.
+        latency: Whether to wait as long as the original request took.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, latency: bool = True):
+        self.latency = latency
+        self._responses: Dict[Tuple[str, str, Optional[str]],
+                              List[Dict[str, Any]]] = {}
+        with open(path) as f:
+            for interaction in json.load(f):
+                key = (interaction["method"], interaction["url"],
+                       interaction["data"])
+                self._responses.setdefault(key, []).append(interaction)
+
+    async def request(self,
+                      method: str,
+                      url: str,
+                      headers: Optional[Dict[str, str]] = None,
+                      data: Optional[bytes] = None) -> Response:
+        key = (method, url, data.decode("utf-8", "replace") if data else None)
+        responses = self._responses.get(key)
+        if not responses:
+            return Response(404, b'{"error": "not recorded"}')
+        interaction = responses.pop(0) if len(responses) > 1 else responses[0]
+        if self.latency:
+            await asyncio.sleep(interaction["elapsed"])
+        return Response(interaction["status"],
+                        interaction["body"].encode("utf-8"),
+                        interaction["headers"])
+
+
+class SingleFlight:
+    """Deduplicate concurrent identical calls.
+
+    While a call for a given key is in flight, further calls with the same
+    key wait for it and share its result instead of starting a new one.
+
+    Attributes:
+        coalesced: Number of calls which shared the result of another one.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self,
+                 key: Hashable,
+                 func: Callable[[], Awaitable[Any]]) -> Any:
+        """Call func, unless a call with the same key is already in flight.
+
+        Args:
+            key: Key identifying identical calls.
+            func: Coroutine function to call.
+
+        Returns:
+            Result of the call.
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+
+class Decoder:
+    """Decode json bodies without blocking the event loop for long.
+
+    Small bodies are decoded directly, while bodies larger than threshold
+    are decoded in a process pool (a thread would hold the GIL, and so the
+    event loop, for the whole decoding), created on first use.
+
+    Args:
+        threshold: Size in bytes above which bodies are decoded in the
+            process pool (None to always decode directly).
+        workers: Number of processes of the pool.
+
+    Attributes:
+        offloaded: Number of bodies decoded in the process pool.
+    """
+
+    THRESHOLD = 1 << 20
+
+    def __init__(self, threshold: Optional[int] = THRESHOLD, workers: int = 2):
+        self.threshold = threshold
+        self.workers = workers
+        self.offloaded = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def decode(self, body: bytes) -> Any:
+        """Decode a json body.
+
+        Args:
+            body: Raw body.
+
+        Returns:
+            Decoded content.
+
+        Raises:
+            ValueError: If the body is not valid json.
+        """
+        if self.threshold is None or len(body) <= self.threshold:
+            return loads(body)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        self.offloaded += 1
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._pool, loads, body)
+
+    def close(self):
+        """Shut down the process pool, if it was created."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+TRANSPORTS = {"aiohttp": AiohttpTransport,
+              "http2": HTTP2Transport}
+
+
+def get_transport(name: str) -> Transport:
+    """Create a new transport given its name.
+
+    Args:
+        name: Transport name (one of TRANSPORTS).
+
+    Returns:
+        New transport instance.
+    """
+    return TRANSPORTS[name]()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from quickci.api import fetch_status
+from quickci.classes import BuildStatus, COLOURS, PENDING, StatusError
+from quickci.transport import AiohttpTransport, Transport
+
+SUCCESS, FAILURE, TIMEOUT, NOT_FOUND, ERROR = 0, 1, 3, 4, 5
+BACKOFF = 2
+
+Key = Tuple[str, str, Optional[str]]  # service, repo, pipeline
+
+
+def matches(result: BuildStatus, sha: str) -> bool:
+    """Return whether a build is for the given commit.
+
+    Args:
+        result: BuildStatus to check.
+        sha: Full or abbreviated commit sha.
+
+    Returns:
+        Whether the build is for the commit.
+    """
+    if not result.sha:
+        return False
+    return result.sha.startswith(sha) or sha.startswith(result.sha)
+
+
+async def wait_for_commit(sha: str,
+                          branch: str = "master",
+                          services: Optional[Iterable[str]] = None,
+                          repos: Optional[Iterable[str]] = None,
+                          tokens: Optional[Dict[str, str]] = None,
+                          transport: Optional[Transport] = None,
+                          interval: float = 5,
+                          max_interval: float = 60,
+                          timeout: float = 3600,
+                          grace: float = 30,
+                          fail_fast: bool = False,
+                          on_change: Optional[Callable[[BuildStatus], None]] = None,
+                          on_error: Optional[Callable[[StatusError], None]] = None
+                          ) -> Tuple[int, Dict[Key, BuildStatus]]:
+    """Wait until every build of a commit is finished.
+
+    Every repository of every service is checked until grace seconds after
+    the first build of the commit is found (so that builds which start later,
+    e.g. on another service, are not missed); after that, only the
+    repositories with a build of the commit are polled. The time between two
+    polls starts from interval, and doubles (up to max_interval) every time
+    no build changed.
+
+    Args:
+        sha: Full or abbreviated commit sha.
+        branch: Branch built.
+        services: Service names (default: every service in SERVICES).
+        repos: Repositories to check (default: every repository).
+        tokens: Dictionary of service -> token (default: tokens stored in
+            the config file).
+        transport: Transport to use for every request (default: a new
+            aiohttp transport).
+        interval: Initial number of seconds between two polls.
+        max_interval: Maximum number of seconds between two polls.
+        timeout: Number of seconds after which to stop waiting.
+        grace: Number of seconds to keep looking for new builds after the
+            first one is found.
+        fail_fast: Return as soon as a build fails, without waiting for the
+            other ones.
+        on_change: Function called with each new or changed build.
+        on_error: Function called with each StatusError which was not
+            already returned by the previous poll.
+
+    Returns:
+        Exit code (SUCCESS, FAILURE, TIMEOUT, NOT_FOUND if no build of the
+        commit was found before the timeout, or ERROR if the status of some
+        repositories could not be retrieved on the last poll), and the last
+        BuildStatus of each build.
+    """
+    own_transport = transport is None
+    if own_transport:
+        transport = AiohttpTransport()
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    delay = interval
+    discovery = None  # end of the discovery of new builds
+    builds: Dict[Key, BuildStatus] = {}
+    errors: List[StatusError] = []
+    affected: Dict[str, Set[str]] = {}
+    try:
+        while True:
+            if discovery is None or loop.time() < discovery:
+                results = await fetch_status(services, [branch], repos,
+                                             tokens, transport=transport)
+            else:
+                batches = await asyncio.gather(*(
+                    fetch_status([service], [branch], sorted(names), tokens,
+                                 transport=transport)
+                    for service, names in affected.items()))
+                results = [result for batch in batches for result in batch]
+            changed = False
+            previous, errors = errors, [result for result in results
+                                        if isinstance(result, StatusError)]
+            for error in errors:
+                if error not in previous and on_error is not None:
+                    on_error(error)
+            for result in results:
+                if isinstance(result, StatusError) or not matches(result, sha):
+                    continue
+                key = (result.service, result.repo, result.pipeline)
+                if builds.get(key) != result:
+                    builds[key] = result
+                    changed = True
+                    if on_change is not None:
+                        on_change(result)
+                affected.setdefault(result.service, set()).add(result.repo)
+            if builds and discovery is None:
+                discovery = loop.time() + grace
+            discovered = discovery is not None and loop.time() >= discovery
+            pending = [build for build in builds.values()
+                       if build.status in PENDING]
+            failed = [build for build in builds.values()
+                      if build not in pending
+                      if COLOURS.get(build.status) != "green"]
+            if failed and (fail_fast or (not pending and discovered)):
+                return FAILURE, builds
+            if builds and not pending and discovered:
+                return (ERROR if errors else SUCCESS), builds
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                if errors:
+                    return ERROR, builds
+                return (TIMEOUT if builds else NOT_FOUND), builds
+            delay = interval if changed else min(delay * BACKOFF, max_interval)
+            if discovery is not None and not discovered:
+                remaining = min(remaining, discovery - loop.time())
+            await asyncio.sleep(max(0, min(delay, remaining)))
+    finally:
+        if own_transport:
+            await transport.close()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import base64
+import click
+import hashlib
+import hmac
+import json
+import re
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+from quickci.classes import WebhookState
+
+
+class WebhookError(Exception):
+    """Raised when a webhook payload cannot be verified or parsed.
+
+    Attributes:
+        status: HTTP status code to answer with.
+    """
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def verify_hmac(secret: str,
+                body: bytes,
+                signature: str,
+                digest: Callable = hashlib.sha256) -> bool:
+    """Check an hex HMAC signature of the request body.
+
+    Args:
+        secret: Shared webhook secret.
+        body: Raw request body.
+        signature: Hex signature sent with the request.
+        digest: Hash function used for the HMAC.
+
+    Returns:
+        Whether the signature is valid.
+    """
+    expected = hmac.new(secret.encode(), body, digest).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def verify_travis(public_key: str, payload: str, signature: str) -> bool:
+    """Check the RSA-SHA1 signature of a Travis CI webhook payload.
+
+    Requires the optional ``cryptography`` dependency.
+
+    Args:
+        public_key: Travis CI public key (PEM format).
+        payload: Value of the ``payload`` form field.
+        signature: Base64 value of the ``Signature`` header.
+
+    Returns:
+        Whether the signature is valid.
+    """
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    key = serialization.load_pem_public_key(public_key.encode())
+    try:
+        key.verify(base64.b64decode(signature), payload.encode(),
+                   padding.PKCS1v15(), hashes.SHA1())
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def verify_drone(secret: str,
+                 method: str,
+                 path: str,
+                 headers: Dict[str, str],
+                 body: bytes) -> bool:
+    """Check the HTTP signature (hmac-sha256) of a Drone CI webhook.
+
+    Args:
+        secret: Shared webhook secret.
+        method: Request method.
+        path: Request path (including query string).
+        headers: Request headers.
+        body: Raw request body.
+
+    Returns:
+        Whether both the body digest and the signature are valid.
+    """
+    headers = {k.lower(): v for k, v in headers.items()}
+    params = dict(re.findall(r'(\w+)="([^"]*)"', headers.get("signature", "")))
+    if params.get("algorithm") != "hmac-sha256" or "signature" not in params:
+        return False
+    digest = base64.b64encode(hashlib.sha256(body).digest()).decode()
+    if "digest" in headers and headers["digest"] != f"SHA-256={digest}":
+        return False
+    lines = []
+    for name in params.get("headers", "date").split():
+        if name == "(request-target)":
+            lines.append(f"{name}: {method.lower()} {path}")
+        else:
+            lines.append(f"{name}: {headers.get(name, '')}")
+    expected = hmac.new(secret.encode(), "\n".join(lines).encode(),
+                        hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(expected).decode(),
+                               params["signature"])
+
+
+def parse_travis(body: bytes) -> Dict[str, Any]:
+    payload = json.loads(parse_qs(body.decode()).get("payload", ["{}"])[0])
+    return {"repo": payload["repository"]["name"],
+            "branch": payload["branch"],
+            "status": payload["state"]}
+
+
+def parse_circle(body: bytes) -> Dict[str, Any]:
+    payload = json.loads(body)
+    return {"repo": payload["project"]["name"],
+            "branch": payload["pipeline"]["vcs"]["branch"],
+            "status": payload["workflow"]["status"]}
+
+
+def parse_appveyor(body: bytes) -> Dict[str, Any]:
+    data = json.loads(body)["eventData"]
+    return {"repo": data.get("projectSlug", data["projectName"]),
+            "branch": data["branch"],
+            "status": "success" if data.get("passed") else "failed"}
+
+
+def parse_buddy(body: bytes) -> Dict[str, Any]:
+    payload = json.loads(body)
+    return {"repo": payload["project"]["name"],
+            "branch": payload["execution"]["branch"]["name"],
+            "status": payload["execution"]["status"],
+            "pipeline": payload["pipeline"]["name"]}
+
+
+def parse_drone(body: bytes) -> Dict[str, Any]:
+    payload = json.loads(body)
+    return {"repo": payload["repo"]["name"],
+            "branch": payload["build"]["source"],
+            "status": payload["build"]["status"]}
+
+
+PARSERS = {"travis": parse_travis,
+           "circle": parse_circle,
+           "appveyor": parse_appveyor,
+           "buddy": parse_buddy,
+           "drone": parse_drone}
+
+
+class WebhookReceiver:
+    """Verify and normalise webhook payloads, and store them in the
+    webhook state.
+
+    Args:
+        secrets: Dictionary of service -> webhook secret.
+        travis_key: Travis CI public key used to verify its payloads.
+    """
+
+    def __init__(self,
+                 secrets: Dict[str, str],
+                 travis_key: Optional[str] = None):
+        self._secrets = secrets
+        self._travis_key = travis_key
+        self.state = WebhookState()
+
+    def verify(self,
+               service: str,
+               method: str,
+               url: str,
+               headers: Dict[str, str],
+               body: bytes) -> bool:
+        """Check the signature of a webhook payload.
+
+        Args:
+            service: Service name.
+            method: Request method.
+            url: Request url (path and query string).
+            headers: Request headers.
+            body: Raw request body.
+
+        Returns:
+            Whether the payload comes from the given service.
+        """
+        headers = {k.lower(): v for k, v in headers.items()}
+        if service == "travis":
+            if self._travis_key is None:
+                return False
+            payload = parse_qs(body.decode()).get("payload", [""])[0]
+            return verify_travis(self._travis_key, payload,
+                                 headers.get("signature", ""))
+        secret = self._secrets.get(service)
+        if secret is None:
+            return False
+        if service == "circle":
+            signatures = dict(part.partition("=")[::2] for part in
+                              headers.get("circleci-signature", "").split(","))
+            return verify_hmac(secret, body, signatures.get("v1", ""))
+        if service == "buddy":
+            signature = headers.get("x-hub-signature", "")
+            return verify_hmac(secret, body, signature.partition("=")[2],
+                               hashlib.sha1)
+        if service == "drone":
+            parsed = urlparse(url)
+            path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+            return verify_drone(secret, method, path, headers, body)
+        # AppVeyor does not sign its payloads, the secret is sent as header
+        return hmac.compare_digest(headers.get("x-quickci-secret", ""),
+                                   secret)
+
+    def receive(self,
+                service: str,
+                method: str,
+                url: str,
+                headers: Dict[str, str],
+                body: bytes) -> Dict[str, Any]:
+        """Verify, normalise and store a webhook payload.
+
+        Args:
+            service: Service name.
+            method: Request method.
+            url: Request url (path and query string).
+            headers: Request headers.
+            body: Raw request body.
+
+        Returns:
+            Normalised status entry.
+
+        Raises:
+            WebhookError: if the payload is not valid.
+        """
+        if service not in PARSERS:
+            raise WebhookError(f"Unknown service {service}.", 404)
+        if not self.verify(service, method, url, headers, body):
+            raise WebhookError(f"Invalid {service} signature.", 401)
+        try:
+            entry = PARSERS[service](body)
+        except (KeyError, TypeError, ValueError):
+            raise WebhookError(f"Invalid {service} payload.")
+        entry["service"] = service
+        self.state.update(entry)
+        return entry
+
+
+def travis_public_key() -> Optional[str]:
+    """Return the public key used by Travis CI to sign webhook payloads.
+
+    Returns:
+        Public key, or None if it cannot be retrieved or verified.
+    """
+    try:
+        import cryptography  # noqa: F401
+        import requests
+        response = requests.get("https://api.travis-ci.com/config")
+        config = response.json().get("config")
+        return config["notifications"]["webhook"]["public_key"]
+    except Exception:
+        return None
+
+
+def serve(receiver: WebhookReceiver, host: str, port: int):
+    """Run the webhook server until interrupted.
+
+    Args:
+        receiver: WebhookReceiver used to handle payloads.
+        host: Host to listen on.
+        port: Port to listen on.
+    """
+    from aiohttp import web
+
+    async def handle(request):
+        service = request.match_info["service"]
+        body = await request.read()
+        try:
+            entry = receiver.receive(service, request.method,
+                                     str(request.rel_url),
+                                     dict(request.headers), body)
+        except WebhookError as e:
+            return web.Response(status=e.status, text=str(e))
+        pipe = f" ({entry['pipeline']} pipeline)" if entry.get("pipeline") else ""
+        click.echo(f"\t{service}: {entry['repo']}{pipe} "
+                   f"({entry['branch']} branch) -> {entry['status']}")
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post("/{service}", handle)
+    web.run_app(app, host=host, port=port, print=None)
@@ -12,6 +12,10 @@ with open("HISTORY.rst") as history_file:
 requirements = ["Click>=7.0", "requests>=2.21.0", "asyncio>=3.4.3",
                 "aiohttp>=3.5.4"]
 
+extra_requirements = {"http2": ["httpx[http2]>=0.18.0"],
+                      "history": ["numpy>=1.16"],
+                      "json": ["orjson>=3.0"]}
+
 setup_requirements = ["pytest-runner", ]
 
 test_requirements = ["pytest", ]
@@ -36,6 +40,7 @@ setup(  # pragma: no cover
         ],
     },
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="MIT license",
     long_description=readme + "\n\n" + history,
     long_description_content_type="text/x-rst",
@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import pytest
+from quickci.classes import Cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Store cache files in a temporary directory."""
+    monkeypatch.setattr(Cache, "CACHE_DIR", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import os
+import pytest
+from quickci.artifacts import (DOWNLOADED, RESUMED, SKIPPED,
+                               download_artifacts)
+from quickci.classes import AppVeyor, DroneCI, NotSupported, ServiceError
+from quickci.transport import FakeTransport, HTTPError, Response
+
+URL = "https://ci.appveyor.com/api"
+FILES = {"dist/app.zip": b"zipped" * 1000, "dist/notes.txt": b"notes",
+         "logs/test.log": b"log"}
+
+
+class RangeTransport(FakeTransport):
+    """Serve the artifact files, honouring Range headers."""
+
+    async def request(self, method, url, headers=None, data=None):
+        prefix = f"{URL}/buildjobs/job1/artifacts/"
+        path = url[len(prefix):].replace("%2F", "/")
+        if not url.startswith(prefix) or path not in FILES:
+            return await super().request(method, url, headers, data)
+        self.requests.append((method, url, headers))
+        offset = int(headers["Range"][len("bytes="):-1])
+        return Response(206, FILES[path][offset:])
+
+
+def appveyor():
+    transport = RangeTransport({
+        f"{URL}/projects": [{"slug": "repo1", "accountName": "user"}],
+        f"{URL}/projects/user/repo1/branch/master":
+            {"build": {"jobs": [{"jobId": "job1"}]}},
+        f"{URL}/buildjobs/job1/artifacts":
+            [{"fileName": path, "size": len(content)}
+             for path, content in FILES.items()],
+    })
+    return AppVeyor(token="token", transport=transport), transport
+
+
+def download(ci, dest, pattern="*"):
+    return dict(asyncio.get_event_loop().run_until_complete(
+        download_artifacts(ci, "repo1", str(dest), pattern)))
+
+
+def downloads(transport):
+    return sorted((url.rsplit("/", 1)[-1], headers["Range"])
+                  for method, url, headers in transport.requests
+                  if "/artifacts/" in url)
+
+
+def test_download_artifacts(tmp_path, cache_dir):
+    """Test downloading the artifacts matching a pattern, and skipping them
+    once they are unchanged."""
+    ci, transport = appveyor()
+    assert download(ci, tmp_path, "dist/*") == {"dist/app.zip": DOWNLOADED,
+                                                "dist/notes.txt": DOWNLOADED}
+    assert (tmp_path / "dist" / "app.zip").read_bytes() == FILES["dist/app.zip"]
+    assert not (tmp_path / "logs").exists()
+    transport.requests.clear()
+    assert download(ci, tmp_path, "dist/*") == {"dist/app.zip": SKIPPED,
+                                                "dist/notes.txt": SKIPPED}
+    assert downloads(transport) == []
+    (tmp_path / "dist" / "notes.txt").write_bytes(b"NOTES")
+    assert download(ci, tmp_path, "dist/*")["dist/notes.txt"] == DOWNLOADED
+    assert (tmp_path / "dist" / "notes.txt").read_bytes() == b"notes"
+
+
+def test_download_artifacts_resume(tmp_path, cache_dir):
+    """Test that an interrupted download is resumed with a Range request."""
+    ci, transport = appveyor()
+    download(ci, tmp_path, "dist/app.zip")
+    target = tmp_path / "dist" / "app.zip"
+    os.replace(target, f"{target}.part")
+    with open(f"{target}.part", "r+b") as f:
+        f.truncate(100)
+    transport.requests.clear()
+    assert download(ci, tmp_path, "dist/app.zip") == {"dist/app.zip": RESUMED}
+    assert downloads(transport) == [("app.zip", "bytes=100-")]
+    assert target.read_bytes() == FILES["dist/app.zip"]
+    assert not os.path.exists(f"{target}.part")
+
+
+def test_download_artifacts_failure(tmp_path, cache_dir):
+    """Test that a failed download cancels the other ones, and removes their
+    partial files."""
+    ci, transport = appveyor()
+
+    async def get_range(url, offset, headers=None):
+        if url.endswith("app.zip"):
+            yield FILES["dist/app.zip"][:100]
+            await asyncio.sleep(10)
+        await asyncio.sleep(0.01)
+        raise HTTPError(500)
+
+    transport.get_range = get_range
+    with pytest.raises(ServiceError, match="HTTP 500"):
+        download(ci, tmp_path, "dist/*")
+    assert os.listdir(tmp_path / "dist") == ["notes.txt.part"]
+
+
+def test_download_artifacts_not_supported(tmp_path):
+    """Test that services without artifacts raise NotSupported."""
+    ci = DroneCI(token="token", transport=FakeTransport())
+    with pytest.raises(NotSupported):
+        download(ci, tmp_path)
@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 # Created by Roberto Preste
+import os
+import subprocess
+import sys
+import click
 import pytest
 from click.testing import CliRunner
 from quickci import cli
@@ -42,6 +46,16 @@ def test_cli_config_help():
     assert "Show this message and exit." in result.output
 
 
+def test_cli_config_update_codeship_pool(tmp_path, monkeypatch):
+    """Test that several Codeship credentials are rejected."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["config", "update", "codeship",
+                                      "user1:password", "user2:password"])
+    assert result.exit_code == 2
+    assert "cannot be pooled" in result.output
+
+
 def test_cli_config_show():
     """Test the config show command."""
     runner = CliRunner()
@@ -52,6 +66,7 @@ def test_cli_config_show():
     assert "CIRCLECI_TOKEN" in result.output
     assert "TRAVISCI_TOKEN" in result.output
     assert "DRONE_TOKEN" in result.output
+    assert "CODESHIP_TOKEN" in result.output
 
 
 def test_cli_status():
@@ -64,6 +79,7 @@ def test_cli_status():
     assert "AppVeyor" in result.output
     assert "Buddy" in result.output
     assert "Drone" in result.output
+    assert "Codeship" in result.output
 
 
 def test_cli_status_help():
@@ -76,6 +92,7 @@ def test_cli_status_help():
     assert "circle" in result.output
     assert "travis" in result.output
     assert "drone" in result.output
+    assert "codeship" in result.output
     assert "Show this message and exit." in result.output
 
 
@@ -117,3 +134,204 @@ def test_cli_status_drone():
     result = runner.invoke(cli.main, ["status", "drone"])
     assert result.exit_code == 0
     assert "Drone CI" in result.output
+
+
+def test_cli_status_codeship():
+    """Test the status codeship command."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["status", "codeship"])
+    assert result.exit_code == 0
+    assert "Codeship" in result.output
+
+
+def test_cli_status_old_config(tmp_path, monkeypatch):
+    """Test the status command and the fetch_status() API with a config
+    file created before the Codeship token was added."""
+    import asyncio
+    import json
+    from quickci import fetch_status
+    config_dir = tmp_path / ".config" / "quickci"
+    config_dir.mkdir(parents=True)
+    (config_dir / "tokens.json").write_text(json.dumps(
+        {"TRAVISCI_TOKEN": "replace_me", "CIRCLECI_TOKEN": "replace_me",
+         "APPVEYOR_TOKEN": "replace_me", "BUDDY_TOKEN": "replace_me",
+         "DRONE_TOKEN": "replace_me"}))
+    monkeypatch.setenv("HOME", str(tmp_path))
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["status"])
+    assert result.exit_code == 0
+    assert "Codeship" in result.output
+    results = asyncio.get_event_loop().run_until_complete(fetch_status())
+    assert results == []
+
+
+def test_cli_listen_help():
+    """Test the listen command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["listen", "--help"])
+    assert result.exit_code == 0
+    assert "--secret" in result.output
+    assert "Show this message and exit." in result.output
+
+
+def test_cli_dashboard_help():
+    """Test the dashboard command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["dashboard", "--help"])
+    assert result.exit_code == 0
+    assert "--interval" in result.output
+    assert "Show this message and exit." in result.output
+
+
+def test_cli_exporter_help():
+    """Test the exporter command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["exporter", "--help"])
+    assert result.exit_code == 0
+    assert "--interval" in result.output
+    assert "Show this message and exit." in result.output
+
+
+def test_cli_wait_help():
+    """Test the wait command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["wait", "--help"])
+    assert result.exit_code == 0
+    assert "--fail-fast" in result.output
+    assert "Show this message and exit." in result.output
+
+
+def test_cli_history_help():
+    """Test the history command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["history", "--help"])
+    assert result.exit_code == 0
+    assert "--since" in result.output
+    assert "Show this message and exit." in result.output
+
+
+def test_cli_logs_help():
+    """Test the logs command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["logs", "--help"])
+    assert result.exit_code == 0
+    assert "--follow" in result.output
+    assert "Show this message and exit." in result.output
+
+
+@pytest.mark.parametrize("service", ["circle", "drone"])
+def test_cli_logs_unsupported(service):
+    """Test that the logs command explains why a service has no logs, and
+    that the services raise NotSupported."""
+    import asyncio
+    from quickci.api import SERVICES
+    from quickci.classes import NotSupported
+    ci = SERVICES[service](token="token")
+    with pytest.raises(NotSupported):
+        asyncio.get_event_loop().run_until_complete(ci.ajob("repo1"))
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["logs", service, "repo1", "--token",
+                                      "token"])
+    assert result.exit_code == 1
+    assert f"Build logs are not available for {service}: the" \
+        in result.output
+
+
+def test_cli_artifacts_help():
+    """Test the artifacts command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["artifacts", "--help"])
+    assert result.exit_code == 0
+    assert "--pattern" in result.output
+    assert "Show this message and exit." in result.output
+
+
+def test_cli_status_completion(cache_dir):
+    """Test that --repo and --branch are completed from the local index."""
+    from quickci.classes import CompletionIndex
+    from quickci.commands.status import (complete_branch, complete_repo,
+                                         status)
+    index = CompletionIndex()
+    index.update("travis", "dev", ["user/repo1", "user/other"])
+    index.update("circle", "master", ["repo2"])
+    ctx = click.Context(status.commands["travis"], info_name="travis")
+    assert complete_repo(ctx, None, "user/r") == ["user/repo1"]
+    assert complete_branch(ctx, None, "") == ["dev"]
+    ctx = click.Context(status, info_name="status")
+    assert complete_repo(ctx, None, "") == ["repo2", "user/other",
+                                            "user/repo1"]
+    assert complete_branch(ctx, None, "") == ["master", "dev"]
+
+
+def test_cli_import_offline():
+    """Test that the CLI (and so shell completion) does not import HTTP
+    clients."""
+    code = ("import sys, quickci.cli; "
+            "print(sorted({'aiohttp', 'requests', 'httpx'} & set(sys.modules)))")
+    output = subprocess.check_output([sys.executable, "-c", code])
+    assert output.strip() == b"[]"
+
+
+def test_cli_completion_imports(tmp_path):
+    """Test that shell completion only imports the completion index, and
+    not the services."""
+    code = ("import atexit, sys; "
+            "atexit.register(lambda: print(sorted({'asyncio', "
+            "'quickci.api', 'quickci.classes', 'quickci.cache'} & "
+            "set(sys.modules)))); "
+            "sys.argv = ['quickci']; "
+            "from quickci.cli import main; main()")
+    env = dict(os.environ, HOME=str(tmp_path), COMP_CWORD="3",
+               _QUICKCI_COMPLETE="bash_complete",
+               COMP_WORDS="quickci status --repo ")
+    if int(click.__version__.split(".")[0]) < 8:
+        env.update(_QUICKCI_COMPLETE="complete")
+    output = subprocess.run([sys.executable, "-c", code], env=env,
+                            stdout=subprocess.PIPE).stdout
+    assert output.strip().splitlines()[-1] == b"['quickci.cache']"
+
+
+def test_cli_status_transports():
+    """Test that the --transport choices of status are the transports
+    available."""
+    from quickci.commands.status import TRANSPORTS
+    from quickci.transport import TRANSPORTS as AVAILABLE
+    assert sorted(TRANSPORTS) == sorted(AVAILABLE)
+
+
+def test_cli_restart_help():
+    """Test the restart command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["restart", "--help"])
+    assert result.exit_code == 0
+    assert "--dry-run" in result.output
+    assert "Show this message and exit." in result.output
+
+
+def test_cli_merge_help():
+    """Test the merge command help."""
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["merge", "--help"])
+    assert result.exit_code == 0
+    assert "--output" in result.output
+    assert "Show this message and exit." in result.output
+
+
+def test_cli_closes_decoder(tmp_path, monkeypatch):
+    """Test that the decoding processes are shut down when a command ends."""
+    from quickci.classes import _CIService
+
+    class Pool:
+        closed = False
+
+        def shutdown(self):
+            self.closed = True
+
+    pool = Pool()
+    monkeypatch.setattr(_CIService.decoder, "_pool", pool)
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["status", "drone", "--replay",
+                                      str(tmp_path)])
+    assert result.exit_code == 0
+    assert "No recording found." in result.output
+    assert pool.closed and _CIService.decoder._pool is None
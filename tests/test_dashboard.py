@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+from quickci.classes import BuildStatus, StatusError
+from quickci.dashboard import Dashboard
+
+
+def test_dashboard_changes():
+    """Test that only changed cells are redrawn."""
+    d = Dashboard(["master", "dev"])
+    d.update(BuildStatus("travis", "repo1", "master", "passed"))
+    d.update(BuildStatus("travis", "repo2", "master", "passed"))
+    first = d.changes(24, 80)
+    assert (2, 40, "passed".ljust(14), "green") in first
+    assert d.changes(24, 80) == []
+    assert d.update(BuildStatus("travis", "repo2", "master", "failed"))
+    assert not d.update(BuildStatus("travis", "repo1", "master", "passed"))
+    changes = [change for change in d.changes(24, 80) if change[0] != 0]
+    assert changes == [(3, 40, "failed".ljust(14), "red")]
+
+
+def test_dashboard_filter():
+    """Test that filtering blanks the rows which are no longer shown."""
+    d = Dashboard(["master"])
+    d.update(BuildStatus("travis", "repo1", "master", "passed"))
+    d.update(BuildStatus("circle", "repo2", "master", "success"))
+    d.changes(24, 80)
+    d.filter = "repo1"
+    assert d.rows() == [("travis", "repo1", "")]
+    changes = {(y, x): text for y, x, text, _ in d.changes(24, 80)}
+    assert changes[(2, 0)].startswith("travis/repo1")
+    assert changes[(3, 0)].strip() == ""
+    assert changes[(3, 40)].strip() == ""
+
+
+def test_dashboard_errors():
+    """Test that errors are shown until the next status of the service."""
+    d = Dashboard(["master"])
+    d.update(BuildStatus("travis", "repo1", "master", "passed"))
+    d.update(StatusError("travis", "repo2", "master", "timeout"))
+    d.update(StatusError("circle", None, "master", "invalid response"))
+    assert d.rows() == [("circle", "*", ""), ("travis", "repo1", ""),
+                        ("travis", "repo2", "")]
+    assert (2, 40, "error".ljust(14), "red") in d.changes(24, 80)
+    d.update(BuildStatus("circle", "repo3", "master", "success"))
+    assert d.rows() == [("circle", "repo3", ""), ("travis", "repo1", ""),
+                        ("travis", "repo2", "")]
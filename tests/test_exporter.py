@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import time
+from quickci.exporter import Exporter, Histogram, LoopMonitor
+from quickci.transport import FakeTransport
+
+
+def test_histogram():
+    """Test that histogram buckets are cumulative."""
+    h = Histogram([1, 5])
+    h.observe(0.5)
+    h.observe(3)
+    h.observe(10)
+    lines = h.lines("latency", service="travis")
+    assert lines == ['latency_bucket{service="travis",le="1"} 1',
+                     'latency_bucket{service="travis",le="5"} 2',
+                     'latency_bucket{service="travis",le="+Inf"} 3',
+                     'latency_sum{service="travis"} 13.5',
+                     'latency_count{service="travis"} 3']
+
+
+def test_exporter_refresh(cache_dir):
+    """Test that metrics are rendered from the last refresh, and that a
+    failed refresh keeps the previous status."""
+    url = "https://circleci.com/api/v1.1/projects?"
+    transport = FakeTransport({url: [
+        {"reponame": "repo1", "branches": {
+            "master": {"latest_workflows": {"workflow": {"status": "success"}}}}}]})
+    exporter = Exporter(services=["circle"], tokens={"circle": "token"},
+                        transport=transport)
+    assert "quickci_build_status{" not in exporter.metrics
+    asyncio.get_event_loop().run_until_complete(exporter.refresh())
+    status = ('quickci_build_status{service="circle",repo="repo1",'
+              'branch="master",pipeline="",status="success"} 1')
+    assert status in exporter.metrics
+    assert 'quickci_last_success_timestamp_seconds{service="circle",' \
+           'repo="repo1",branch="master",pipeline=""}' in exporter.metrics
+    assert 'quickci_api_errors_total{service="circle"} 0' in exporter.metrics
+
+    transport.routes[url] = None  # not a list of projects
+    asyncio.get_event_loop().run_until_complete(exporter.refresh())
+    assert status in exporter.metrics
+    assert 'quickci_api_errors_total{service="circle"} 1' in exporter.metrics
+    assert 'quickci_fetch_duration_seconds_count{service="circle"} 2' \
+        in exporter.metrics
+
+
+def test_loop_monitor():
+    """Test that blocking the event loop is measured as lag."""
+    monitor = LoopMonitor(interval=0.01)
+
+    async def busy():
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)  # blocks the loop
+        await asyncio.sleep(0.02)
+        return "done"
+
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(monitor.watch(busy())) == "done"
+    assert monitor.max >= 0.09
+    assert monitor.lag.count >= 2
+    assert "quickci_event_loop_lag_seconds_count" in Exporter(
+        services=["travis"], tokens={}).render()
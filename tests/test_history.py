@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import pytest
+from quickci.classes import Build, Buddy, StatusError, timestamp
+from quickci.history import fetch_history, parse_age, summarise
+from quickci.transport import FakeTransport, Response
+
+
+def test_parse_age():
+    """Test the conversion of ages to seconds."""
+    assert parse_age("30d") == 30 * 86400
+    assert parse_age("90m") == 5400
+    with pytest.raises(ValueError):
+        parse_age("30")
+
+
+def test_timestamp():
+    """Test the conversion of the times returned by CI services."""
+    assert timestamp("2020-01-02T03:04:05Z") == 1577934245
+    assert timestamp("2020-01-02T03:04:05.250Z") == 1577934245.25
+    assert timestamp("2020-01-02T05:04:05+02:00") == 1577934245
+    assert timestamp("2020-01-01T22:04:05-0500") == 1577934245
+    assert timestamp(1577934245) == 1577934245
+    assert timestamp(None) is None
+    assert timestamp("yesterday") is None
+
+
+def test_fetch_history_drone(cache_dir):
+    """Test that builds are requested page by page, until the first build
+    older than the given time."""
+    url = "https://cloud.drone.io/api"
+
+    def build(number, source, status):
+        return {"number": number, "source": source, "status": status,
+                "created": number * 100, "started": number * 100 + 10,
+                "finished": number * 100 + 70}
+
+    transport = FakeTransport({
+        f"{url}/user/repos": [{"name": "repo1", "slug": "user/repo1",
+                               "counter": 5, "active": True}],
+        f"{url}/repos/user/repo1/builds?page=1": [
+            build(5, "master", "success"), build(4, "dev", "failure")],
+        f"{url}/repos/user/repo1/builds?page=2": [
+            build(3, "master", "failure"), build(2, "master", "success")],
+    })
+    builds = asyncio.get_event_loop().run_until_complete(fetch_history(
+        250, services=["drone"], tokens={"drone": "token"},
+        transport=transport))
+    assert [(b.status, b.created, b.started, b.finished) for b in builds] == [
+        ("success", 500, 510, 570), ("failure", 300, 310, 370)]
+    assert len(transport.requests) == 3
+
+
+def test_fetch_history_errors(cache_dir):
+    """Test that a failing service does not hide the builds of the other
+    services."""
+    url = "https://cloud.drone.io/api"
+    transport = FakeTransport({
+        f"{url}/user/repos": [{"name": "repo1", "slug": "user/repo1",
+                               "counter": 1, "active": True}],
+        f"{url}/repos/user/repo1/builds?page=1": [
+            {"number": 1, "source": "master", "status": "failure",
+             "created": 300, "started": 310, "finished": 370}],
+        f"{url}/repos/user/repo1/builds?page=2": [],
+        "https://api.travis-ci.com/user": Response(500, b""),
+    })
+    results = asyncio.get_event_loop().run_until_complete(fetch_history(
+        250, services=["drone", "travis"],
+        tokens={"drone": "token", "travis": "token"}, transport=transport))
+    assert results == [
+        Build("drone", "repo1", "master", "failure", 300, 310, 370),
+        StatusError("travis", None, "master", "HTTP 500")]
+
+
+def test_fetch_history_buddy_bounded(cache_dir, monkeypatch):
+    """Test that the executions of at most WORKERS pipelines are requested
+    at the same time."""
+    url = "https://api.buddy.works/workspaces/ws"
+    pipelines = [{"name": f"pipe{i}", "url": f"{url}/pipelines/{i}"}
+                 for i in range(6)]
+    routes = {"https://api.buddy.works/workspaces": {"workspaces": [
+        {"url": url}]},
+        f"{url}/projects": {"projects": [{"name": "repo1",
+                                          "url": f"{url}/projects/repo1"}]},
+        f"{url}/projects/repo1/pipelines": {"pipelines": pipelines}}
+    for pipe in pipelines:
+        routes[f"{pipe['url']}/executions?page=1&per_page=100"] = {
+            "executions": []}
+    running = {"now": 0, "max": 0}
+
+    class SlowTransport(FakeTransport):
+        async def request(self, method, url, headers=None, data=None):
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            return await super().request(method, url, headers, data)
+
+    monkeypatch.setattr(Buddy, "WORKERS", 2)
+    buddy = Buddy(token="token", transport=SlowTransport(routes))
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(buddy.ahistory(0)) == []
+    assert len(buddy._transport.requests) == 9
+    assert running["max"] == 2
+
+
+def test_summarise():
+    """Test pass rate, flip rate and percentiles of each repo."""
+    pytest.importorskip("numpy")
+
+    def build(repo, status, created, queue=5, duration=60):
+        return Build("travis", repo, "master", status, created,
+                     created + queue, created + queue + duration)
+
+    builds = [build("repo1", "passed", 100, duration=60),
+              build("repo1", "failed", 200, duration=120),
+              build("repo1", "passed", 300, duration=180),
+              build("repo1", "canceled", 400),
+              build("repo1", "passed", 500, duration=240),
+              build("repo2", "failed", 100, queue=10),
+              Build("travis", "repo2", "master", "failed", None, None, None)]
+    stats = summarise(reversed(builds))
+    assert stats == [
+        {"service": "travis", "repo": "repo1", "branch": "master",
+         "pipeline": None, "builds": 4, "pass_rate": 0.75, "flip_rate": 0.25,
+         "duration_p50": 150.0, "duration_p95": 231.0,
+         "queue_p50": 5.0, "queue_p95": 5.0},
+        {"service": "travis", "repo": "repo2", "branch": "master",
+         "pipeline": None, "builds": 2, "pass_rate": 0.0, "flip_rate": 0.0,
+         "duration_p50": 60.0, "duration_p95": 60.0,
+         "queue_p50": 10.0, "queue_p95": 10.0}]
+
+
+def test_summarise_failure_statuses():
+    """Test that the failure statuses of every service are counted."""
+    pytest.importorskip("numpy")
+    builds = [Build("drone", "repo1", "master", status, 100 * i, None, None)
+              for i, status in enumerate(["success", "failure", "killed"])]
+    builds.append(Build("circle", "repo1", "master", "infrastructure_fail",
+                        100, None, None))
+    stats = summarise(builds)
+    assert [(row["service"], row["builds"], row["pass_rate"])
+            for row in stats] == [("circle", 1, 0.0), ("drone", 3, 0.333)]
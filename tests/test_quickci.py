@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 # Created by Roberto Preste
+import asyncio
+import time
 import pytest
-from quickci.classes import Config
-from quickci.classes import TravisCI, CircleCI, AppVeyor, Buddy, DroneCI
+from quickci.classes import (BuildStatus, Config, Cache, CompletionIndex,
+                             ServiceError)
+from quickci.classes import TravisCI, CircleCI, AppVeyor, Buddy, DroneCI, Codeship
+from quickci.transport import Decoder, FakeTransport, Response
 
 
 def test_config_temporary():
@@ -15,7 +19,7 @@ def test_config_temporary():
         assert config.temporary
         expect = {"TRAVISCI_TOKEN": "replace_me", "CIRCLECI_TOKEN": "replace_me",
                   "APPVEYOR_TOKEN": "replace_me", "BUDDY_TOKEN": "replace_me",
-                  "DRONE_TOKEN": "replace_me"}
+                  "DRONE_TOKEN": "replace_me", "CODESHIP_TOKEN": "replace_me"}
         result = config.content
         assert result == expect
 
@@ -73,3 +77,627 @@ def test_status_drone(capsys):
     d.status()
     result = capsys.readouterr()
     assert result.out.strip() == expect
+
+
+def test_status_codeship(capsys):
+    """Test the Codeship.status() function with temporary token."""
+    c = Codeship()
+    expect = ("Please replace the default token with a valid one using "
+              "`quickci config update`, or provide one directly "
+              "using `--token`.")
+    c.status()
+    result = capsys.readouterr()
+    assert result.out.strip() == expect
+
+
+def test_cache_save(cache_dir):
+    """Test that the Cache class persists its content."""
+    cache = Cache("test")
+    assert cache.content == {}
+    cache.content["key"] = "value"
+    cache.save()
+    assert Cache("test").content == {"key": "value"}
+
+
+def test_codeship_cached_token(cache_dir, monkeypatch):
+    """Test that Codeship reuses a valid cached token."""
+    c = Codeship(token="user:password")
+    c._cache.content[c.token_key] = {"access_token": "cached",
+                                     "expires_at": time.time() + 3600,
+                                     "organizations": []}
+
+    async def fail():
+        raise AssertionError("should not authenticate")
+
+    monkeypatch.setattr(c, "aauthenticate", fail)
+    asyncio.get_event_loop().run_until_complete(c.alogin())
+    assert c._renewal is None
+    assert c.headers["Authorization"] == "Bearer cached"
+
+
+def test_codeship_renew_token(cache_dir, monkeypatch):
+    """Test that Codeship renews a token about to expire in background."""
+    c = Codeship(token="user:password")
+    c._cache.content[c.token_key] = {"access_token": "cached",
+                                     "expires_at": time.time() + 300,
+                                     "organizations": []}
+    calls = []
+
+    async def renew():
+        calls.append(True)
+
+    monkeypatch.setattr(c, "aauthenticate", renew)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(c.alogin())
+    assert c._renewal is not None
+    assert c.headers["Authorization"] == "Bearer cached"
+    loop.run_until_complete(c._renewal)
+    assert calls == [True]
+
+
+def test_codeship_rejected_login(capsys, cache_dir):
+    """Test that rejected Codeship credentials are reported, and no token is
+    cached."""
+    transport = FakeTransport({
+        "https://api.codeship.com/v2/auth": Response(
+            401, b'{"errors": ["Unauthorized"]}')})
+    c = Codeship(token="user:wrong", transport=transport)
+    c.status()
+    result = capsys.readouterr()
+    assert result.out.strip() == \
+        "Service error: authentication failed (HTTP 401)."
+    assert c.token_key not in Cache("codeship").content
+    assert [method for method, url, headers in transport.requests] == \
+        ["POST"]
+
+
+def test_codeship_credentials_pool():
+    """Test that a list of Codeship credentials is rejected."""
+    with pytest.raises(ValueError, match="cannot be pooled"):
+        Codeship(token=["user1:password", "user2:password"])
+
+
+def test_status_travis_fake_transport(capsys, cache_dir):
+    """Test the Travis.status() function using a fake transport."""
+    url = "https://api.travis-ci.com"
+    transport = FakeTransport({
+        f"{url}/user": {"login": "user"},
+        f"{url}/owner/user/repos?repository.active=true"
+        f"&include=repository.default_branch,branch.last_build,build.commit"
+        f"&limit=100":
+            {"repositories": [
+                {"name": "repo1", "id": 1,
+                 "default_branch": {"name": "master",
+                                    "last_build": {"state": "passed"}}},
+                {"name": "repo2", "id": 2,
+                 "default_branch": {"name": "master", "last_build": None}},
+                {"name": "repo3", "id": 3,
+                 "default_branch": {"name": "main",
+                                    "last_build": {"state": "passed"}}}],
+             "@pagination": {"next": {"@href": "/owner/user/repos?page=2"}}},
+        f"{url}/owner/user/repos?page=2":
+            {"repositories": [
+                {"name": "repo4", "id": 4,
+                 "default_branch": {"name": "master",
+                                    "last_build": {"state": "started"}}}],
+             "@pagination": {"next": None}},
+        f"{url}/repo/3/branch/master?include=build.commit":
+            {"last_build": {"state": "failed"}},
+    })
+    t = TravisCI(token="token", transport=transport)
+    t.status()
+    result = capsys.readouterr()
+    assert sorted(result.out.split("\n")) == ["", "\trepo1 -> passed",
+                                              "\trepo3 -> failed",
+                                              "\trepo4 -> started"]
+    assert len(transport.requests) == 4
+    assert transport.requests[0][2]["Authorization"] == "token token"
+
+
+def test_fake_transport_not_found():
+    """Test that the fake transport returns 404 for unknown urls."""
+    transport = FakeTransport({"http://known": Response(500, b"{}")})
+    loop = asyncio.get_event_loop()
+    response = loop.run_until_complete(transport.get("http://unknown"))
+    assert response.status == 404
+    response = loop.run_until_complete(transport.get("http://known"))
+    assert response.status == 500
+
+
+def test_status_travis_repo_slug(capsys, cache_dir):
+    """Test that Travis.status() requests a repo slug directly."""
+    url = "https://api.travis-ci.com"
+    transport = FakeTransport({
+        f"{url}/repo/user%2Frepo1/branch/master?include=build.commit":
+            {"last_build": {"state": "failed"}},
+    })
+    t = TravisCI(token="token", repo="user/repo1", transport=transport)
+    t.status()
+    result = capsys.readouterr()
+    assert result.out.strip() == "repo1 -> failed"
+    assert len(transport.requests) == 1
+
+
+def test_status_appveyor_repo_cached_account(capsys, cache_dir):
+    """Test that AppVeyor.status() reuses the cached account name."""
+    url = "https://ci.appveyor.com/api"
+    transport = FakeTransport({
+        f"{url}/projects": [{"slug": "repo1", "accountName": "user"},
+                            {"slug": "repo2", "accountName": "user"}],
+        f"{url}/projects/user/repo2/branch/master":
+            {"build": {"status": "success"}},
+    })
+    a = AppVeyor(token="token", repo="repo2", transport=transport)
+    a.status()
+    assert len(transport.requests) == 2
+    transport.requests.clear()
+    a = AppVeyor(token="token", repo="repo2", transport=transport)
+    a.status()
+    assert len(transport.requests) == 1
+    result = capsys.readouterr()
+    assert result.out.split() == ["repo2", "->", "success"] * 2
+
+
+def test_status_drone_repo(capsys, cache_dir):
+    """Test that Drone.status() finds a repo by name."""
+    url = "https://cloud.drone.io/api"
+    transport = FakeTransport({
+        f"{url}/user": {"login": "user"},
+        f"{url}/repos/user/repo1": {"name": "repo1", "slug": "user/repo1",
+                                    "counter": 2},
+        f"{url}/repos/user/repo1/builds/2": {"source": "dev",
+                                             "status": "failure"},
+        f"{url}/repos/user/repo1/builds/1": {"source": "master",
+                                             "status": "success"},
+    })
+    d = DroneCI(token="token", repo="repo1", transport=transport)
+    d.status()
+    result = capsys.readouterr()
+    assert result.out.strip() == "repo1 -> success"
+
+
+def test_fetch_status(cache_dir):
+    """Test the async fetch_status() API inside a running event loop."""
+    from quickci import fetch_status, BuildStatus
+    url = "https://circleci.com/api/v1.1/projects?"
+    transport = FakeTransport({url: [
+        {"reponame": "repo1", "branches": {
+            "master": {"latest_workflows": {"workflow": {"status": "success"}}},
+            "dev": {"latest_workflows": {"workflow": {"status": "failed"}}}}},
+        {"reponame": "repo2", "branches": {}}]})
+
+    coalesced = CircleCI.flight.coalesced
+
+    async def main():
+        return await fetch_status(["circle", "travis"],
+                                  branches=["master", "dev"],
+                                  tokens={"circle": "token",
+                                          "travis": "replace_me"},
+                                  transport=transport)
+
+    results = asyncio.get_event_loop().run_until_complete(main())
+    assert sorted(results) == [BuildStatus("circle", "repo1", "dev", "failed"),
+                               BuildStatus("circle", "repo1", "master",
+                                           "success")]
+    # both branches share a single request for the projects listing
+    assert len(transport.requests) == 1
+    assert CircleCI.flight.coalesced == coalesced + 1
+
+
+def test_fetch_status_errors(cache_dir):
+    """Test that an error only affects the service which raised it, and is
+    returned along with the other results."""
+    from quickci import fetch_status, BuildStatus, StatusError
+    url = "https://circleci.com/api/v1.1/projects?"
+    transport = FakeTransport({
+        url: [{"reponame": "repo1", "branches": {"master": {
+            "latest_workflows": {"workflow": {"status": "success"}}}}}],
+        "https://api.travis-ci.com/user": Response(500, b"")})
+
+    results = asyncio.get_event_loop().run_until_complete(fetch_status(
+        ["travis", "circle"], tokens={"circle": "token", "travis": "token"},
+        transport=transport))
+    assert BuildStatus("circle", "repo1", "master", "success") in results
+    errors = [result for result in results
+              if isinstance(result, StatusError)]
+    assert [(error.service, error.repo, error.branch) for error in errors] \
+        == [("travis", None, "master")]
+
+
+def test_status_appveyor_embedded_builds(capsys, cache_dir):
+    """Test that AppVeyor.status() uses builds included in the listing."""
+    url = "https://ci.appveyor.com/api"
+    transport = FakeTransport({
+        f"{url}/projects": [
+            {"slug": "repo1", "accountName": "user",
+             "builds": [{"branch": "master", "status": "success"}]},
+            {"slug": "repo2", "accountName": "user",
+             "builds": [{"branch": "dev", "status": "failed"}]}],
+        f"{url}/projects/user/repo2/branch/master":
+            {"build": {"status": "running"}},
+    })
+    a = AppVeyor(token="token", transport=transport)
+    a.status()
+    result = capsys.readouterr()
+    assert sorted(result.out.split("\n")) == ["", "\trepo1 -> success",
+                                              "\trepo2 -> running"]
+    assert len(transport.requests) == 2
+
+
+def test_token_pool(cache_dir):
+    """Test that the TokenPool spreads requests and removes bad tokens."""
+    from quickci.classes import TokenPool
+    pool = TokenPool(["token1", "token2", "token3"])
+    assert [pool.acquire() for _ in range(3)] == ["token1", "token2", "token3"]
+    assert pool.throttle("token2", 429)
+    assert [pool.acquire() for _ in range(2)] == ["token1", "token3"]
+    assert pool.throttle("token1", 401)
+    assert not pool.throttle("token3", 429)
+    assert pool.report() == ["Token ...ken1: 2 requests (rejected)",
+                             "Token ...ken2: 1 requests (throttled)",
+                             "Token ...ken3: 2 requests (throttled)"]
+    pool = TokenPool(["token1", "token2", "token3"])  # new run
+    assert [pool.acquire() for _ in range(3)] == ["token2", "token1", "token3"]
+
+
+def test_status_token_pool(capsys, cache_dir):
+    """Test that throttled requests are retried with another token."""
+    url = "https://circleci.com/api/v1.1/projects?"
+
+    class Transport(FakeTransport):
+        async def request(self, method, url, headers=None, data=None):
+            if headers["circle-token"] == "token1":
+                self.requests.append((method, url, headers))
+                return Response(429, b"{}")
+            return await super().request(method, url, headers, data)
+
+    transport = Transport({url: [{"reponame": "repo1", "branches": {
+        "master": {"latest_workflows": {"workflow": {"status": "success"}}}}}]})
+    c = CircleCI(token=["token1", "token2"], transport=transport)
+    c.status()
+    result = capsys.readouterr()
+    assert result.out.split("\n") == ["\trepo1 -> success",
+                                      "\tToken ...ken1: 1 requests (throttled)",
+                                      "\tToken ...ken2: 1 requests", ""]
+
+
+def test_record_replay(tmp_path, capsys, cache_dir):
+    """Test that recorded requests are redacted and replayed offline."""
+    from quickci.transport import RecordingTransport, ReplayTransport
+    url = "https://circleci.com/api/v1.1/projects?"
+    cassette = str(tmp_path / "circle.json")
+    transport = RecordingTransport(FakeTransport({url: [
+        {"reponame": "repo1", "owner": "secret-token", "branches": {
+            "master": {"latest_workflows": {"workflow": {"status": "success"}}}}}]}),
+        cassette)
+    c = CircleCI(token="secret-token", transport=transport)
+    c.status()
+    c.run(transport.close())
+    with open(cassette) as f:
+        content = f.read()
+    assert "secret-token" not in content
+    assert "REDACTED" in content
+
+    c = CircleCI(token="other", transport=ReplayTransport(cassette,
+                                                          latency=False))
+    c.status()
+    result = capsys.readouterr()
+    assert result.out.split("\n") == ["\trepo1 -> success"] * 2 + [""]
+
+
+def test_record_login_token(tmp_path, cache_dir):
+    """Test that access tokens returned by a login request are redacted
+    from every recorded request and response."""
+    from quickci.transport import RecordingTransport
+    url = "https://api.codeship.com/v2"
+    cassette = str(tmp_path / "codeship.json")
+    transport = RecordingTransport(FakeTransport({
+        f"{url}/auth": {"access_token": "login-token",
+                        "expires_at": time.time() + 3600,
+                        "organizations": [{"uuid": "org1"}]},
+        f"{url}/organizations/org1/projects": {"projects": []},
+    }), cassette)
+    c = Codeship(token="user:password", transport=transport)
+    c.status()
+    c.run(transport.close())
+    with open(cassette) as f:
+        content = f.read()
+    assert "/organizations/org1/projects" in content
+    assert "login-token" not in content
+    assert 'access_token\\": \\"REDACTED' in content
+
+
+def test_status_priority(capsys, cache_dir, monkeypatch):
+    """Test that pinned and previously failing repos are shown first, and
+    that low-priority repos are skipped when the budget is exhausted."""
+    from quickci.classes import StatusHistory
+    monkeypatch.setattr(Config, "pinned",
+                        lambda self, service: ["repo3"])
+    StatusHistory().update("circle", "master",
+                           [BuildStatus("circle", "repo2", "master", "failed")])
+
+    class SlowCircleCI(CircleCI):
+        async def astatus(self, proj):
+            if proj["reponame"] == "repo1":
+                await asyncio.sleep(1)
+            elif proj["reponame"] == "repo2":
+                await asyncio.sleep(0.05)
+            return [self.result(proj["reponame"], "success")]
+
+    c = SlowCircleCI(transport=FakeTransport(), budget=0.2)
+    monkeypatch.setattr(c, "aprojects", lambda: asyncio.sleep(0, [
+        {"reponame": "repo1"}, {"reponame": "repo2"}, {"reponame": "repo3"}]))
+    monkeypatch.setattr(c, "_token", "token")
+    c.status()
+    result = capsys.readouterr()
+    assert result.out.split("\n") == [
+        "\trepo3 -> success", "\trepo2 -> success",
+        "\tSkipped 1 low-priority repos (time budget exhausted).", ""]
+
+
+def test_status_travis_pipelined(cache_dir):
+    """Test that the status of the first page of repos is available before
+    the following pages are received."""
+    url = "https://api.travis-ci.com"
+    page2 = f"{url}/owner/user/repos?page=2"
+    release = asyncio.Event()
+
+    class SlowTransport(FakeTransport):
+        async def request(self, method, url, headers=None, data=None):
+            if url == page2:
+                await release.wait()
+            return await super().request(method, url, headers, data)
+
+    def repo(name):
+        return {"name": name, "id": name,
+                "default_branch": {"name": "master",
+                                   "last_build": {"state": "passed"}}}
+
+    transport = SlowTransport({
+        f"{url}/user": {"login": "user"},
+        f"{url}/owner/user/repos?repository.active=true"
+        f"&include=repository.default_branch,branch.last_build,build.commit"
+        f"&limit=100":
+            {"repositories": [repo("repo1")],
+             "@pagination": {"next": {"@href": "/owner/user/repos?page=2"}}},
+        page2: {"repositories": [repo("repo2")], "@pagination": {}},
+    })
+
+    async def main():
+        results = TravisCI(token="token", transport=transport).astatuses()
+        first = await asyncio.wait_for(results.__anext__(), 1)
+        release.set()
+        return [first] + [result async for result in results]
+
+    results = asyncio.get_event_loop().run_until_complete(main())
+    assert [result.repo for result in results] == ["repo1", "repo2"]
+
+
+def test_status_failure_isolation(capsys, cache_dir):
+    """Test that a repo returning an invalid response does not prevent the
+    status of the other repos from being shown."""
+    url = "https://ci.appveyor.com/api"
+    transport = FakeTransport({
+        f"{url}/projects": [{"slug": "repo1", "accountName": "user"},
+                            {"slug": "repo2", "accountName": "user"}],
+        f"{url}/projects/user/repo1/branch/master":
+            Response(200, b"<html>Bad gateway</html>"),
+        f"{url}/projects/user/repo2/branch/master":
+            {"build": {"status": "unknown_state"}},
+    })
+    AppVeyor(token="token", transport=transport).status()
+    result = capsys.readouterr()
+    assert result.out.split("\n") == [
+        "\trepo2 -> unknown_state",
+        "\trepo1 -> request failed (invalid response)", ""]
+
+
+def test_completion_index(cache_dir):
+    """Test that status runs store the repos found and the branches checked,
+    keeping repos from partial runs."""
+    url = "https://ci.appveyor.com/api"
+    transport = FakeTransport({
+        f"{url}/projects": [{"slug": "repo1", "accountName": "user"},
+                            {"slug": "repo2", "accountName": "user"}],
+        f"{url}/projects/user/repo1/branch/master":
+            Response(200, b"<html>Bad gateway</html>"),
+        f"{url}/projects/user/repo2/branch/master":
+            {"build": {"status": "success"}},
+    })
+    asyncio.get_event_loop().run_until_complete(
+        AppVeyor(token="token", transport=transport).afetch())
+    index = CompletionIndex()
+    index.update("travis", "dev", ["user/repo3"])
+    index.update("travis", "feature", ["user/repo4"])
+    index = CompletionIndex()
+    assert index.repos(["appveyor"]) == ["repo1", "repo2"]
+    assert index.repos(["appveyor", "travis"]) == ["repo1", "repo2",
+                                                   "user/repo3", "user/repo4"]
+    assert index.branches(["appveyor", "travis"]) == ["feature", "dev",
+                                                      "master"]
+    index.update("travis", "dev", ["user/repo3"], complete=True)
+    assert index.repos(["travis"]) == ["user/repo3"]
+
+
+def test_shared_cache_files(cache_dir):
+    """Test that breakers and token pools sharing a cache file keep the
+    entries written by each other."""
+    from quickci.classes import CircuitBreaker, TokenPool
+    travis, circle = CircuitBreaker("travis"), CircuitBreaker("circle")
+    travis.failure()
+    circle.failure()
+    CircuitBreaker("travis").failure()
+    assert CircuitBreaker("travis").state["failures"] == 2
+    assert CircuitBreaker("circle").state["failures"] == 1
+    circle.success()
+    assert CircuitBreaker("travis").state["failures"] == 2
+    first, second = TokenPool(["token1"]), TokenPool(["token2"])
+    first.throttle("token1", 429)
+    second.throttle("token2", 429)
+    assert set(Cache("tokens").content) == {TokenPool.key("token1"),
+                                            TokenPool.key("token2")}
+
+
+def test_status_circuit_breaker(capsys, cache_dir, monkeypatch):
+    """Test that the circuit breaker opens after consecutive failures, and
+    closes after a successful request once the cooldown is over."""
+    from quickci.classes import CircuitBreaker
+    monkeypatch.setattr(CircuitBreaker, "THRESHOLD", 2)
+    url = "https://circleci.com/api/v1.1/projects?"
+    transport = FakeTransport({url: Response(503, b"")})
+    for _ in range(3):
+        CircleCI(token="token", transport=transport).status()
+    result = capsys.readouterr()
+    lines = result.out.split("\n")
+    assert lines[:2] == ["\tService error: HTTP 503."] * 2
+    assert lines[2].startswith("\tService unavailable after 2 consecutive "
+                               "failures, skipped")
+    assert len(transport.requests) == 2
+
+    monkeypatch.setattr(CircuitBreaker, "COOLDOWN", 0)
+    transport.routes[url] = [{"reponame": "repo1", "branches": {
+        "master": {"latest_workflows": {"workflow": {"status": "success"}}}}}]
+    CircleCI(token="token", transport=transport).status()
+    assert not CircuitBreaker("circle").is_open()
+    assert CircuitBreaker("circle").state["failures"] == 0
+    assert capsys.readouterr().out == "\trepo1 -> success\n"
+
+
+def test_request_cancelled(cache_dir):
+    """Test that cancelled requests (e.g. when the time budget is exhausted)
+    are not counted as failures by the circuit breaker."""
+    from quickci.classes import CircuitBreaker
+
+    # before Python 3.8, CancelledError is a subclass of Exception
+    class Cancelled(asyncio.CancelledError, Exception):
+        pass
+
+    class CancelledTransport(FakeTransport):
+        async def request(self, method, url, headers=None, data=None):
+            raise Cancelled()
+
+    c = CircleCI(token="token", transport=CancelledTransport())
+    with pytest.raises(Cancelled):
+        asyncio.get_event_loop().run_until_complete(
+            c._request("https://circleci.com/api/v1.1/projects?", {}))
+    assert CircuitBreaker("circle").state["failures"] == 0
+
+
+def test_log_follow(cache_dir):
+    """Test that following a log only requests the new bytes, and skips the
+    old ones if the server ignores the Range header."""
+    url = "https://api.travis-ci.com"
+    log = f"{url}/job/7/log.txt"
+    polls = [Response(206, b"line1\n"), Response(200, b"line1\nline2\n"),
+             Response(416, b""), Response(206, b"line3\n")]
+    states = iter(["started", "started", "started", "passed"])
+
+    class LogTransport(FakeTransport):
+        async def request(self, method, url, headers=None, data=None):
+            if url == log:
+                self.requests.append((method, url, headers))
+                return polls.pop(0)
+            return await super().request(method, url, headers, data)
+
+    transport = LogTransport({
+        f"{url}/repo/user%2Frepo1/branch/master?include=build.jobs":
+            {"last_build": {"jobs": [{"id": 7}]}},
+    })
+    t = TravisCI(token="token", transport=transport)
+
+    async def running(repo, job):
+        return next(states) == "started"
+
+    async def main():
+        t.ajob_running = running
+        return [chunk async for chunk in t.alog("user/repo1", follow=True,
+                                                interval=0)]
+
+    chunks = asyncio.get_event_loop().run_until_complete(main())
+    assert b"".join(chunks) == b"line1\nline2\nline3\n"
+    assert [headers["Range"] for method, url, headers in transport.requests
+            if url == log] == ["bytes=0-", "bytes=6-", "bytes=12-",
+                               "bytes=12-"]
+
+
+def test_decoder_offload(cache_dir):
+    """Test that large bodies are decoded in the process pool, and invalid
+    ones are still reported as invalid responses."""
+    url = "https://ci.appveyor.com/api"
+    decoder = Decoder(threshold=100)
+    projects = [{"slug": f"repo{i}", "accountName": "user"} for i in range(20)]
+    transport = FakeTransport({
+        f"{url}/projects": projects,
+        f"{url}/projects/user/repo1/branch/master":
+            Response(200, b"<html>" + b" " * 200 + b"</html>"),
+    })
+    a = AppVeyor(token="token", transport=transport)
+    a.decoder = decoder
+    try:
+        assert a.run(a.aprojects()) == projects
+        assert decoder.offloaded == 1
+        with pytest.raises(ServiceError, match="invalid response"):
+            a.run(a.aget(f"{url}/projects/user/repo1/branch/master"))
+        assert decoder.offloaded == 2
+    finally:
+        decoder.close()
+
+
+def test_status_details(capsys, cache_dir):
+    """Test that jobs are only requested for failed and running builds, and
+    only once for finished builds."""
+    url = "https://api.travis-ci.com"
+
+    def repo(name, state, build_id):
+        return {"name": name, "id": name,
+                "default_branch": {"name": "master", "last_build": {
+                    "id": build_id, "state": state}}}
+
+    transport = FakeTransport({
+        f"{url}/user": {"login": "user"},
+        f"{url}/owner/user/repos?repository.active=true"
+        f"&include=repository.default_branch,branch.last_build,build.commit"
+        f"&limit=100":
+            {"repositories": [repo("repo1", "failed", 1),
+                              repo("repo2", "passed", 2),
+                              repo("repo3", "started", 3)],
+             "@pagination": {}},
+        f"{url}/build/1/jobs?include=job.stage": {"jobs": [
+            {"number": "1.1", "state": "passed", "stage": {"name": "Test"}},
+            {"number": "1.2", "state": "failed", "stage": {"name": "Test"}}]},
+        f"{url}/build/3/jobs?include=job.stage": {"jobs": [
+            {"number": "3.1", "state": "started"}]},
+    })
+    for _ in range(2):
+        TravisCI(token="token", transport=transport, details=True).status()
+    jobs = [url for method, url, headers in transport.requests
+            if "/jobs" in url]
+    assert sorted(jobs) == [f"{url}/build/1/jobs?include=job.stage"] + \
+        [f"{url}/build/3/jobs?include=job.stage"] * 2
+    out = capsys.readouterr().out.split("\n")
+    assert out[:8] == ["\trepo1 -> failed", "\trepo2 -> passed",
+                       "\trepo3 -> started",
+                       "\trepo1 jobs:", "\t\tTest #1.1 -> passed",
+                       "\t\tTest #1.2 -> failed",
+                       "\trepo3 jobs:", "\t\t#3.1 -> started"]
+    assert sorted(out[8:11]) == out[:3]  # failing repos are checked first
+    assert out[11:16] == out[3:8]
+
+
+def test_details_not_supported(cache_dir, monkeypatch):
+    """Test that the jobs of services which do not provide them are not
+    shown, while a missing implementation is not silenced."""
+    from quickci.classes import _CIService
+    url = "https://api.travis-ci.com/build/1/jobs?include=job.stage"
+    t = TravisCI(token="token", transport=FakeTransport({url: {"jobs": []}}))
+    t._builds[("repo1", None)] = ("1", url)
+    result = BuildStatus("travis", "repo1", "master", "failed")
+    monkeypatch.setattr(TravisCI, "details", _CIService.details)
+    assert t.run(t.adetails(result, Cache("details"))) == []
+
+    def details(self, data):
+        raise NotImplementedError
+
+    monkeypatch.setattr(TravisCI, "details", details)
+    with pytest.raises(NotImplementedError):
+        t.run(t.adetails(result, Cache("details")))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+import pytest
+from quickci.classes import Buddy, CircleCI, NotSupported
+from quickci.restart import (DRY_RUN, RESTARTED, STATUS_FAILED, UNSUPPORTED,
+                             Restart, restart_failed)
+from quickci.transport import FakeTransport, Response
+
+URL = "https://circleci.com/api/v1.1"
+V2 = "https://circleci.com/api/v2"
+DRONE = "https://cloud.drone.io/api"
+
+
+def project(name, status, workflow=None):
+    return {"reponame": name, "username": "user", "branches": {"master": {
+        "latest_workflows": {"workflow": {"status": status,
+                                          "id": workflow}}}}}
+
+
+class RetryTransport(FakeTransport):
+    """Throttle the first retry request."""
+
+    throttled = False
+
+    async def request(self, method, url, headers=None, data=None):
+        if method == "POST" and not self.throttled:
+            self.throttled = True
+            self.requests.append((method, url, headers))
+            return Response(429, b"", {"Retry-After": "0"})
+        return await super().request(method, url, headers, data)
+
+
+def transport():
+    return RetryTransport({
+        f"{URL}/projects?": [project("repo1", "failed", "wf1"),
+                             project("repo2", "success", "wf2"),
+                             project("repo3", "failed"),
+                             project("repo4", "failing", "wf4"),
+                             project("other", "failed", "wf5")],
+        f"{V2}/workflow/wf1/rerun": {"workflow_id": "wf1"},
+        f"{V2}/workflow/wf4/rerun": {"workflow_id": "wf4"},
+    })
+
+
+def restart(transport, **kwargs):
+    return asyncio.get_event_loop().run_until_complete(restart_failed(
+        ["circle", "buddy"], pattern="repo*", transport=transport,
+        tokens={"circle": "token", "buddy": "token"}, **kwargs))
+
+
+def test_restart_failed(cache_dir):
+    """Test restarting the failed builds matching a pattern, retrying
+    throttled requests."""
+    t = transport()
+    results = restart(t)
+    assert results[-1].service == "buddy" and results[-1].repo is None
+    assert results[-1].outcome.startswith(STATUS_FAILED)
+    assert sorted(results[:-1]) == [
+        Restart("circle", "repo1", RESTARTED, "wf1"),
+        Restart("circle", "repo3", "failed (no build found)"),
+        Restart("circle", "repo4", RESTARTED, "wf4")]
+    posts = sorted(url for method, url, headers in t.requests
+                   if method == "POST")
+    assert posts == [f"{V2}/workflow/wf1/rerun"] * 2 + [
+        f"{V2}/workflow/wf4/rerun"]
+
+
+def test_restart_failed_dry_run(cache_dir):
+    """Test that a dry run does not restart any build, and only reports the
+    builds which a real run would restart."""
+    t = transport()
+    results = restart(t, dry_run=True)
+    assert [result for result in results if result.service == "circle"] == [
+        Restart("circle", "repo1", DRY_RUN, "wf1"),
+        Restart("circle", "repo3", "failed (no build found)"),
+        Restart("circle", "repo4", DRY_RUN, "wf4")]
+    assert all(method == "GET" for method, url, headers in t.requests)
+
+
+def test_restart_failed_dry_run_unsupported(cache_dir, monkeypatch):
+    """Test that a dry run reports the builds of services which cannot
+    restart builds as not supported."""
+    monkeypatch.setattr(CircleCI, "can_restart", False)
+    results = restart(transport(), dry_run=True)
+    assert [result for result in results if result.service == "circle"] == [
+        Restart("circle", "repo1", UNSUPPORTED),
+        Restart("circle", "repo3", UNSUPPORTED),
+        Restart("circle", "repo4", UNSUPPORTED)]
+
+
+def test_restart_failed_drone(cache_dir):
+    """Test that failed Drone builds are restarted by the number found,
+    even if a newer build was started meanwhile, and that repos whose status
+    could not be retrieved are reported."""
+    t = FakeTransport({
+        f"{DRONE}/user/repos": [
+            {"name": "repo1", "slug": "user/repo1", "counter": 3,
+             "active": True},
+            {"name": "repo2", "slug": "user/repo2", "counter": 1,
+             "active": True},
+            {"name": "repo3", "slug": "user/repo3", "counter": 1,
+             "active": True}],
+        f"{DRONE}/repos/user/repo1/builds/3": {"source": "dev",
+                                               "status": "success"},
+        f"{DRONE}/repos/user/repo1/builds/2": {"source": "master",
+                                               "number": 2,
+                                               "status": "failure"},
+        f"{DRONE}/repos/user/repo2/builds/1": {"source": "master",
+                                               "number": 1,
+                                               "status": "killed"},
+        f"{DRONE}/repos/user/repo3/builds/1": Response(500, b""),
+    })
+    results = asyncio.get_event_loop().run_until_complete(restart_failed(
+        ["drone"], transport=t, tokens={"drone": "token"}))
+    assert sorted(results[1:]) == [
+        Restart("drone", "repo1", RESTARTED, "user/repo1/2"),
+        Restart("drone", "repo2", RESTARTED, "user/repo2/1")]
+    assert results[0].repo == "repo3"
+    assert results[0].outcome.startswith(STATUS_FAILED)
+    posts = sorted(url for method, url, headers in t.requests
+                   if method == "POST")
+    assert posts == [f"{DRONE}/repos/user/repo1/builds/2",
+                     f"{DRONE}/repos/user/repo2/builds/1"]
+
+
+def test_restart_unsupported(cache_dir):
+    """Test that services which cannot restart builds raise NotSupported."""
+    buddy = Buddy(token="token", transport=FakeTransport())
+    assert not buddy.can_restart
+    with pytest.raises(NotSupported):
+        asyncio.get_event_loop().run_until_complete(buddy.arestart("repo1"))
+
+
+def test_send_token_pool(cache_dir):
+    """Test that requests changing the state of a service use the token
+    pool, replacing a throttled token with another one."""
+
+    class ThrottledTransport(FakeTransport):
+        async def request(self, method, url, headers=None, data=None):
+            if headers["circle-token"] == "token1":
+                self.requests.append((method, url, headers))
+                return Response(429, b"", {"Retry-After": "60"})
+            return await super().request(method, url, headers, data)
+
+    t = ThrottledTransport({f"{V2}/workflow/wf1/rerun": {"workflow_id": "wf1"}})
+    circle = CircleCI(token=["token1", "token2"], transport=t)
+    response = asyncio.get_event_loop().run_until_complete(
+        circle.asend(f"{V2}/workflow/wf1/rerun", {"from_failed": True}))
+    assert response == {"workflow_id": "wf1"}
+    assert [headers["circle-token"] for method, url, headers
+            in t.requests] == ["token1", "token2"]
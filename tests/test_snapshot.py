@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import pytest
+from click.testing import CliRunner
+from quickci import cli
+from quickci.classes import BuildStatus, CircleCI
+from quickci.snapshot import (merge_snapshots, parse_shard, read_snapshot,
+                              write_snapshot)
+from quickci.transport import FakeTransport
+
+URL = "https://circleci.com/api/v1.1/projects?"
+
+
+def test_parse_shard():
+    """Test parsing valid and invalid shards."""
+    assert parse_shard("2/5") == (2, 5)
+    for value in ("0/5", "6/5", "2", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+def test_shards_partition(cache_dir):
+    """Test that shards are disjoint and cover every repo."""
+    transport = FakeTransport({URL: [
+        {"reponame": f"repo{i}", "branches": {"master": {
+            "latest_workflows": {"workflow": {"status": "success"}}}}}
+        for i in range(30)]})
+
+    def shard(i):
+        ci = CircleCI(token="token", transport=transport, shard=(i, 3))
+        return {result.repo for result in ci.run(ci.afetch())}
+
+    shards = [shard(i) for i in (1, 2, 3)]
+    assert all(shards)
+    assert sum(len(repos) for repos in shards) == 30
+    assert set.union(*shards) == {f"repo{i}" for i in range(30)}
+    assert shard(2) == shards[1]  # stable
+
+
+def test_merge_snapshots(tmp_path, monkeypatch):
+    """Test that merging keeps the most recent status of each repo, and
+    drops failures of repos found by another snapshot."""
+    old, new = tmp_path / "old.json", tmp_path / "new.json"
+    monkeypatch.setattr("time.time", lambda: 100)
+    write_snapshot(str(old), [BuildStatus("travis", "repo1", "master",
+                                          "failed"),
+                              BuildStatus("travis", "repo2", "master",
+                                          "passed")],
+                   [("circle", "repo3", "master", "HTTP 500")], shard=(1, 2))
+    monkeypatch.setattr("time.time", lambda: 200)
+    write_snapshot(str(new), [BuildStatus("travis", "repo1", "master",
+                                          "passed"),
+                              BuildStatus("circle", "repo3", "master",
+                                          "success")],
+                   [("circle", "repo4", "master", "HTTP 500")], shard=(2, 2))
+    snapshots = [read_snapshot(str(new)), read_snapshot(str(old))]
+    assert read_snapshot(str(old))["shard"] == "1/2"
+    results, failures = merge_snapshots(snapshots)
+    assert results == [BuildStatus("circle", "repo3", "master", "success"),
+                       BuildStatus("travis", "repo1", "master", "passed"),
+                       BuildStatus("travis", "repo2", "master", "passed")]
+    assert failures == [("circle", "repo4", "master", "HTTP 500")]
+
+    runner = CliRunner()
+    result = runner.invoke(cli.main, ["merge", str(old), str(new)])
+    assert result.exit_code == 0
+    assert result.output.split("\n") == [
+        "CircleCI (master branch)", "\trepo3 -> success",
+        "\trepo4 -> request failed (HTTP 500)",
+        "Travis CI (master branch)", "\trepo1 -> passed", "\trepo2 -> passed",
+        ""]
+    merged = tmp_path / "merged.json"
+    result = runner.invoke(cli.main, ["merge", str(old), str(new),
+                                      "-o", str(merged)])
+    assert result.exit_code == 0
+    assert merge_snapshots([read_snapshot(str(merged))]) == (results,
+                                                             failures)
+
+
+def test_merge_invalid(tmp_path):
+    """Test that invalid snapshots are reported."""
+    path = tmp_path / "invalid.json"
+    path.write_text("[]")
+    result = CliRunner().invoke(cli.main, ["merge", str(path)])
+    assert result.exit_code != 0
+    assert "not a valid snapshot" in result.output
+
+
+def test_status_snapshot(tmp_path, cache_dir, monkeypatch):
+    """Test that status --snapshot writes the status of the services
+    checked."""
+    transport = FakeTransport({URL: [
+        {"reponame": "repo1", "branches": {"master": {
+            "latest_workflows": {"workflow": {"status": "failed"}}}}}]})
+    monkeypatch.setattr("quickci.classes.get_transport",
+                        lambda name: transport)
+    path = tmp_path / "snapshot.json"
+    result = CliRunner().invoke(cli.main, [
+        "status", "circle", "--token", "token", "--shard", "1/1",
+        "--snapshot", str(path)])
+    assert result.exit_code == 0
+    snapshot = read_snapshot(str(path))
+    assert snapshot["shard"] == "1/1"
+    assert merge_snapshots([snapshot]) == (
+        [BuildStatus("circle", "repo1", "master", "failed")], [])
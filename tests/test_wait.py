@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import asyncio
+from quickci.transport import FakeTransport, Response
+from quickci.wait import SUCCESS, FAILURE, NOT_FOUND, ERROR, wait_for_commit
+
+URL = "https://circleci.com/api/v1.1/projects?"
+
+
+def project(name, status, sha):
+    """Return a CircleCI project whose master branch built the given sha."""
+    return {"reponame": name, "branches": {"master": {
+        "latest_workflows": {"workflow": {"status": status}},
+        "recent_builds": [{"vcs_revision": sha}]}}}
+
+
+def wait(transport, services=("circle", ), grace=0, **kwargs):
+    return asyncio.get_event_loop().run_until_complete(wait_for_commit(
+        "abc123", services=services, tokens={"circle": "token",
+                                             "drone": "token"},
+        transport=transport, interval=0.01, grace=grace, **kwargs))
+
+
+def test_wait_success(cache_dir):
+    """Test waiting until a running build succeeds, ignoring repos which
+    built another commit."""
+    transport = FakeTransport({URL: [project("repo1", "running", "abc123def"),
+                                     project("repo2", "failed", "000000")]})
+    changes = []
+
+    def on_change(result):
+        changes.append(result.status)
+        transport.routes[URL] = [project("repo1", "success", "abc123def"),
+                                 project("repo2", "failed", "000000")]
+
+    code, builds = wait(transport, on_change=on_change)
+    assert code == SUCCESS
+    assert changes == ["running", "success"]
+    assert list(builds) == [("circle", "repo1", None)]
+
+
+def test_wait_fail_fast(cache_dir):
+    """Test that --fail-fast returns on the first failed build."""
+    transport = FakeTransport({URL: [project("repo1", "running", "abc123"),
+                                     project("repo2", "failed", "abc123")]})
+    code, _ = wait(transport, fail_fast=True)
+    assert code == FAILURE
+    assert len(transport.requests) == 1
+
+
+def test_wait_not_found(cache_dir):
+    """Test that waiting for an unknown commit times out."""
+    transport = FakeTransport({URL: [project("repo1", "success", "000000")]})
+    code, builds = wait(transport, timeout=0.05)
+    assert code == NOT_FOUND
+    assert builds == {}
+
+
+def test_wait_grace(cache_dir):
+    """Test that builds found during the grace period are waited for."""
+    transport = FakeTransport({URL: [project("repo1", "success", "abc123")]})
+    changes = []
+
+    def on_change(result):
+        changes.append(result.repo)
+        transport.routes[URL] = [project("repo1", "success", "abc123"),
+                                 project("repo2", "running", "abc123")]
+        if result.repo == "repo2":
+            transport.routes[URL] = [project("repo1", "success", "abc123"),
+                                     project("repo2", "failed", "abc123")]
+
+    code, builds = wait(transport, grace=0.05, on_change=on_change)
+    assert code == FAILURE
+    assert changes == ["repo1", "repo2", "repo2"]
+
+
+def test_wait_error(cache_dir):
+    """Test that services whose status cannot be retrieved are reported,
+    without stopping the other services."""
+    drone = "https://cloud.drone.io/api/user/repos"
+    transport = FakeTransport({URL: [project("repo1", "success", "abc123")],
+                               drone: Response(500, b"")})
+    errors = []
+    code, builds = wait(transport, services=("circle", "drone"),
+                        on_error=errors.append)
+    assert code == ERROR
+    assert list(builds) == [("circle", "repo1", None)]
+    assert [(error.service, error.repo) for error in errors] == [
+        ("drone", None)]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# Created by Roberto Preste
+import base64
+import hashlib
+import hmac
+import json
+import pytest
+from quickci.classes import CircleCI, WebhookState
+from quickci.transport import FakeTransport
+from quickci.webhooks import WebhookError, WebhookReceiver
+
+
+def circle_payload(status):
+    return json.dumps({"project": {"name": "repo1"},
+                       "pipeline": {"vcs": {"branch": "master"}},
+                       "workflow": {"status": status}}).encode()
+
+
+def test_receive_circle(cache_dir):
+    """Test that a signed CircleCI payload is stored."""
+    receiver = WebhookReceiver({"circle": "secret"})
+    body = circle_payload("failed")
+    signature = hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+    entry = receiver.receive("circle", "POST", "/circle",
+                             {"Circleci-Signature": f"v1={signature}"}, body)
+    assert entry == {"service": "circle", "repo": "repo1",
+                     "branch": "master", "status": "failed"}
+    recent = WebhookState().recent("circle", "master", 60)
+    assert recent["repo1"][0]["status"] == "failed"
+
+
+def test_receive_invalid_signature(cache_dir):
+    """Test that payloads with invalid signatures are rejected."""
+    receiver = WebhookReceiver({"circle": "secret"})
+    with pytest.raises(WebhookError) as e:
+        receiver.receive("circle", "POST", "/circle",
+                         {"Circleci-Signature": "v1=wrong"},
+                         circle_payload("success"))
+    assert e.value.status == 401
+    with pytest.raises(WebhookError):
+        receiver.receive("buddy", "POST", "/buddy", {}, b"{}")
+    assert WebhookState().recent("circle", "master", 60) == {}
+
+
+def test_receive_drone(cache_dir):
+    """Test that a Drone CI payload signed with HTTP signatures is stored."""
+    receiver = WebhookReceiver({"drone": "secret"})
+    body = json.dumps({"repo": {"name": "repo1"},
+                       "build": {"source": "dev", "status": "running"}}).encode()
+    digest = base64.b64encode(hashlib.sha256(body).digest()).decode()
+    headers = {"Date": "Mon, 07 Oct 2019 10:00:00 GMT",
+               "Digest": f"SHA-256={digest}"}
+    string = (f"date: {headers['Date']}\ndigest: {headers['Digest']}")
+    signature = base64.b64encode(hmac.new(b"secret", string.encode(),
+                                          hashlib.sha256).digest()).decode()
+    headers["Signature"] = (f'keyId="hmac-key",algorithm="hmac-sha256",'
+                            f'signature="{signature}",headers="date digest"')
+    entry = receiver.receive("drone", "POST", "/drone", headers, body)
+    assert entry["status"] == "running"
+    with pytest.raises(WebhookError):
+        receiver.receive("drone", "POST", "/drone", headers, body + b" ")
+
+
+def test_status_uses_webhook_state(cache_dir, capsys):
+    """Test that recently reported repos are not polled."""
+    WebhookState().update({"service": "circle", "repo": "repo1",
+                           "branch": "master", "status": "failed"})
+    transport = FakeTransport({"https://circleci.com/api/v1.1/projects?": [
+        {"reponame": "repo1", "branches": {}},
+        {"reponame": "repo2", "branches": {"master": {"latest_workflows": {
+            "workflow": {"status": "success"}}}}}]})
+    c = CircleCI(token="token", transport=transport, webhook_age=60)
+    c.status()
+    result = capsys.readouterr()
+    assert result.out.split() == ["repo1", "->", "failed",
+                                  "repo2", "->", "success"]